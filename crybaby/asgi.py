@@ -1,5 +1,7 @@
 """
 ASGI config for crybaby project.
+HTTP goes to Django; WebSocket connections on the streaming path go to
+the real-time cry detector (crydetector.streaming).
 """
 
 import os
@@ -7,4 +9,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crybaby.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django setup so settings and apps are ready
+from crydetector.streaming import STREAM_PATH, stream_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] == STREAM_PATH:
+            await stream_application(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1000})
+        return
+    await django_application(scope, receive, send)
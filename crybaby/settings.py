@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crydetector.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -80,8 +81,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Job workers and web workers write concurrently; wait for the lock instead of failing
+        'OPTIONS': {'timeout': 20},
     }
 }
+# SQLite in WAL mode (synchronous=NORMAL): readers no longer wait for the
+# job and audit-log writers, and a commit does not fsync the main file
+SQLITE_WAL = os.environ.get('SQLITE_WAL', 'True').lower() == 'true'
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -113,13 +119,99 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 
+# API WAV uploads are parsed while they stream in; only the bytes decoding
+# uses are kept (crydetector/upload_handlers.py)
+UPLOAD_STREAMING = {
+    'ENABLED': os.environ.get('UPLOAD_STREAMING', 'True').lower() == 'true',
+    'MAX_HEADER_BYTES': int(os.environ.get('UPLOAD_MAX_HEADER_BYTES', '65536')),   # RIFF chunks before 'data'
+}
+
 # API Key for authentication (stored in environment variable)
 API_KEY = os.environ.get('CRY_DETECTION_API_KEY', 'dev-api-key-change-in-production')
 
+
+def _api_keys(spec):
+    """
+    "name:key[:rate[:burst]],..." -> {name: {'KEY', 'RATE', 'BURST'}};
+    RATE / BURST left as None use the RATE_LIMIT defaults.
+    """
+    keys = {}
+    for entry in filter(None, (e.strip() for e in spec.split(','))):
+        name, key, *limits = entry.split(':')
+        keys[name] = {
+            'KEY': key,
+            'RATE': float(limits[0]) if len(limits) > 0 and limits[0] else None,
+            'BURST': int(limits[1]) if len(limits) > 1 and limits[1] else None,
+        }
+    return keys
+
+
+# Named API keys, each with its own rate limit, e.g.
+#   CRY_DETECTION_API_KEYS=nursery-app:k3y1,device-42:k3y2:0.5:5
+# CRY_DETECTION_API_KEY stays valid as 'default', unlimited unless
+# CRY_DETECTION_API_KEY_RATE opts it in. The name is what /api/v1/stats/,
+# /metrics and the audit log record.
+API_KEYS = {
+    **({'default': {
+        'KEY': API_KEY,
+        'RATE': float(os.environ.get('CRY_DETECTION_API_KEY_RATE', '0')),   # requests / second, 0 = no limit
+        'BURST': int(os.environ['CRY_DETECTION_API_KEY_BURST']) if os.environ.get('CRY_DETECTION_API_KEY_BURST') else None,
+    }} if API_KEY else {}),
+    **_api_keys(os.environ.get('CRY_DETECTION_API_KEYS', '')),
+}
+
+# Admission control for the prediction endpoints (crydetector/admission.py):
+# a token bucket per API key (429 when empty) and a cap on concurrent
+# decode + inference per process (503 when full, off by default: requests
+# queue for the batching engine), both with Retry-After.
+# Buckets are per process unless RATE_LIMIT_CACHE_LOCATION names a shared
+# cache (Redis / Memcached for exact counts across workers).
+RATE_LIMIT = {
+    'ENABLED': os.environ.get('RATE_LIMIT', 'True').lower() == 'true',
+    'RATE': float(os.environ.get('RATE_LIMIT_RATE', '5')),                  # requests / second per key, sustained
+    'BURST': int(os.environ.get('RATE_LIMIT_BURST', '20')),                 # bucket size per key
+    'MAX_IN_FLIGHT': int(os.environ.get('INFERENCE_MAX_IN_FLIGHT', '0')),   # per process, 0 = no cap
+    'RETRY_AFTER_SECONDS': int(os.environ.get('INFERENCE_RETRY_AFTER', '1')),  # on 503
+    'ALIAS': 'ratelimit' if os.environ.get('RATE_LIMIT_CACHE_LOCATION') else '',
+}
+
 # Model configuration
 # FIX: Use correct model filename (.keras format) in project root
 MODEL_PATH = os.environ.get('MODEL_PATH', str(BASE_DIR / 'baby_cry_reason_model.keras'))
 
+# Inference runtime. 'keras' needs TensorFlow; 'tflite' and 'onnx' serve the
+# files written by `manage.py export_model` with their lightweight runtimes.
+INFERENCE_BACKEND = {
+    'NAME': os.environ.get('INFERENCE_BACKEND', 'keras').lower(),
+    'TFLITE_PATH': os.environ.get('TFLITE_MODEL_PATH', str(BASE_DIR / 'baby_cry_reason_model.tflite')),
+    'ONNX_PATH': os.environ.get('ONNX_MODEL_PATH', str(BASE_DIR / 'baby_cry_reason_model.onnx')),
+    'NUM_THREADS': int(os.environ.get('INFERENCE_NUM_THREADS', '0')),   # 0 = runtime default
+    # Single-threaded runtime so a model loaded before fork() works in every
+    # worker; gunicorn.conf.py turns this on together with preload_app
+    'FORK_SAFE': os.environ.get('INFERENCE_FORK_SAFE', 'False').lower() == 'true',
+}
+
+# Model registry: serve every model file in DIR as a named version, reload
+# new files without a restart and optionally split traffic between them.
+# Off = serve the single file above. See crydetector/model_registry.py.
+MODEL_REGISTRY = {
+    'ENABLED': os.environ.get('MODEL_REGISTRY', 'False').lower() == 'true',
+    'DIR': os.environ.get('MODEL_REGISTRY_DIR', str(BASE_DIR / 'models')),
+    'POLL_SECONDS': float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', '10')),
+    'ACTIVE': os.environ.get('MODEL_ACTIVE', ''),         # version name; empty = newest file
+    'TRAFFIC': os.environ.get('MODEL_TRAFFIC', ''),       # e.g. "cry_2026_10=10" (percent); rest goes to ACTIVE
+}
+
+# TensorFlow runtime profile for the keras backend, applied when the model is
+# loaded (intra-op threads come from INFERENCE_NUM_THREADS; 0 = TF default,
+# one pool thread per core). `manage.py tune_runtime` recommends values per host.
+TF_RUNTIME = {
+    'INTER_OP_THREADS': int(os.environ.get('TF_INTER_OP_THREADS', '0')),
+    'ONEDNN': os.environ.get('TF_ENABLE_ONEDNN_OPTS', '0') == '1',        # oneDNN graph rewrites / kernels
+    'TF_FUNCTION': os.environ.get('TF_FUNCTION', 'True').lower() == 'true',   # traced graph, fixed input signature
+    'XLA_JIT': os.environ.get('TF_XLA_JIT', 'False').lower() == 'true',      # XLA-compiled graph (implies TF_FUNCTION)
+}
+
 # Audio preprocessing configuration
 # FIX: Parameters MUST exactly match training to ensure consistent predictions
 AUDIO_CONFIG = {
@@ -132,6 +224,118 @@ AUDIO_CONFIG = {
     'MAX_PAD_LEN': 173,         # time steps for 4 seconds of audio
 }
 
+# Dynamic micro-batching: concurrent requests share one forward pass
+INFERENCE_BATCHING = {
+    'ENABLED': os.environ.get('INFERENCE_BATCHING', 'True').lower() == 'true',
+    'MAX_BATCH_SIZE': int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', '32')),   # rows per forward pass
+    'MAX_WAIT_MS': float(os.environ.get('INFERENCE_MAX_WAIT_MS', '5')),        # max time to wait for a batch to fill
+}
+
+# Batch prediction endpoint (/api/v1/predict/batch/)
+BATCH_PREDICT = {
+    'MAX_FILES': int(os.environ.get('BATCH_PREDICT_MAX_FILES', '256')),   # clips per request (parts + archive members)
+    'WORKERS': int(os.environ.get('BATCH_PREDICT_WORKERS', '4')),         # preprocessing threads per request
+    # Uncompressed bytes of all archive members per request (held in memory)
+    'MAX_ARCHIVE_BYTES': int(os.environ.get('BATCH_PREDICT_MAX_ARCHIVE_BYTES', str(64 * 1024 * 1024))),
+}
+DATA_UPLOAD_MAX_NUMBER_FILES = BATCH_PREDICT['MAX_FILES']
+
+# Prediction cache keyed on audio hash + model version + AUDIO_CONFIG
+PREDICTION_CACHE = {
+    'ENABLED': os.environ.get('PREDICTION_CACHE', 'True').lower() == 'true',
+    'MAX_ENTRIES': int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', '2048')),   # in-process LRU size
+    'TTL_SECONDS': int(os.environ.get('PREDICTION_CACHE_TTL', '3600')),
+    # Optional shared tier: alias in CACHES below ('' = in-process only)
+    'ALIAS': 'predictions' if os.environ.get('PREDICTION_CACHE_LOCATION') else '',
+}
+
+# Shared cache tier for gunicorn workers, e.g.
+#   PREDICTION_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   PREDICTION_CACHE_LOCATION=/var/tmp/crybaby_cache
+#   PREDICTION_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   PREDICTION_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+if PREDICTION_CACHE['ALIAS']:
+    CACHES['predictions'] = {
+        'BACKEND': os.environ.get('PREDICTION_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ['PREDICTION_CACHE_LOCATION'],
+        'TIMEOUT': PREDICTION_CACHE['TTL_SECONDS'],
+    }
+if RATE_LIMIT['ALIAS']:
+    CACHES['ratelimit'] = {
+        'BACKEND': os.environ.get('RATE_LIMIT_CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.environ['RATE_LIMIT_CACHE_LOCATION'],
+    }
+
+# Real-time streaming endpoint (ws://<host>/ws/v1/stream/, ASGI only)
+STREAMING = {
+    'STRIDE_SECONDS': float(os.environ.get('STREAM_STRIDE_SECONDS', '1.0')),        # hop between classified 4s windows
+    'MAX_CHUNK_SECONDS': float(os.environ.get('STREAM_MAX_CHUNK_SECONDS', '2.0')),  # largest accepted PCM message
+    'MAX_CONNECTIONS': int(os.environ.get('STREAM_MAX_CONNECTIONS', '64')),         # per worker process
+}
+
+# Long-recording segmentation (/api/v1/predict/long/, manage.py segment_recording)
+LONG_AUDIO = {
+    'HOP_SECONDS': float(os.environ.get('LONG_AUDIO_HOP_SECONDS', '2.0')),      # default window hop
+    'BLOCK_SECONDS': 30,                                                         # read size when streaming the file
+    'SILENCE_DBFS': float(os.environ.get('LONG_AUDIO_SILENCE_DBFS', '-50')),    # windows below this RMS are skipped
+    'BATCH_SIZE': 32,                                                            # windows per model call
+    'MERGE_GAP_SECONDS': 1.0,                                                    # join cry windows closer than this
+    'MAX_SECONDS': int(os.environ.get('LONG_AUDIO_MAX_SECONDS', '7200')),       # reject longer recordings
+}
+
+# Pre-gate: skip feature extraction + inference for silent / broadband-noise clips
+AUDIO_GATE = {
+    'ENABLED': os.environ.get('AUDIO_GATE', 'True').lower() == 'true',
+    # Features are z-scored per clip, so quiet cries still classify well: keep the floor low
+    'ENERGY_DBFS': float(os.environ.get('AUDIO_GATE_ENERGY_DBFS', '-65')),          # frame RMS floor
+    'MIN_ACTIVE_RATIO': float(os.environ.get('AUDIO_GATE_MIN_ACTIVE', '0.05')),     # share of frames above the floor
+    'MAX_FLATNESS': float(os.environ.get('AUDIO_GATE_MAX_FLATNESS', '0.4')),        # spectral flatness (1 = white noise)
+    'MAX_ZCR': float(os.environ.get('AUDIO_GATE_MAX_ZCR', '0.3')),                  # zero-crossing rate per sample
+}
+
+# Async views for ASGI deployments (uvicorn / gunicorn -k uvicorn.workers.UvicornWorker).
+# Decode + inference run on a bounded thread pool; beyond MAX_WORKERS + MAX_QUEUE
+# admitted requests the API answers 503 with Retry-After.
+ASYNC_VIEWS = {
+    'ENABLED': os.environ.get('ASYNC_VIEWS', 'False').lower() == 'true',
+    'MAX_WORKERS': int(os.environ.get('ASYNC_MAX_WORKERS', '4')),
+    'MAX_QUEUE': int(os.environ.get('ASYNC_MAX_QUEUE', '16')),
+    'RETRY_AFTER_SECONDS': int(os.environ.get('ASYNC_RETRY_AFTER', '1')),
+}
+
+# Async prediction jobs (POST /api/v1/jobs/), drained by `manage.py run_prediction_workers`
+JOB_QUEUE = {
+    'WORKERS': int(os.environ.get('JOB_WORKERS', '2')),                     # worker processes
+    'BATCH_SIZE': int(os.environ.get('JOB_BATCH_SIZE', '16')),              # jobs claimed per forward pass
+    'POLL_INTERVAL': float(os.environ.get('JOB_POLL_INTERVAL', '0.5')),     # seconds between empty polls
+    'STALE_SECONDS': int(os.environ.get('JOB_STALE_SECONDS', '300')),       # requeue jobs stuck in 'running'
+}
+
+# Prometheus metrics at /metrics. Under gunicorn, gunicorn.conf.py sets
+# PROMETHEUS_MULTIPROC_DIR so the scrape sums all workers.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS', 'True').lower() == 'true',
+    'REQUIRE_API_KEY': os.environ.get('METRICS_REQUIRE_API_KEY', 'False').lower() == 'true',  # X-API-KEY on /metrics
+}
+
+# Prediction audit log (PredictionAudit rows, see crydetector/audit.py).
+# Requests only enqueue; a background thread per process bulk-inserts.
+AUDIT_LOG = {
+    'ENABLED': os.environ.get('AUDIT_LOG', 'True').lower() == 'true',
+    'MAX_QUEUE': int(os.environ.get('AUDIT_MAX_QUEUE', '10000')),          # records held in memory per process
+    'BATCH_SIZE': int(os.environ.get('AUDIT_BATCH_SIZE', '500')),          # rows per bulk insert
+    'FLUSH_SECONDS': float(os.environ.get('AUDIT_FLUSH_SECONDS', '1.0')),  # max wait to fill a batch
+    'POLICY': os.environ.get('AUDIT_POLICY', 'drop'),                      # queue full: 'drop' or 'block'
+    'BLOCK_SECONDS': float(os.environ.get('AUDIT_BLOCK_SECONDS', '0.05')), # 'block': longest wait before dropping
+    'RETENTION_DAYS': int(os.environ.get('AUDIT_RETENTION_DAYS', '90')),   # 0 keeps rows forever
+}
+
+# Confidence above which a prediction counts as crying
+CRY_CONFIDENCE_THRESHOLD = 0.4
+
 # Cry reason classes (must be alphabetical to match training folder structure)
 CRY_CLASSES = ['belly_pain', 'burping', 'discomfort', 'hungry', 'tired']
 
@@ -141,7 +345,19 @@ CRY_REASONS = {
     'belly_pain': "Detected as high-pitched, intense 'eairh' sounds with sharp energy spikes. The urgency in the spectral frequency suggests abdominal pressure or digestive discomfort.",
     'burping': "The model identified short, percussive bursts of air. These non-melodic sound patterns are typically caused by trapped gas in the upper digestive tract.",
     'discomfort': "Characterized by irregular, whining 'heh' sounds. The fluctuating volume and lack of high-intensity spikes point toward environmental or physical discomfort.",
-    'tired': "The sound features deep, yawning vowels with a descending energy profile. These smooth spectral transitions occur when the baby is relaxing and needs sleep."
+    'tired': "The sound features deep, yawning vowels with a descending energy profile. These smooth spectral transitions occur when the baby is relaxing and needs sleep.",
+    'not_crying': "The clip is mostly silence or steady background noise, so no cry was found to analyze."
+}
+
+# "Similar cries" search: nearest corpus clips by model embedding, for
+# predict requests with similar=<k>. Built (and updated incrementally) by
+# `manage.py build_embedding_index`; see crydetector/embedding_index.py.
+EMBEDDING_INDEX = {
+    'DIR': os.environ.get('EMBEDDING_INDEX_DIR', str(BASE_DIR / 'embeddings')),
+    'DATA_DIR': os.environ.get('EMBEDDING_DATA_DIR', str(BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data')),
+    'MAX_K': int(os.environ.get('EMBEDDING_MAX_K', '20')),   # largest similar=<k> served
+    'BITS': 512,                                             # sign-code bits for the candidate pre-filter
+    'CANDIDATES': 2048,                                      # rows re-ranked by exact cosine
 }
 
 # Security settings for production
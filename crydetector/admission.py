@@ -0,0 +1,234 @@
+"""
+Admission control in front of inference, so one client flooding the API
+cannot tie up every worker thread:
+
+    authenticate   X-API-KEY -> key name from settings.API_KEYS
+    check_rate     per-key token bucket (RATE_LIMIT RATE / BURST, overridable
+                   per key); an empty bucket answers 429 with Retry-After
+                   set to when the request would fit, a request costing
+                   more than the burst (a large batch) 413
+    inference_slot at most MAX_IN_FLIGHT decodes + forward passes at once in
+                   this process (0 = no cap); a request finding none free
+                   answers 503 with Retry-After instead of waiting for a thread
+
+Each request gets one outcome in the per-key counters: rate_limited when
+check_rate rejects it, else busy or admitted once it has (or failed to get)
+its inference slot. Callers whose concurrency limit lives elsewhere (the
+async views' executor, the job queue) record() the outcome themselves.
+
+Both checks are non-blocking. Buckets live in the process, so with several
+gunicorn workers each enforces the limit separately, unless RATE_LIMIT
+ALIAS names a shared cache. There each key gets a counter per refill window
+(BURST / RATE seconds) incremented with cache.incr, which is atomic on Redis
+and Memcached. If the shared cache fails, the in-process bucket is used.
+"""
+
+import hmac
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ('admitted', 'rate_limited', 'busy')
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+class AdmissionRejected(Exception):
+    """
+    The request was not admitted; `status` is 413, 429 or 503, `retry_after`
+    whole seconds (None when retrying cannot help).
+    """
+
+    def __init__(self, status, error, retry_after):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def take(self, cost=1):
+        """
+        Take `cost` tokens: 0.0 when they were there, else the seconds until
+        they will be (nothing is taken); inf for costs above the burst.
+        """
+        if cost > self.burst:
+            return math.inf
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class Admission:
+
+    def __init__(self, keys, rate, burst, max_in_flight=0, retry_after=1, enabled=True, alias=''):
+        self.keys = {name: entry['KEY'] for name, entry in keys.items() if entry['KEY']}
+        self.limits = {
+            name: (entry['RATE'] if entry['RATE'] is not None else rate,
+                   entry['BURST'] if entry['BURST'] is not None else burst)
+            for name, entry in keys.items()
+        }
+        self.enabled = enabled
+        self.max_in_flight = max(0, max_in_flight)
+        self.retry_after = max(1, retry_after)
+        self.alias = alias
+        self._buckets = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._counters = {name: dict.fromkeys(OUTCOMES, 0) for name in self.keys}
+        self._shared_errors = 0
+
+    def authenticate(self, key):
+        """
+        Name of the API key `key`, or None. Every configured key is compared
+        in constant time.
+        """
+        found = None
+        for name, expected in self.keys.items():
+            if hmac.compare_digest(key, expected) and found is None:
+                found = name
+        return found
+
+    def record(self, name, outcome):
+        """
+        Count one request's outcome ('admitted', 'rate_limited' or 'busy') for key `name`.
+        """
+        with self._lock:
+            self._counters[name][outcome] += 1
+        metrics.ADMISSION.labels(name, outcome).inc()
+
+    def _wait_local(self, name, rate, burst, cost):
+        with self._lock:
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                bucket = self._buckets[name] = TokenBucket(rate, burst)
+            return bucket.take(cost)
+
+    def _wait_shared(self, name, rate, burst, cost):
+        """
+        Fixed refill window of BURST / RATE seconds shared through the cache:
+        up to BURST requests per window, so RATE on average. A rejected
+        request gives its cost back, so (as with the local bucket) retrying
+        after a 429 does not use up the window.
+        """
+        from django.core.cache import caches
+
+        cache = caches[self.alias]
+        window = max(burst, 1) / rate
+        now = time.time()
+        slot = int(now // window)
+        key = f'admission:{name}:{slot}'
+        cache.add(key, 0, timeout=math.ceil(window) + 1)
+        if cache.incr(key, cost) <= burst:
+            return 0.0
+        cache.decr(key, cost)
+        return (slot + 1) * window - now
+
+    def check_rate(self, name, cost=1, paid=0):
+        """
+        Take a request costing `cost` from the key's bucket, less `paid`
+        already taken for it by an earlier check (see the batch view).
+        Raises AdmissionRejected: 413 when `cost` is above the key's burst,
+        so it could never fit; 429 when the bucket has no room yet.
+        Records nothing when the request gets through.
+        """
+        rate, burst = self.limits[name]
+        if not self.enabled or rate <= 0:
+            return
+        if cost > burst:
+            self.record(name, 'rate_limited')
+            raise AdmissionRejected(
+                413, f'Request costs {cost} requests, above the burst of {burst} for API key "{name}"', None)
+        cost -= paid
+        if cost <= 0:
+            return
+        wait = None
+        if self.alias:
+            try:
+                wait = self._wait_shared(name, rate, burst, cost)
+            except Exception as e:
+                with self._lock:
+                    self._shared_errors += 1
+                logger.warning(f"Shared rate-limit store failed, using the per-process bucket: {e}")
+        if wait is None:
+            wait = self._wait_local(name, rate, burst, cost)
+        if wait > 0:
+            self.record(name, 'rate_limited')
+            raise AdmissionRejected(429, f'Rate limit exceeded for API key "{name}"', max(1, math.ceil(wait)))
+
+    @contextmanager
+    def inference_slot(self, name):
+        """
+        Hold one of MAX_IN_FLIGHT inference slots for the block and record
+        the request as admitted. Raises AdmissionRejected (503) at once, and
+        records it as busy, when they are all taken.
+        """
+        with self._lock:
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                busy = True
+            else:
+                busy = False
+                self._in_flight += 1
+        if busy:
+            self.record(name, 'busy')
+            raise AdmissionRejected(503, 'Server busy, retry later', self.retry_after)
+        self.record(name, 'admitted')
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            keys = {
+                name: {**counters, 'rate': self.limits[name][0], 'burst': self.limits[name][1]}
+                for name, counters in self._counters.items()
+            }
+            return {
+                'enabled': self.enabled,
+                'shared_alias': self.alias or None,
+                'shared_errors': self._shared_errors,
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'keys': keys,
+            }
+
+
+def get_admission():
+    """
+    Process-wide Admission built from settings.API_KEYS and settings.RATE_LIMIT.
+    """
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                config = settings.RATE_LIMIT
+                _admission = Admission(
+                    settings.API_KEYS, config['RATE'], config['BURST'],
+                    max_in_flight=config['MAX_IN_FLIGHT'],
+                    retry_after=config['RETRY_AFTER_SECONDS'],
+                    enabled=config['ENABLED'],
+                    alias=config['ALIAS'],
+                )
+    return _admission
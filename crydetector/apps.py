@@ -5,10 +5,23 @@ Loads the ML model at application startup.
 
 import logging
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 logger = logging.getLogger(__name__)
 
 
+def _sqlite_pragmas(sender, connection, **kwargs):
+    """
+    settings.SQLITE_WAL: journal_mode=WAL (stored in the database file) and
+    synchronous=NORMAL (per connection) on every new SQLite connection.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+
+
 class CrydetectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crydetector'
@@ -19,7 +32,12 @@ class CrydetectorConfig(AppConfig):
         Called when Django app is ready.
         Loads the ML model at startup to avoid per-request loading.
         """
-        # Avoid running during migrations or management commands
+        if settings.SQLITE_WAL:
+            connection_created.connect(_sqlite_pragmas, dispatch_uid='crydetector_sqlite_pragmas')
+
+        # Avoid running during migrations or management commands.
+        # With gunicorn's preload_app this runs once in the master and the
+        # workers inherit the loaded model (see gunicorn.conf.py).
         import sys
         if 'runserver' in sys.argv or 'gunicorn' in sys.modules:
             self._load_model()
@@ -29,12 +47,16 @@ class CrydetectorConfig(AppConfig):
         Load the cry detection model.
         """
         try:
-            from .model_loader import get_model, is_model_available
+            from .model_loader import loads_after_fork, preload_runtime, warm_up
             
+            if loads_after_fork():
+                preload_runtime()
+                logger.info("Inference runtime preloaded; each worker loads the model after fork")
+                return
+
+            # Audio stack, feature tables and model, once per process
             logger.info("Initializing cry detection model...")
-            get_model()
-            
-            if is_model_available():
+            if warm_up():
                 logger.info("Cry detection model loaded successfully at startup")
             else:
                 logger.warning("Cry detection model not available - predictions will use mock data")
@@ -1,11 +1,313 @@
 import io
 import logging
+import tarfile
+import threading
+import zipfile
 import numpy as np
-import librosa
 from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from .metrics import observe_stage, stage_timer
+from .wav_decoder import WavFormatError, decode_wav
 
 logger = logging.getLogger(__name__)
 
+_extractor = None
+_extractor_lock = threading.Lock()
+_gate = None
+_gate_lock = threading.Lock()
+
+
+class ArchiveTooLarge(ValueError):
+    """An archive upload holds more members or bytes than a batch accepts."""
+
+
+class FeatureExtractor:
+    """
+    MFCC extractor with the Hann window, mel filterbank and DCT matrix
+    precomputed once. Output matches librosa.feature.mfcc (centered STFT,
+    zero padding, 128 Slaney mel bands, power_to_db with top_db=80,
+    orthonormal DCT-II) followed by the fixed-length crop and per-clip
+    z-score used in training.
+
+    Accepts one clip (samples,) or a batch (N, samples). Each clip is one
+    vectorized pass over all of its frames; a batch is processed clip by
+    clip, since stacking clips into one rfft/matmul measured slower (3.1
+    ms/clip one at a time vs 3.5-4.6 ms/clip for 2-32 clips per pass on a
+    1-CPU host: the per-clip ~1.4 MB frame buffer stays cache-resident).
+    Scratch buffers are cached per thread and reused across calls.
+    """
+
+    def __init__(self, sample_rate=22050, duration=4, n_mfcc=40, n_fft=2048,
+                 hop_length=512, max_pad_len=173, n_mels=128, top_db=80.0):
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.max_pad_len = max_pad_len
+        self.top_db = top_db
+        self.target_samples = int(sample_rate * duration)
+        self.n_frames = 1 + self.target_samples // hop_length
+
+        # Periodic Hann window (scipy.signal.get_window('hann', n_fft, fftbins=True))
+        n = np.arange(n_fft)
+        self.window = (0.5 - 0.5 * np.cos(2.0 * np.pi * n / n_fft)).astype(np.float32)
+
+        # (n_fft//2+1, n_mels) so power frames can be matmul'ed directly.
+        # librosa (scipy/numba) is only imported here and in the decode fallback
+        import librosa
+        self.mel_basis_t = np.ascontiguousarray(
+            librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=n_mels).T.astype(np.float32))
+
+        # Orthonormal DCT-II, truncated to n_mfcc rows, transposed to (n_mels, n_mfcc)
+        k = np.arange(n_mfcc)[:, None]
+        m = np.arange(n_mels)[None, :]
+        dct = np.cos(np.pi * k * (2 * m + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+        dct[0] /= np.sqrt(2.0)
+        self.dct_t = np.ascontiguousarray(dct.T.astype(np.float32))
+
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            sample_rate=config['SAMPLE_RATE'],
+            duration=config['DURATION'],
+            n_mfcc=config['N_MFCC'],
+            n_fft=config['N_FFT'],
+            hop_length=config['HOP_LENGTH'],
+            max_pad_len=config['MAX_PAD_LEN'],
+        )
+
+    def _buffers(self):
+        """
+        Per-thread scratch arrays for one clip.
+        """
+        cache = getattr(self._local, 'buffers', None)
+        if cache is None:
+            bins = self.n_fft // 2 + 1
+            cache = {
+                'padded': np.zeros(self.target_samples + self.n_fft, dtype=np.float32),
+                'frames': np.empty((self.n_frames, self.n_fft), dtype=np.float32),
+                'spectrum': np.empty((self.n_frames, bins), dtype=np.complex64),
+                'power': np.empty((self.n_frames, bins), dtype=np.float32),
+                'mel': np.empty((self.n_frames, self.mel_basis_t.shape[1]), dtype=np.float32),
+            }
+            self._local.buffers = cache
+        return cache
+
+    def fix_length(self, y):
+        """
+        Zero-pad or trim the last axis to exactly `duration` seconds.
+        """
+        length = y.shape[-1]
+        if length < self.target_samples:
+            pad = [(0, 0)] * (y.ndim - 1) + [(0, self.target_samples - length)]
+            return np.pad(y, pad)
+        return y[..., :self.target_samples]
+
+    def mfcc(self, y):
+        """
+        Raw MFCCs for fixed-length audio: (n_mfcc, frames) or (N, n_mfcc, frames).
+        """
+        y = np.asarray(y, dtype=np.float32)
+        single = y.ndim == 1
+        batch = self.fix_length(y[None, :] if single else y)
+
+        out = np.empty((batch.shape[0], self.n_mfcc, self.n_frames), dtype=np.float32)
+        for clip, clip_out in zip(batch, out):
+            self._mfcc_clip(clip, clip_out)
+        return out[0] if single else out
+
+    def _mfcc_clip(self, clip, out):
+        buf = self._buffers()
+        half = self.n_fft // 2
+
+        # 1. Centered framing (zero padding on both sides, as stft(center=True))
+        padded = buf['padded']
+        padded[half:half + self.target_samples] = clip
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft)[::self.hop_length]
+        np.multiply(windows, self.window, out=buf['frames'])
+
+        # 2. Power spectrum
+        spectrum = np.fft.rfft(buf['frames'], axis=-1, out=buf['spectrum'])
+        power = buf['power']
+        np.multiply(spectrum.real, spectrum.real, out=power)
+        power += spectrum.imag * spectrum.imag
+
+        # 3. Mel projection and power_to_db (ref=1.0, amin=1e-10), top_db per clip
+        mel = np.matmul(power, self.mel_basis_t, out=buf['mel'])
+        np.maximum(mel, 1e-10, out=mel)
+        np.log10(mel, out=mel)
+        mel *= 10.0
+        np.maximum(mel, mel.max() - self.top_db, out=mel)
+
+        # 4. DCT-II over mel bands -> (n_mfcc, frames)
+        out[...] = np.matmul(mel, self.dct_t).T
+
+    def transform(self, y):
+        """
+        Model-ready features: fixed-length crop/pad of the MFCC frames
+        followed by per-clip z-score. (n_mfcc, max_pad_len) or batched.
+        """
+        return self._finalize(self.mfcc(y))
+
+    def log_mel_frames(self, samples):
+        """
+        Un-clamped log-mel (dB) for every full n_fft frame of an uncentered
+        signal, hop_length apart: (frames, n_mels). Building block for
+        incremental extraction, where only newly completed frames are computed.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.shape[0] < self.n_fft:
+            return np.empty((0, self.mel_basis_t.shape[1]), dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop_length]
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        power = spectrum.real * spectrum.real + spectrum.imag * spectrum.imag
+        mel = np.maximum(power @ self.mel_basis_t, 1e-10)
+        return 10.0 * np.log10(mel)
+
+    def transform_log_mel(self, log_mel):
+        """
+        Model-ready features from a (frames, n_mels) block of log_mel_frames:
+        top_db clamp over the window, DCT, crop/pad and z-score.
+        """
+        log_mel = np.maximum(log_mel, log_mel.max() - self.top_db)
+        return self._finalize((log_mel @ self.dct_t).T)
+
+    def _finalize(self, mfcc):
+        """
+        Crop/pad to max_pad_len frames, then per-clip z-score.
+        """
+        frames = mfcc.shape[-1]
+        if frames < self.max_pad_len:
+            pad = [(0, 0)] * (mfcc.ndim - 1) + [(0, self.max_pad_len - frames)]
+            mfcc = np.pad(mfcc, pad)
+        else:
+            mfcc = mfcc[..., :self.max_pad_len]
+
+        # Z-score per clip (matches training: (mfcc - mean) / (std + 1e-8))
+        axes = (-2, -1)
+        mean = mfcc.mean(axis=axes, keepdims=True)
+        std = mfcc.std(axis=axes, keepdims=True)
+        return ((mfcc - mean) / (std + 1e-8)).astype(np.float32)
+
+
+def get_feature_extractor():
+    """
+    Process-wide extractor built from settings.AUDIO_CONFIG.
+    """
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = FeatureExtractor.from_config(settings.AUDIO_CONFIG)
+    return _extractor
+
+class AudioGate:
+    """
+    Cheap pre-gate run on the decoded waveform before feature extraction.
+    Short non-overlapping frames are scored for RMS energy, zero-crossing
+    rate and spectral flatness (all vectorized). A clip is rejected as
+    'silence' when too few frames are above the energy floor, or as
+    'noise' when its active frames are both flat-spectrum and high-ZCR
+    (broadband noise rather than a harmonic cry).
+    """
+
+    def __init__(self, energy_dbfs=-65.0, min_active_ratio=0.05,
+                 max_flatness=0.4, max_zcr=0.3, frame_length=1024):
+        self.energy_dbfs = energy_dbfs
+        self.min_active_ratio = min_active_ratio
+        self.max_flatness = max_flatness
+        self.max_zcr = max_zcr
+        self.frame_length = frame_length
+        self._window = np.hanning(frame_length).astype(np.float32)
+        self._lock = threading.Lock()
+        self._counters = {'checked': 0, 'passed': 0, 'rejected_silence': 0, 'rejected_noise': 0, 'bypassed': 0}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            energy_dbfs=config['ENERGY_DBFS'],
+            min_active_ratio=config['MIN_ACTIVE_RATIO'],
+            max_flatness=config['MAX_FLATNESS'],
+            max_zcr=config['MAX_ZCR'],
+        )
+
+    def measure(self, y):
+        """
+        Frame statistics for a mono signal: active ratio, and median
+        flatness / ZCR over active frames.
+        """
+        n_frames = len(y) // self.frame_length
+        if n_frames == 0:
+            return {'active_ratio': 0.0, 'flatness': 1.0, 'zcr': 0.0}
+        frames = np.asarray(y[:n_frames * self.frame_length], dtype=np.float32).reshape(n_frames, self.frame_length)
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        active = 20.0 * np.log10(np.maximum(rms, 1e-10)) > self.energy_dbfs
+        active_ratio = float(np.mean(active))
+        if not active.any():
+            return {'active_ratio': 0.0, 'flatness': 1.0, 'zcr': 0.0}
+
+        loud = frames[active]
+        signs = np.signbit(loud)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        power = np.abs(np.fft.rfft(loud * self._window, axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        return {
+            'active_ratio': round(active_ratio, 4),
+            'flatness': round(float(np.median(flatness)), 4),
+            'zcr': round(float(np.median(zcr)), 4),
+        }
+
+    def check(self, y):
+        """
+        Returns (passed, details). details['reason'] is 'silence' / 'noise'
+        when the clip is rejected.
+        """
+        details = self.measure(y)
+        if details['active_ratio'] < self.min_active_ratio:
+            reason = 'silence'
+        elif details['flatness'] > self.max_flatness and details['zcr'] > self.max_zcr:
+            reason = 'noise'
+        else:
+            reason = None
+
+        with self._lock:
+            self._counters['checked'] += 1
+            self._counters['rejected_' + reason if reason else 'passed'] += 1
+        if reason:
+            details['reason'] = reason
+        return reason is None, details
+
+    def record_bypass(self):
+        with self._lock:
+            self._counters['bypassed'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        rejected = counters['rejected_silence'] + counters['rejected_noise']
+        counters['short_circuit_rate'] = round(rejected / counters['checked'], 4) if counters['checked'] else 0.0
+        return counters
+
+
+def get_audio_gate():
+    """
+    Process-wide pre-gate built from settings.AUDIO_GATE, or None if disabled.
+    """
+    global _gate
+    if not settings.AUDIO_GATE['ENABLED']:
+        return None
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                _gate = AudioGate.from_config(settings.AUDIO_GATE)
+    return _gate
+
 def validate_audio_file(file):
     """
     Validate the uploaded audio file.
@@ -22,6 +324,64 @@ def validate_audio_file(file):
         
     return True, None
 
+def extract_archive(file, max_files, max_bytes):
+    """
+    Unpack a .zip / .tar(.gz) upload into in-memory files.
+    Every limit is checked against the member headers before the member is
+    read: ArchiveTooLarge for more than `max_files` members or `max_bytes`
+    uncompressed in total, ValueError for a member larger than
+    FILE_UPLOAD_MAX_MEMORY_SIZE or an unreadable archive. (zipfile never
+    inflates past the size a header declares.)
+    """
+    max_member_size = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    members = []
+    total = 0
+
+    def admit(name, size):
+        nonlocal total
+        if size > max_member_size:
+            raise ValueError(f"Archive member too large: {name}")
+        if len(members) >= max_files:
+            raise ArchiveTooLarge(f"Too many files in archive (max {max_files})")
+        total += size
+        if total > max_bytes:
+            raise ArchiveTooLarge(f"Archive too large uncompressed (max {max_bytes} bytes)")
+
+    try:
+        if zipfile.is_zipfile(file):
+            file.seek(0)
+            with zipfile.ZipFile(file) as zf:
+                for info in zf.infolist():
+                    if info.is_dir():
+                        continue
+                    admit(info.filename, info.file_size)
+                    members.append(SimpleUploadedFile(info.filename, zf.read(info)))
+                return members
+
+        file.seek(0)
+        with tarfile.open(fileobj=file, mode='r:*') as tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+                admit(info.name, info.size)
+                members.append(SimpleUploadedFile(info.name, tf.extractfile(info).read()))
+        return members
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise ValueError(f"Unreadable archive: {str(e)}")
+
+def load_audio(audio_data, sr, duration=None, timings=None):
+    """
+    Decode WAV bytes to mono float32 at `sr`, reading at most `duration` seconds.
+    PCM/float WAVs take the direct decoder; anything else falls back to librosa.
+    """
+    try:
+        return decode_wav(audio_data, sr, max_duration=duration, timings=timings)
+    except WavFormatError as e:
+        logger.debug(f"Fast WAV path unavailable ({e}); falling back to librosa.load")
+        import librosa
+        y, _ = librosa.load(io.BytesIO(audio_data), sr=sr, mono=True, duration=duration)
+        return y
+
 def preprocess_audio(file):
     """
     MATCHING TRAINING PREPROCESSING:
@@ -31,52 +391,55 @@ def preprocess_audio(file):
     4. NO additional scaling (model expects raw MFCC values)
     """
     try:
-        # Load configuration
+        # 1. Fast Memory Load (only the first `duration` seconds are decoded)
+        audio_data = file.read()
+        file.seek(0)
+        return preprocess_audio_bytes(audio_data)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Audio preprocessing failed: {str(e)}")
+        raise ValueError(f"Failed to process audio: {str(e)}")
+
+def preprocess_audio_bytes(audio_data):
+    """
+    preprocess_audio for raw upload bytes (already read, e.g. for hashing).
+    """
+    return clip_features(decode_clip(audio_data))
+
+def decode_clip(audio_data):
+    """
+    Decode upload bytes to the mono waveform the model window uses.
+    """
+    try:
         sr = settings.AUDIO_CONFIG['SAMPLE_RATE']
         duration = settings.AUDIO_CONFIG['DURATION']
+        timings = {}
+        with stage_timer('decode'):
+            y = load_audio(audio_data, sr, duration, timings)
+        if 'resample' in timings:
+            observe_stage('resample', timings['resample'])
+        return y
+    except Exception as e:
+        logger.error(f"Audio preprocessing failed: {str(e)}")
+        raise ValueError(f"Failed to process audio: {str(e)}")
+
+def clip_features(y):
+    """
+    Waveform -> (1, n_mfcc, max_pad_len, 1) model input.
+    """
+    try:
         n_mfcc = settings.AUDIO_CONFIG['N_MFCC']
-        n_fft = settings.AUDIO_CONFIG['N_FFT']
-        hop_l = settings.AUDIO_CONFIG['HOP_LENGTH']
         max_len = settings.AUDIO_CONFIG['MAX_PAD_LEN']
         
-        # 1. Fast Memory Load
-        audio_data = file.read()
-        file.seek(0)
-        y, _ = librosa.load(io.BytesIO(audio_data), sr=sr, mono=True)
-        
-        # 2. Match exact duration (Trimming silence first can help but 
-        # let's stick to simple padding/trimming to match verify_alpha results)
-        target_samples = int(sr * duration)
-        if len(y) < target_samples:
-            # Pad with zeros
-            y = np.pad(y, (0, target_samples - len(y)))
-        else:
-            # Trim
-            y = y[:target_samples]
-            
-        # 3. Feature Extraction
-        # NOTE: librosa.feature.mfcc internally handles power_to_db scaling 
-        # based on the melspectrogram it generates.
-        mfcc = librosa.feature.mfcc(
-            y=y, 
-            sr=sr, 
-            n_mfcc=n_mfcc, 
-            n_fft=n_fft, 
-            hop_length=hop_l
-        )
-        
-        # 4. Ensure exact time-step shape for CNN
-        if mfcc.shape[1] < max_len:
-            mfcc = np.pad(mfcc, ((0, 0), (0, max_len - mfcc.shape[1])))
-        else:
-            mfcc = mfcc[:, :max_len]
-            
-        # 5. NORMALIZATION (Z-score)
-        # Match training: mfcc = (mfcc - np.mean(mfcc)) / (np.std(mfcc) + 1e-8)
-        mfcc = (mfcc - np.mean(mfcc)) / (np.std(mfcc) + 1e-8)
+        # 2-5. Fixed 4s window, MFCC, fixed time steps, Z-score
+        # (precomputed filterbank/DCT; same class as train.FEATURE_EXTRACTOR, which
+        # ClipSource and the feature store use)
+        with stage_timer('features'):
+            mfcc = get_feature_extractor().transform(y)
         
         # Reshape for CNN: (batch, n_mfcc, time_steps, channels)
-        return mfcc.reshape(1, n_mfcc, max_len, 1).astype(np.float32)
+        return mfcc.reshape(1, n_mfcc, max_len, 1)
         
     except Exception as e:
         logger.error(f"Audio preprocessing failed: {str(e)}")
@@ -0,0 +1,241 @@
+"""
+Prediction audit log: one PredictionAudit row per served prediction
+(request time, API key name, audio hash, label, probabilities, per-stage
+timings, model version), for analytics and model monitoring.
+
+Requests never touch the database for it. record_prediction() puts a
+small dict on a bounded in-process queue and returns; a daemon thread per
+process takes up to BATCH_SIZE records (or whatever arrived within
+FLUSH_SECONDS of the first) and writes them with one bulk_create. When
+the queue is full the record is dropped (POLICY 'drop'), or the request
+waits up to BLOCK_SECONDS for room and then drops it ('block'). Drops and
+write failures are counted, never raised.
+
+The same thread deletes rows older than RETENTION_DAYS about once an
+hour. `manage.py audit_report` rolls the table up per label and per hour.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DROP = 'drop'
+BLOCK = 'block'
+PRUNE_INTERVAL_SECONDS = 3600
+
+_audit = None
+_audit_lock = threading.Lock()
+
+
+def _after_fork():
+    # The parent's queue and writer thread do not survive a fork
+    global _audit
+    _audit = None
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def audio_digest(audio_data):
+    """
+    sha256 hex digest of the uploaded bytes (also the prediction cache key).
+    """
+    return hashlib.sha256(audio_data).hexdigest()
+
+
+class AuditLog:
+
+    def __init__(self, max_queue, batch_size, flush_seconds, policy=DROP, block_seconds=0.05, retention_days=0):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"AUDIT_LOG POLICY must be '{DROP}' or '{BLOCK}', not {policy!r}")
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.policy = policy
+        self.block_seconds = block_seconds
+        self.retention_days = retention_days
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self._counters = {'enqueued': 0, 'dropped': 0, 'written': 0, 'failed': 0, 'batches': 0}
+        self._last_flush_ms = None
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def record(self, entry):
+        """
+        Queue one PredictionAudit field dict. Returns False when it was dropped.
+        """
+        self._ensure_thread()
+        try:
+            if self.policy == BLOCK:
+                self._queue.put(entry, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count('dropped')
+            metrics.AUDIT_RECORDS.labels('dropped').inc()
+            return False
+        self._count('enqueued')
+        return True
+
+    def _take(self, first):
+        """
+        `first` plus whatever arrives within FLUSH_SECONDS, up to BATCH_SIZE.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=PRUNE_INTERVAL_SECONDS)
+            except queue.Empty:
+                self._prune()
+                continue
+            self._write(self._take(first))
+            self._prune()
+
+    def _write(self, batch):
+        from .models import PredictionAudit
+
+        started = time.perf_counter()
+        try:
+            PredictionAudit.objects.bulk_create([PredictionAudit(**entry) for entry in batch])
+        except Exception as e:
+            # Records are not retried: memory stays bounded if the database is
+            # down, and the writer thread survives anything a batch raises
+            logger.error(f"Audit log write of {len(batch)} records failed: {e}")
+            self._count('failed', len(batch))
+            metrics.AUDIT_RECORDS.labels('failed').inc(len(batch))
+            connection.close()
+            return
+        with self._lock:
+            self._counters['written'] += len(batch)
+            self._counters['batches'] += 1
+            self._last_flush_ms = round((time.perf_counter() - started) * 1000.0, 2)
+        metrics.AUDIT_RECORDS.labels('written').inc(len(batch))
+
+    def _prune(self):
+        if not self.retention_days or time.monotonic() - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        from .models import PredictionAudit
+
+        self._last_prune = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=self.retention_days)
+        try:
+            deleted, _ = PredictionAudit.objects.filter(created_at__lt=cutoff).delete()
+        except Exception as e:
+            logger.error(f"Audit log retention cleanup failed: {e}")
+            connection.close()
+            return
+        if deleted:
+            logger.info(f"Audit log: deleted {deleted} records older than {self.retention_days} days")
+
+    def flush(self):
+        """
+        Write everything still queued from the calling thread (process exit,
+        management commands). Records the writer thread already holds are
+        written by it.
+        """
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            last_flush_ms = self._last_flush_ms
+        return {
+            **counters,
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'policy': self.policy,
+            'last_flush_ms': last_flush_ms,
+        }
+
+
+def get_audit_log():
+    """
+    Process-wide AuditLog built from settings.AUDIT_LOG, or None if disabled.
+    """
+    global _audit
+    config = settings.AUDIT_LOG
+    if not config['ENABLED']:
+        return None
+    if _audit is None:
+        with _audit_lock:
+            if _audit is None:
+                _audit = AuditLog(
+                    max_queue=config['MAX_QUEUE'],
+                    batch_size=config['BATCH_SIZE'],
+                    flush_seconds=config['FLUSH_SECONDS'],
+                    policy=config['POLICY'],
+                    block_seconds=config['BLOCK_SECONDS'],
+                    retention_days=config['RETENTION_DAYS'],
+                )
+    return _audit
+
+
+def record_prediction(endpoint, item, body, api_key=''):
+    """
+    Audit one served prediction: `item` from prepare_audio / predict_audio,
+    `body` its format_item_result. No-op when the audit log is disabled.
+    """
+    audit = get_audit_log()
+    if audit is None:
+        return
+    timings = item.get('timings') or {}
+    audit.record({
+        'created_at': timezone.now(),
+        'endpoint': endpoint,
+        'api_key': api_key,
+        'audio_sha256': item.get('audio_hash') or '',
+        'label': body['label'],
+        'confidence': body['confidence'],
+        'probabilities': body['probabilities'],
+        'model_version': body['model_version'] or '',
+        'cached': body['cached'],
+        'gated': body['gated'],
+        'timings_ms': {stage: round(ms, 3) for stage, ms in timings.items() if stage != 'total'},
+        'total_ms': round(timings['total'], 3) if 'total' in timings else None,
+    })
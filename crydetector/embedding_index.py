@@ -0,0 +1,304 @@
+"""
+"Similar cries": nearest-neighbour search over model embeddings of a
+reference corpus (settings.EMBEDDING_INDEX['DATA_DIR']).
+
+An embedding is the input of the model's classifier layer (see
+KerasBackend.embed), L2-normalised so cosine similarity is a dot product.
+`manage.py build_embedding_index` writes, per generation:
+
+    index.json            model fingerprint, file names, one entry per row
+                          (path, label, mtime/size stamp)
+    vectors-<g>.npy       (N, D) float16 embeddings
+    codes-<g>.npy         (BITS / 64, N) uint64 sign codes of the centred
+                          embeddings under random hyperplanes
+    projection-<g>.npz    the mean and hyperplanes for query codes
+
+Workers open the .npy files memory-mapped and read-only, so every process
+shares one copy in the page cache. A lookup ranks all rows by the Hamming
+distance of their codes to the query's (a few XOR / popcount passes over
+N * BITS / 8 bytes), then re-ranks the best CANDIDATES rows by exact
+cosine on the float16 vectors. Indexes no larger than CANDIDATES are
+searched exactly.
+
+Rebuilds only embed clips that are new or changed on disk (same model);
+the rest are copied over. index.json is replaced atomically and workers
+reopen the index when it changes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+HYPERPLANE_SEED = 0
+# Rows per chunk when encoding, to bound the float32 temporaries
+CHUNK_ROWS = 8192
+
+# float16 -> float32 for every bit pattern; a table lookup converts the
+# re-ranked rows several times faster than ndarray.astype
+_FLOAT16_TO_32 = np.arange(1 << 16, dtype=np.uint32).astype(np.uint16).view(np.float16).astype(np.float32)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class EmbeddingIndexError(Exception):
+    """
+    No usable index for this request (missing, or built with another model).
+    """
+
+
+def _sign_codes(vectors, mean, planes):
+    """
+    (n, D) embeddings -> (BITS / 64, n) uint64 codes, one column per row.
+    """
+    bits = (np.asarray(vectors, dtype=np.float32) - mean) @ planes > 0
+    return np.ascontiguousarray(np.packbits(bits, axis=1).view(np.uint64).T)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == INDEX_VERSION else None
+
+
+class EmbeddingIndex:
+
+    def __init__(self, directory):
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            raise EmbeddingIndexError(f"No embedding index in {directory}; run manage.py build_embedding_index")
+        self.directory = directory
+        self.model = manifest['model']
+        # Lookups only need path and label; stamps stay in index.json
+        self.paths = [e['path'] for e in manifest['entries']]
+        self.labels = [e['label'] or None for e in manifest['entries']]
+        try:
+            self.vectors = np.load(os.path.join(directory, manifest['vectors']), mmap_mode='r')
+            self.codes = np.load(os.path.join(directory, manifest['codes']), mmap_mode='r')
+            with np.load(os.path.join(directory, manifest['projection'])) as projection:
+                self.mean = projection['mean']
+                self.planes = projection['planes']
+        except OSError as e:
+            # A rebuild finished between reading index.json and opening its files
+            raise EmbeddingIndexError(f"Embedding index in {directory} changed while opening: {e}")
+        self.candidates = settings.EMBEDDING_INDEX['CANDIDATES']
+
+    def __len__(self):
+        return len(self.paths)
+
+    def search(self, embedding, k):
+        """
+        [(row, cosine similarity), ...] of the k rows closest to `embedding`, best first.
+        """
+        n = len(self.paths)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        query = _normalize(embedding).ravel()
+        if n <= self.candidates:
+            rows = np.arange(n)
+        else:
+            code = _sign_codes(query[None, :], self.mean, self.planes)[:, 0]
+            distance = np.bitwise_count(self.codes[0] ^ code[0]).astype(np.uint16)
+            for word in range(1, len(code)):
+                distance += np.bitwise_count(self.codes[word] ^ code[word])
+            # Distances are small integers: cut at the one that reaches CANDIDATES
+            # rows (ties included) instead of a partial sort
+            counts = np.cumsum(np.bincount(distance, minlength=len(code) * 64 + 1))
+            rows = np.flatnonzero(distance <= np.searchsorted(counts, self.candidates))
+        scores = _FLOAT16_TO_32.take(self.vectors[rows].view(np.uint16)) @ query
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+
+def get_embedding_index():
+    """
+    The index in settings.EMBEDDING_INDEX['DIR'], reopened when a rebuild
+    has replaced index.json. Raises EmbeddingIndexError when there is none.
+    """
+    global _index
+    directory = settings.EMBEDDING_INDEX['DIR']
+    try:
+        changed = os.stat(os.path.join(directory, INDEX_FILE)).st_mtime_ns
+    except OSError:
+        raise EmbeddingIndexError(f"No embedding index in {directory}; run manage.py build_embedding_index")
+    current = _index
+    if current is None or current[0] != changed:
+        with _index_lock:
+            current = _index
+            if current is None or current[0] != changed:
+                current = (changed, EmbeddingIndex(directory))
+                _index = current
+    return current[1]
+
+
+def find_similar(embedding, version, k):
+    """
+    Corpus clips most similar to one clip's embedding, as API dicts.
+    `version` must be the model the index was built with.
+    """
+    index = get_embedding_index()
+    if version is None or version.fingerprint != index.model:
+        served = version.fingerprint if version is not None else 'no model'
+        raise EmbeddingIndexError(
+            f"Embedding index was built with {index.model}, not {served}; rerun manage.py build_embedding_index")
+    return [
+        {'path': index.paths[row], 'label': index.labels[row], 'similarity': round(score, 4)}
+        for row, score in index.search(embedding, k)
+    ]
+
+
+def corpus_files(data_dir):
+    """
+    [(relative path, label), ...] for every WAV under data_dir; the label
+    is the first folder when it is a class name.
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(data_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith('.wav'):
+                rel = os.path.relpath(os.path.join(dirpath, name), data_dir)
+                top = rel.split(os.sep)[0] if os.sep in rel else ''
+                files.append((rel, top if top in settings.CRY_CLASSES else ''))
+    return files
+
+
+def build_index(directory, data_dir, model_path, feature_store, batch_size=64, rebuild=False):
+    """
+    Write a new index generation for the WAVs under `data_dir`, embedding
+    only clips that are new or changed since the last build with the same
+    model file. `feature_store` (a FeatureStore) supplies the MFCCs; it
+    forks its workers, so it runs before the model is loaded. Returns
+    build statistics.
+    """
+    from .model_loader import _file_version, load_version
+
+    started = time.perf_counter()
+    fingerprint = _file_version(model_path)
+    files = corpus_files(data_dir)
+    stamps = {rel: _stamp(os.path.join(data_dir, rel)) for rel, _ in files}
+
+    old = None if rebuild else _read_manifest(directory)
+    if old is not None and old['model'] != fingerprint:
+        logger.info(f"Embedding index was built with {old['model']}; re-embedding everything")
+        old = None
+    old_rows = {}
+    if old is not None:
+        old_rows = {e['path']: (row, e['stamp']) for row, e in enumerate(old['entries'])}
+    reuse = {rel: old_rows[rel][0] for rel, _ in files if rel in old_rows and old_rows[rel][1] == stamps[rel]}
+    todo = [rel for rel, _ in files if rel not in reuse]
+
+    # MFCCs for the clips to embed (parallel, cached across builds)
+    embedded = {}
+    if todo:
+        features, rows = feature_store.open([os.path.join(data_dir, rel) for rel in todo])
+        ok = [(rel, row) for rel, row in zip(todo, rows.tolist()) if row >= 0]
+        if len(ok) < len(todo):
+            logger.warning(f"Skipping {len(todo) - len(ok)} clips that failed feature extraction")
+        version = load_version(model_path) if ok else None
+        for start in range(0, len(ok), batch_size):
+            chunk = ok[start:start + batch_size]
+            batch = np.stack([features[row] for _, row in chunk])[..., np.newaxis].astype(np.float32)
+            embeddings, _ = version.embed(batch)
+            for (rel, _), vector in zip(chunk, _normalize(embeddings)):
+                embedded[rel] = vector.astype(np.float16)
+
+    entries = [{'path': rel, 'label': label, 'stamp': stamps[rel]}
+               for rel, label in files if rel in reuse or rel in embedded]
+    unchanged = not embedded and len(reuse) == len(old_rows)
+    if not entries:
+        raise ValueError(f"No clips could be embedded under {data_dir}")
+    if reuse:
+        old_vectors = np.load(os.path.join(directory, old['vectors']), mmap_mode='r')
+        dim = old_vectors.shape[1]
+    else:
+        dim = len(next(iter(embedded.values())))
+    vectors = np.empty((len(entries), dim), dtype=np.float16)
+    reused = [(row, reuse[e['path']]) for row, e in enumerate(entries) if e['path'] in reuse]
+    if reused:
+        dst, src = (np.array(col) for col in zip(*reused))
+        vectors[dst] = old_vectors[src]
+        del old_vectors
+    for row, e in enumerate(entries):
+        if e['path'] in embedded:
+            vectors[row] = embedded[e['path']]
+    if not unchanged:
+        write_index(directory, fingerprint, entries, vectors)
+
+    return {
+        'clips': len(entries),
+        'embedded': len(embedded),
+        'reused': len(reuse),
+        'removed': sum(1 for rel in old_rows if rel not in stamps),
+        'failed': len(todo) - len(embedded),
+        'dim': dim,
+        'model': fingerprint,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def write_index(directory, model, entries, vectors):
+    """
+    Write (N, D) normalised float16 `vectors` for `entries` as the next
+    index generation in `directory` and switch index.json to it.
+    """
+    old = _read_manifest(directory)
+    generation = int(old.get('generation', 0)) + 1 if old is not None else 1
+    n, dim = vectors.shape
+    os.makedirs(directory, exist_ok=True)
+
+    # Codes are cheap to recompute, so every generation re-centres them
+    mean = np.zeros(dim, dtype=np.float64)
+    for start in range(0, n, CHUNK_ROWS):
+        mean += vectors[start:start + CHUNK_ROWS].astype(np.float32).sum(axis=0)
+    mean = (mean / max(n, 1)).astype(np.float32)
+    bits = settings.EMBEDDING_INDEX['BITS']
+    planes = np.random.default_rng(HYPERPLANE_SEED).standard_normal((dim, bits)).astype(np.float32)
+    codes = np.empty((bits // 64, n), dtype=np.uint64)
+    for start in range(0, n, CHUNK_ROWS):
+        codes[:, start:start + CHUNK_ROWS] = _sign_codes(vectors[start:start + CHUNK_ROWS], mean, planes)
+
+    # Each generation gets new files and index.json is switched last, so
+    # readers and interrupted builds always see a complete index
+    names = {'vectors': f'vectors-{generation}.npy', 'codes': f'codes-{generation}.npy',
+             'projection': f'projection-{generation}.npz'}
+    np.save(os.path.join(directory, names['vectors']), vectors)
+    np.save(os.path.join(directory, names['codes']), codes)
+    np.savez(os.path.join(directory, names['projection']), mean=mean, planes=planes)
+    manifest = {'version': INDEX_VERSION, 'model': model, 'generation': generation,
+                'dim': dim, **names, 'entries': entries}
+    tmp = os.path.join(directory, INDEX_FILE + '.tmp')
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp, os.path.join(directory, INDEX_FILE))
+
+    # Workers still mapping the old files keep them until they reopen
+    if old is not None:
+        for key in names:
+            try:
+                os.remove(os.path.join(directory, old[key]))
+            except OSError:
+                pass
@@ -0,0 +1,80 @@
+"""
+Bounded executor for the async (ASGI) views.
+Decode + inference are synchronous (NumPy / model runtime), so async views
+hand them to a fixed thread pool instead of blocking the event loop. The
+number of calls running or waiting is capped; past the cap, run() raises
+ExecutorFull and the view answers 503 + Retry-After instead of queueing
+without bound. Threads (not processes) keep the single in-process model
+and micro-batching engine shared by all requests.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ExecutorFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+
+    def __init__(self, max_workers=4, max_queue=16):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='async-view')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {'submitted': 0, 'rejected': 0, 'max_in_flight': 0}
+
+    @property
+    def capacity(self):
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) on the pool and await its result.
+        Raises ExecutorFull when max_workers + max_queue calls are already admitted.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._counters['rejected'] += 1
+                raise ExecutorFull()
+            self._in_flight += 1
+            self._counters['submitted'] += 1
+            self._counters['max_in_flight'] = max(self._counters['max_in_flight'], self._in_flight)
+        # Released when the call really finishes (not when the awaiting
+        # request is cancelled), so abandoned work still counts against the cap
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                **self._counters,
+            }
+
+
+def get_executor():
+    """
+    Process-wide executor built from settings.ASYNC_VIEWS.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                config = settings.ASYNC_VIEWS
+                _executor = BoundedExecutor(config['MAX_WORKERS'], config['MAX_QUEUE'])
+    return _executor
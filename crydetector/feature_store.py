@@ -0,0 +1,205 @@
+"""
+On-disk MFCC store for training.
+Features of the clean clips live in a memory-mapped .npy next to a JSON
+index keyed by file path and stamped with the file's mtime/size. Each
+feature config (FeatureExtractor parameters) gets its own pair of files,
+so switching configs back and forth never recomputes. Missing or changed
+entries are computed in a process pool.
+
+Augmented clips are not stored: training re-augments them every epoch
+(see train.ClipSource).
+"""
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .audio_utils import FeatureExtractor, load_audio
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 2
+
+# Augmentation (matches the original train.py pass)
+NOISE_PROB = 0.5
+NOISE_LEVEL = 0.002
+STRETCH_PROB = 0.5
+STRETCH_RANGE = (0.8, 1.2)
+
+
+def augment_waveform(y, rng):
+    """
+    Random additive noise and time stretch, driven by `rng`.
+    """
+    if rng.random() < NOISE_PROB:
+        y = y + NOISE_LEVEL * rng.standard_normal(len(y)).astype(np.float32)
+    if rng.random() < STRETCH_PROB:
+        import librosa
+        y = librosa.effects.time_stretch(y, rate=rng.uniform(*STRETCH_RANGE))
+    return y
+
+
+# Per-process extractor for pool workers (FeatureExtractor holds thread-locals
+# and is rebuilt from its config rather than pickled)
+_worker_extractor = None
+
+
+def _init_worker(extractor_config):
+    global _worker_extractor
+    _worker_extractor = FeatureExtractor(**extractor_config)
+
+
+def _compute(path):
+    """
+    path -> (path, features or None). Failures yield None.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            y = load_audio(fh.read(), _worker_extractor.sample_rate)
+        return path, _worker_extractor.transform(y).astype(np.float32)
+    except Exception as e:
+        logger.warning(f"Feature extraction failed for {path}: {e}")
+        return path, None
+
+
+class FeatureStore:
+
+    def __init__(self, root, extractor_config, workers=None):
+        self.root = root
+        self.extractor_config = dict(extractor_config)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        extractor = FeatureExtractor(**self.extractor_config)
+        self.shape = (extractor.n_mfcc, extractor.max_pad_len)
+
+        payload = json.dumps({
+            'version': STORE_VERSION,
+            'extractor': self.extractor_config,
+        }, sort_keys=True)
+        self.fingerprint = hashlib.sha256(payload.encode()).hexdigest()[:16]
+        self.index_path = os.path.join(root, f'index-{self.fingerprint}.json')
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def _load_index(self):
+        """
+        {'features': <npy file name>, 'entries': {key: {'stamp', 'row'}}}
+        """
+        try:
+            with open(self.index_path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {'features': None, 'entries': {}}
+
+    def _open_features(self, index):
+        if not index['features']:
+            return None
+        return np.load(os.path.join(self.root, index['features']), mmap_mode='r')
+
+    def open(self, paths):
+        """
+        Make sure the clips at `paths` are in the store, computing only new
+        or changed entries. Returns (features, rows): the read-only memmap
+        and, per path, its row or -1 where extraction failed.
+        """
+        paths = [os.path.normpath(p) for p in paths]
+        index = self._load_index()
+        stamps = {p: self._stamp(p) for p in set(paths)}
+
+        todo = []
+        for path in dict.fromkeys(paths):
+            entry = index['entries'].get(path)
+            if entry is None or entry['stamp'] != stamps[path]:
+                todo.append(path)
+
+        if todo:
+            self._update(index, todo, stamps)
+            index = self._load_index()
+        else:
+            logger.info(f"Feature store: all {len(paths)} entries cached")
+
+        rows = np.full(len(paths), -1, dtype=np.int64)
+        for i, path in enumerate(paths):
+            row = index['entries'][path]['row']
+            if row is not None:
+                rows[i] = row
+        return self._open_features(index), rows
+
+    def load(self, paths):
+        """
+        Features for `paths` as an in-memory array. Returns (X, ok): X is
+        (len(paths), n_mfcc, max_pad_len) float32 and ok marks rows whose
+        extraction succeeded.
+        """
+        features, rows = self.open(paths)
+        ok = rows >= 0
+        X = np.zeros((len(rows),) + self.shape, dtype=np.float32)
+        if ok.any():
+            X[ok] = features[rows[ok]]
+        return X, ok
+
+    def _update(self, index, todo, stamps):
+        logger.info(f"Feature store: computing {len(todo)} entries on {self.workers} workers")
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(self.extractor_config,),
+        ) as pool:
+            results = list(pool.map(_compute, todo, chunksize=max(1, len(todo) // (self.workers * 4))))
+
+        # Keep still-valid rows, drop entries for changed or deleted files
+        old = self._open_features(index)
+        keep = {}
+        for path, entry in index['entries'].items():
+            current = stamps.get(path)
+            if current is None and os.path.exists(path):
+                current = self._stamp(path)
+            if entry['stamp'] == current:
+                keep[path] = entry
+        for path, _ in results:
+            keep.pop(path, None)
+
+        kept_rows = [e['row'] for e in keep.values() if e['row'] is not None]
+        new_rows = [feat for _, feat in results if feat is not None]
+        total = len(kept_rows) + len(new_rows)
+
+        # Each rewrite goes to a new generation file; the index is switched
+        # atomically afterwards, so an interrupted run leaves the old pair intact
+        os.makedirs(self.root, exist_ok=True)
+        generation = int(index.get('generation', 0)) + 1
+        features_name = f'features-{self.fingerprint}-{generation}.npy'
+        out = np.lib.format.open_memmap(
+            os.path.join(self.root, features_name), mode='w+',
+            dtype=np.float32, shape=(max(total, 1),) + self.shape,
+        )
+        new_index = {}
+        row = 0
+        for key, entry in keep.items():
+            if entry['row'] is not None:
+                out[row] = old[entry['row']]
+                new_index[key] = {'stamp': entry['stamp'], 'row': row}
+                row += 1
+            else:
+                new_index[key] = entry
+        for path, feat in results:
+            if feat is not None:
+                out[row] = feat
+                new_index[path] = {'stamp': stamps[path], 'row': row}
+                row += 1
+            else:
+                new_index[path] = {'stamp': stamps[path], 'row': None}
+        out.flush()
+        del out, old
+
+        tmp_index = self.index_path + '.tmp'
+        with open(tmp_index, 'w') as fh:
+            json.dump({'features': features_name, 'generation': generation, 'entries': new_index}, fh)
+        os.replace(tmp_index, self.index_path)
+        if index['features']:
+            os.remove(os.path.join(self.root, index['features']))
+        failed = sum(1 for _, feat in results if feat is None)
+        logger.info(f"Feature store: {len(results) - failed} computed, {failed} failed, {len(kept_rows)} reused")
@@ -0,0 +1,238 @@
+"""
+Inference backends for the cry CNN.
+All backends take an (N, 40, 173, 1) float32 array and return (N, n_classes)
+probabilities. Only the Keras backend imports TensorFlow; the TFLite and
+ONNX backends use their standalone runtimes so serving workers stay small.
+
+    keras   tf.keras model (.keras)                 - tensorflow
+    tflite  TFLite flatbuffer (.tflite)             - ai-edge-litert (or tflite-runtime)
+    onnx    ONNX graph (.onnx)                      - onnxruntime
+
+Exported files are produced by `python manage.py export_model`.
+
+fork_safe=True keeps every op on the calling thread (no runtime thread
+pools), so a model loaded and warmed in the gunicorn master keeps working
+in the forked workers; threads do not survive fork(). TensorFlow graphs
+(tf.function / XLA) always run on the inter-op pool, so those are never
+loaded before a fork (see shareable_across_fork).
+"""
+
+import os
+import threading
+import numpy as np
+from django.conf import settings
+
+
+def _import_tensorflow(runtime):
+    # Read by TensorFlow when it is first imported in the process
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1' if runtime.get('ONEDNN') else '0'
+    import tensorflow as tf
+    return tf
+
+
+class KerasBackend:
+    """
+    `runtime` is a settings.TF_RUNTIME dict. TF_FUNCTION runs the model as
+    one traced graph with a fixed (None, 40, 173, 1) signature instead of
+    layer by layer in eager mode; XLA_JIT also compiles that graph. XLA
+    specializes on the batch size, so batches are padded to a power of two
+    to bound the number of compilations.
+
+    embed() also returns the input of the final (classifier) layer: the
+    penultimate Dense(256) activations of the baseline network, the pooled
+    channels of the compact one.
+    """
+    name = 'keras'
+
+    def __init__(self, path, num_threads=0, fork_safe=False, runtime=None):
+        runtime = runtime or {}
+        tf = _import_tensorflow(runtime)
+        if fork_safe:
+            # Must happen before the first op creates the runtime's pools
+            tf.config.threading.set_intra_op_parallelism_threads(1)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        else:
+            if num_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            if runtime.get('INTER_OP_THREADS'):
+                tf.config.threading.set_inter_op_parallelism_threads(runtime['INTER_OP_THREADS'])
+        self.path = path
+        self._tf = tf
+        self._model = tf.keras.models.load_model(path, compile=False)
+        self.xla_jit = bool(runtime.get('XLA_JIT'))
+        self._traced = bool(self.xla_jit or runtime.get('TF_FUNCTION'))
+        self._call = self._compile(self._model)
+        self._embed_call = None
+        self._embed_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """
+        The loaded tf.keras model (for inspection, e.g. count_params()).
+        """
+        return self._model
+
+    def _compile(self, model):
+        if not self._traced:
+            return lambda x: model(x, training=False)
+        spec = self._tf.TensorSpec([None, *self._model.input_shape[1:]], self._tf.float32)
+        return self._tf.function(lambda x: model(x, training=False),
+                                 input_signature=[spec], jit_compile=self.xla_jit)
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        rows = features.shape[0]
+        if self.xla_jit:
+            padded = 1 << max(0, rows - 1).bit_length()
+            if padded != rows:
+                features = np.concatenate([features, np.zeros((padded - rows, *features.shape[1:]), np.float32)])
+        return self._call(self._tf.convert_to_tensor(features)).numpy()[:rows]
+
+    def embed(self, features):
+        """
+        (embeddings, probabilities) for an (N, 40, 173, 1) batch, in one
+        forward pass. Not padded: XLA compiles each new batch size once.
+        """
+        if self._embed_call is None:
+            with self._embed_lock:
+                if self._embed_call is None:
+                    tf = self._tf
+                    model = tf.keras.Model(self._model.inputs,
+                                           [self._model.layers[-1].input, self._model.outputs[0]])
+                    self._embed_call = self._compile(model)
+        embeddings, probs = self._embed_call(self._tf.convert_to_tensor(np.asarray(features, dtype=np.float32)))
+        return embeddings.numpy(), probs.numpy()
+
+
+class TFLiteBackend:
+    """
+    A TFLite interpreter is not thread-safe and has one input shape at a
+    time; calls are serialized and the input is resized when the batch
+    size changes (the batching engine keeps this rare).
+    """
+    name = 'tflite'
+
+    def __init__(self, path, num_threads=0, fork_safe=False):
+        if fork_safe:
+            num_threads = 1
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            from tflite_runtime.interpreter import Interpreter
+        self.path = path
+        self._interpreter = Interpreter(model_path=path, num_threads=num_threads or None)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    def _quantize(self, features):
+        scale, zero_point = self._input['quantization']
+        if self._input['dtype'] == np.float32 or not scale:
+            return features.astype(self._input['dtype'], copy=False)
+        return np.round(features / scale + zero_point).astype(self._input['dtype'])
+
+    def _dequantize(self, output):
+        scale, zero_point = self._output['quantization']
+        if self._output['dtype'] == np.float32 or not scale:
+            return output.astype(np.float32, copy=False)
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        with self._lock:
+            if features.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], features.shape, strict=False)
+                self._interpreter.allocate_tensors()
+                self._batch_size = features.shape[0]
+            self._interpreter.set_tensor(self._input['index'], self._quantize(features))
+            self._interpreter.invoke()
+            # Copy: the output buffer is reused by the next invoke()
+            return self._dequantize(self._interpreter.get_tensor(self._output['index'])).copy()
+
+
+class OnnxBackend:
+    name = 'onnx'
+
+    def __init__(self, path, num_threads=0, fork_safe=False):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if fork_safe:
+            options.intra_op_num_threads = 1
+            options.inter_op_num_threads = 1
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        elif num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self._session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        return self._session.run(None, {self._input_name: features})[0]
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend,
+}
+
+
+# Model file extensions each backend serves (model_registry scans for these)
+MODEL_EXTENSIONS = {
+    'keras': ('.keras', '.h5'),
+    'tflite': ('.tflite',),
+    'onnx': ('.onnx',),
+}
+
+
+def backend_path(name):
+    """
+    Model file served by backend `name` (settings.INFERENCE_BACKEND paths).
+    """
+    config = settings.INFERENCE_BACKEND
+    return {
+        'keras': settings.MODEL_PATH,
+        'tflite': config['TFLITE_PATH'],
+        'onnx': config['ONNX_PATH'],
+    }.get(name, '')
+
+
+def shareable_across_fork(name, runtime=None):
+    """
+    Whether a model of backend `name` loaded before fork() (fork_safe=True)
+    still runs in the children.
+    """
+    runtime = runtime or {}
+    return not (name == 'keras' and (runtime.get('TF_FUNCTION') or runtime.get('XLA_JIT')))
+
+
+def import_runtime(name, runtime=None):
+    """
+    Import backend `name`'s runtime library without creating any runtime
+    state, so a process can preload it and fork.
+    """
+    if name == 'keras':
+        _import_tensorflow(runtime or {})
+    elif name == 'tflite':
+        try:
+            import ai_edge_litert.interpreter
+        except ImportError:
+            import tflite_runtime.interpreter
+    elif name == 'onnx':
+        import onnxruntime
+
+
+def load_backend(name, path, num_threads=0, fork_safe=False, runtime=None):
+    """
+    Instantiate backend `name`; `runtime` (settings.TF_RUNTIME) only applies to keras.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if name == 'keras':
+        return KerasBackend(path, num_threads=num_threads, fork_safe=fork_safe, runtime=runtime)
+    return BACKENDS[name](path, num_threads=num_threads, fork_safe=fork_safe)
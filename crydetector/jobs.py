@@ -0,0 +1,200 @@
+"""
+Asynchronous prediction jobs on top of the default database.
+POST /api/v1/jobs/ stores the upload as a PredictionJob; worker processes
+(`manage.py run_prediction_workers`) claim queued jobs in batches, score
+them with a single forward pass and store the API result for polling.
+"""
+
+import logging
+import os
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import PredictionJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(audio_data, filename, use_gate=True, api_key='', audio_sha256=''):
+    """
+    Store an upload as a queued job for API key `api_key` (its name) and
+    return it. `audio_sha256` is the digest of the whole upload when
+    audio_data only holds the model window (see upload_digest).
+    """
+    depth = PredictionJob.objects.filter(status=PredictionJob.QUEUED).count()
+    return PredictionJob.objects.create(
+        filename=filename[:255],
+        audio=audio_data,
+        use_gate=use_gate,
+        api_key=api_key,
+        audio_sha256=audio_sha256,
+        queue_depth_at_submit=depth,
+    )
+
+
+def requeue_stale(stale_seconds):
+    """
+    Put back jobs whose worker died mid-batch (running for too long).
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+    return PredictionJob.objects.filter(status=PredictionJob.RUNNING, started_at__lt=cutoff).update(
+        status=PredictionJob.QUEUED, claim_token=None, worker='', started_at=None,
+    )
+
+
+def claim_batch(worker, batch_size):
+    """
+    Atomically mark up to `batch_size` of the oldest queued jobs as running
+    for `worker`. A single conditional UPDATE (no read-then-write
+    transaction, which SQLite cannot upgrade under contention), so
+    concurrent workers never claim the same job.
+    """
+    token = uuid.uuid4()
+    oldest = (PredictionJob.objects.filter(status=PredictionJob.QUEUED)
+              .order_by('created_at').values('id')[:batch_size])
+    claimed = PredictionJob.objects.filter(id__in=oldest, status=PredictionJob.QUEUED).update(
+        status=PredictionJob.RUNNING, claim_token=token, worker=worker, started_at=timezone.now(),
+    )
+    if not claimed:
+        return []
+    return list(PredictionJob.objects.filter(claim_token=token).order_by('created_at'))
+
+
+def process_batch(jobs):
+    """
+    Decode/gate every claimed job, run one forward pass for those that need
+    it and store results. Per-job failures do not affect the rest.
+    """
+    from .audit import record_prediction
+    from .views import format_item_result, prepare_audio, score_prepared
+
+    prepared = []
+    for job in jobs:
+        try:
+            prepared.append({**prepare_audio(bytes(job.audio), job.use_gate, digest=job.audio_sha256 or None),
+                             'error': None})
+        except ValueError as e:
+            prepared.append({'error': {'status': 422, 'error': f'Corrupted or silent audio: {str(e)}'}})
+
+    # Gate setting is per job; score the two groups separately so bypassed
+    # results are never cached
+    for use_gate in (True, False):
+        score_prepared([p for job, p in zip(jobs, prepared) if job.use_gate == use_gate], use_gate)
+
+    finished_at = timezone.now()
+    for job, item in zip(jobs, prepared):
+        job.attempts += 1
+        job.finished_at = finished_at
+        job.audio = b''
+        if item['error']:
+            job.status = PredictionJob.FAILED
+            job.error = item['error']['error']
+            job.error_status = item['error']['status']
+        else:
+            job.status = PredictionJob.DONE
+            job.result = format_item_result(item)
+            record_prediction('jobs', item, job.result, job.api_key)
+        job.save(update_fields=['status', 'result', 'error', 'error_status', 'attempts', 'finished_at', 'audio'])
+
+
+def fail_batch(jobs, message):
+    """
+    Mark claimed jobs as failed after an unexpected error (e.g. model unavailable).
+    """
+    PredictionJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=PredictionJob.FAILED, error=message, error_status=500,
+        finished_at=timezone.now(), audio=b'',
+    )
+
+
+def run_worker(name, stop_event=None, batch_size=None, poll_interval=None):
+    """
+    Drain the queue until `stop_event` is set. Defaults come from settings.JOB_QUEUE.
+    """
+    config = settings.JOB_QUEUE
+    batch_size = batch_size or config['BATCH_SIZE']
+    poll_interval = poll_interval or config['POLL_INTERVAL']
+    from .model_loader import warm_up
+
+    # Load before claiming work so the first batch does not pay for it
+    warm_up()
+    logger.info(f"Prediction worker {name} started (pid {os.getpid()})")
+    last_stale_check = 0.0
+    while stop_event is None or not stop_event.is_set():
+        try:
+            now = time.monotonic()
+            if now - last_stale_check > config['STALE_SECONDS'] / 2:
+                requeued = requeue_stale(config['STALE_SECONDS'])
+                if requeued:
+                    logger.warning(f"Requeued {requeued} stale jobs")
+                last_stale_check = now
+
+            jobs = claim_batch(name, batch_size)
+        except DatabaseError as e:
+            # e.g. sqlite lock timeout under contention; retry on the next poll
+            logger.warning(f"Job queue poll failed: {e}")
+            jobs = []
+        if not jobs:
+            time.sleep(poll_interval)
+            continue
+        try:
+            process_batch(jobs)
+        except Exception as e:
+            logger.error(f"Prediction job batch failed: {e}")
+            try:
+                fail_batch(jobs, 'Internal server error')
+            except DatabaseError as e:
+                # Left 'running'; requeue_stale picks them up again
+                logger.error(f"Could not mark failed jobs: {e}")
+    logger.info(f"Prediction worker {name} stopped")
+
+
+def job_payload(job):
+    """
+    Public API body for GET /api/v1/jobs/<id>/.
+    """
+    body = {
+        'job_id': str(job.id),
+        'status': job.status,
+        'filename': job.filename,
+        'created_at': job.created_at.isoformat(),
+        'timings': {
+            'queue_depth_at_submit': job.queue_depth_at_submit,
+            'wait_ms': job.wait_ms,
+            'processing_ms': job.processing_ms,
+        },
+    }
+    if job.status == PredictionJob.DONE:
+        body['result'] = job.result
+    elif job.status == PredictionJob.FAILED:
+        body['error'] = job.error
+        body['error_status'] = job.error_status
+    return body
+
+
+def queue_stats(window=500):
+    """
+    Queue depth by status, age of the oldest queued job, and mean wait /
+    processing time over the last `window` finished jobs.
+    """
+    counts = dict(PredictionJob.objects.order_by().values_list('status').annotate(n=Count('id')))
+    oldest = PredictionJob.objects.filter(status=PredictionJob.QUEUED).aggregate(t=Min('created_at'))['t']
+
+    recent = list(PredictionJob.objects.filter(finished_at__isnull=False, started_at__isnull=False)
+                  .order_by('-finished_at').values_list('created_at', 'started_at', 'finished_at')[:window])
+    wait = [(s - c).total_seconds() * 1000.0 for c, s, _ in recent]
+    processing = [(f - s).total_seconds() * 1000.0 for _, s, f in recent]
+    return {
+        **{status: counts.get(status, 0) for status, _ in PredictionJob.STATUS_CHOICES},
+        'oldest_queued_age_s': round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0.0,
+        'recent_jobs': len(recent),
+        'wait_ms_avg': round(sum(wait) / len(wait), 1) if wait else 0.0,
+        'wait_ms_max': round(max(wait), 1) if wait else 0.0,
+        'processing_ms_avg': round(sum(processing) / len(processing), 1) if processing else 0.0,
+        'processing_ms_max': round(max(processing), 1) if processing else 0.0,
+    }
@@ -0,0 +1,100 @@
+"""
+Roll up the prediction audit log (PredictionAudit) per label and per hour.
+
+    python manage.py audit_report
+    python manage.py audit_report --hours 168 --endpoint predict
+    python manage.py audit_report --hours 24 --json
+
+Per label: predictions, share, mean confidence, cache hits, mean / max
+latency. Per hour (UTC): predictions, label counts, gated, cache hits, mean
+latency. Latency is total_ms (decode to result, batching wait included).
+"""
+
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def _round(value, digits=2):
+    return round(value, digits) if value is not None else None
+
+
+class Command(BaseCommand):
+    help = "Per-label and per-hour statistics from the prediction audit log."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Look back this many hours')
+        parser.add_argument('--endpoint', default=None, help='Only this endpoint (predict, batch, jobs, home)')
+        parser.add_argument('--api-key', default=None, help='Only this API key id')
+        parser.add_argument('--model-version', default=None, help='Only this model version')
+        parser.add_argument('--json', action='store_true', help='Print JSON instead of tables')
+
+    def handle(self, *args, **options):
+        from crydetector.models import PredictionAudit
+
+        since = timezone.now() - timedelta(hours=options['hours'])
+        rows = PredictionAudit.objects.filter(created_at__gte=since)
+        for option, field in (('endpoint', 'endpoint'), ('api_key', 'api_key'), ('model_version', 'model_version')):
+            if options[option] is not None:
+                rows = rows.filter(**{field: options[option]})
+
+        total = rows.count()
+        by_label = [
+            {
+                'label': r['label'],
+                'count': r['count'],
+                'share': round(r['count'] / total, 4),
+                'mean_confidence': _round(r['confidence'], 4),
+                'cached': r['cached'],
+                'mean_ms': _round(r['mean_ms']),
+                'max_ms': _round(r['max_ms']),
+            }
+            for r in rows.values('label').annotate(
+                count=Count('id'), confidence=Avg('confidence'), cached=Count('id', filter=Q(cached=True)),
+                mean_ms=Avg('total_ms'), max_ms=Max('total_ms'),
+            ).order_by('-count', 'label')
+        ]
+
+        labels = list(settings.CRY_CLASSES) + ['not_crying']
+        by_hour = {}
+        for r in rows.annotate(hour=TruncHour('created_at')).values('hour').annotate(
+                count=Count('id'), gated=Count('id', filter=Q(gated=True)),
+                cached=Count('id', filter=Q(cached=True)), mean_ms=Avg('total_ms')).order_by('hour'):
+            by_hour[r['hour']] = {
+                'hour': r['hour'].isoformat(), 'count': r['count'], 'labels': {},
+                'gated': r['gated'], 'cached': r['cached'], 'mean_ms': _round(r['mean_ms']),
+            }
+        for r in rows.annotate(hour=TruncHour('created_at')).values('hour', 'label').annotate(count=Count('id')):
+            by_hour[r['hour']]['labels'][r['label']] = r['count']
+            if r['label'] not in labels:
+                labels.append(r['label'])
+
+        report = {
+            'since': since.isoformat(),
+            'predictions': total,
+            'by_label': by_label,
+            'by_hour': list(by_hour.values()),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{total} predictions since {since:%Y-%m-%d %H:%M} UTC")
+        if not total:
+            return
+        self.stdout.write(f"\n{'label':<12}{'count':>8}{'share':>8}{'conf':>8}{'cached':>8}{'mean ms':>10}{'max ms':>10}")
+        for r in by_label:
+            self.stdout.write(f"{r['label']:<12}{r['count']:>8}{r['share']:>8.1%}{r['mean_confidence']:>8.3f}"
+                              f"{r['cached']:>8}{r['mean_ms'] or 0:>10.1f}{r['max_ms'] or 0:>10.1f}")
+
+        columns = [label for label in labels if any(label in h['labels'] for h in by_hour.values())]
+        self.stdout.write(f"\n{'hour (UTC)':<18}{'count':>8}" + "".join(f"{c[:10]:>11}" for c in columns)
+                          + f"{'gated':>8}{'cached':>8}{'mean ms':>10}")
+        for h in by_hour.values():
+            self.stdout.write(f"{h['hour'][:16].replace('T', ' '):<18}{h['count']:>8}"
+                              + "".join(f"{h['labels'].get(c, 0):>11}" for c in columns)
+                              + f"{h['gated']:>8}{h['cached']:>8}{h['mean_ms'] or 0:>10.1f}")
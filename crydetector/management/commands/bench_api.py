@@ -0,0 +1,397 @@
+"""
+Repeatable latency / throughput benchmark of the prediction path on corpus
+clips, with a stored baseline to catch regressions.
+
+    python manage.py bench_api --save-baseline
+    python manage.py bench_api --concurrency 1,4,8 --fail-on-regression
+
+Suites (--suites):
+    micro     preprocess_audio, predict_fast and process_prediction called
+              directly, one at a time
+    client    POST /api/v1/predict/ through the Django test client (full
+              middleware / view stack, no server), per concurrency level
+    gunicorn  the same against a local gunicorn (gunicorn.conf.py), per
+              concurrency level
+
+Every suite reports throughput, p50 / p95 / p99 latency and peak memory
+(RSS; for gunicorn also PSS, summed over the master and its workers). The
+prediction cache is off unless --cache, the clips are a seeded sample of
+the corpus and each measurement is the median of --repeat runs, so runs
+are comparable. With a baseline file present, each metric is compared
+against it and changes beyond --tolerance are listed as regressions.
+Baselines are host-specific: record one per machine.
+"""
+
+import glob
+import io
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from .bench_prefork import _children, _memory_mb
+
+SUITES = ('micro', 'client', 'gunicorn')
+MICRO = ('preprocess_audio', 'predict_fast', 'process_prediction')
+
+# (metric, higher is better)
+COMPARED = (
+    ('throughput_per_sec', True),
+    ('latency_ms.p50', False),
+    ('latency_ms.p95', False),
+    ('latency_ms.p99', False),
+    ('peak_rss_mb', False),
+)
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def _latency_summary(latencies_ms, wall_seconds):
+    values = np.array(latencies_ms) if latencies_ms else np.zeros(1)
+    return {
+        'calls': len(latencies_ms),
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_per_sec': round(len(latencies_ms) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        'latency_ms': {
+            'p50': round(float(np.percentile(values, 50)), 2),
+            'p95': round(float(np.percentile(values, 95)), 2),
+            'p99': round(float(np.percentile(values, 99)), 2),
+            'max': round(float(values.max()), 2),
+        },
+    }
+
+
+def _metric(entry, path):
+    for part in path.split('.'):
+        if not isinstance(entry, dict) or part not in entry:
+            return None
+        entry = entry[part]
+    return entry
+
+
+class _PeakMemory:
+    """
+    Samples the summed RSS / PSS of `pids()` on a background thread.
+    """
+
+    def __init__(self, pids, interval=0.05):
+        self.pids = pids
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_pss_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bench-memory', daemon=True)
+
+    def _sample(self):
+        usage = [m for m in (_memory_mb(pid) for pid in self.pids()) if m]
+        if usage:
+            self.peak_rss_mb = max(self.peak_rss_mb, round(sum(m['rss_mb'] for m in usage), 1))
+            self.peak_pss_mb = max(self.peak_pss_mb, round(sum(m['pss_mb'] for m in usage), 1))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def _measure(call, concurrency, total, repeat):
+    """
+    _drive `repeat` times and keep the median run by throughput, which is
+    far less noisy than a single run on a shared or small machine.
+    """
+    runs = sorted((_drive(call, concurrency, total) for _ in range(max(1, repeat))),
+                  key=lambda r: r['throughput_per_sec'])
+    return runs[len(runs) // 2]
+
+
+def _drive(call, concurrency, total):
+    """
+    Run `call(i)` for i in range(total) on `concurrency` threads.
+    `call` returns a status; latencies are kept for status 200 only.
+    """
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = call(i)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(max(1, concurrency))]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result = _latency_summary(latencies, time.perf_counter() - started)
+    result['status_counts'] = {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))}
+    return result
+
+
+class Command(BaseCommand):
+    help = "Benchmark the prediction path (micro, test client, gunicorn) and compare with a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suites', default=','.join(SUITES), help=f'Comma list of {", ".join(SUITES)}')
+        parser.add_argument('--concurrency', default='1,4', help='Concurrent clients for client / gunicorn')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per concurrency level')
+        parser.add_argument('--iterations', type=int, default=50, help='Calls per microbenchmark')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (median kept)')
+        parser.add_argument('--clips', type=int, default=32, help='Corpus clips sampled (seeded)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--cache', action='store_true', help='Leave the prediction cache on')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+        parser.add_argument('--port', type=int, default=8020)
+        parser.add_argument('--timeout', type=float, default=300.0, help='Seconds to wait for gunicorn')
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'bench_baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.15,
+                            help='Relative change that counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--output', default='', help='Also write the JSON report here')
+
+    def handle(self, *args, **options):
+        suites = [s.strip() for s in options['suites'].split(',') if s.strip()]
+        unknown = [s for s in suites if s not in SUITES]
+        if unknown:
+            raise CommandError(f"Unknown suite(s): {', '.join(unknown)}")
+        levels = _int_list(options['concurrency']) or [1]
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+        rng = np.random.default_rng(options['seed'])
+        clips = []
+        for p in rng.choice(paths, min(options['clips'], len(paths)), replace=False):
+            with open(p, 'rb') as fh:
+                clips.append((os.path.basename(p), fh.read()))
+
+        results = {}
+        overrides = {}
+        if not options['cache']:
+            overrides['PREDICTION_CACHE'] = {**settings.PREDICTION_CACHE, 'ENABLED': False}
+        # The test client sends Host: testserver
+        overrides['ALLOWED_HOSTS'] = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(**overrides):
+            if 'micro' in suites:
+                results.update(self._micro(clips, options))
+            if 'client' in suites:
+                results.update(self._client(clips, levels, options))
+        if 'gunicorn' in suites:
+            results.update(self._gunicorn(clips, levels, options))
+
+        report = {
+            'host': {
+                'cores': os.cpu_count(), 'platform': platform.platform(), 'python': platform.python_version(),
+                'backend': settings.INFERENCE_BACKEND['NAME'],
+            },
+            'config': {k: options[k] for k in ('concurrency', 'requests', 'iterations', 'repeat', 'clips', 'seed',
+                                               'cache', 'workers')},
+            'suites': results,
+        }
+
+        baseline = None
+        if os.path.exists(options['baseline']) and not options['save_baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+            report['comparison'] = self._compare(results, baseline, options['tolerance'])
+            if baseline.get('host') != report['host']:
+                report['comparison']['warning'] = 'Baseline was recorded on a different host / backend'
+
+        text = json.dumps(report, indent=2)
+        self.stdout.write(text)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(text)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as fh:
+                fh.write(text)
+            self.stderr.write(f"Baseline written to {options['baseline']}")
+
+        if baseline is not None:
+            regressions = report['comparison']['regressions']
+            for r in regressions:
+                self.stderr.write(f"REGRESSION {r['suite']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                                  f"({r['change_percent']:+.1f}%)")
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+
+    def _micro(self, clips, options):
+        from crydetector.audio_utils import preprocess_audio
+        from crydetector.model_loader import predict_fast, warm_up
+        from crydetector.views import process_prediction
+
+        if not warm_up():
+            raise CommandError("Model unavailable")
+        features = []
+        for _, data in clips:
+            try:
+                features.append(preprocess_audio(io.BytesIO(data)))
+            except ValueError:
+                continue
+        if not features:
+            raise CommandError("No sampled clip could be preprocessed")
+
+        calls = {
+            'preprocess_audio': lambda i: preprocess_audio(io.BytesIO(clips[i % len(clips)][1])),
+            'predict_fast': lambda i: predict_fast(features[i % len(features)]),
+            'process_prediction': lambda i: process_prediction(io.BytesIO(clips[i % len(clips)][1])),
+        }
+        results = {}
+        for name in MICRO:
+            call = calls[name]
+
+            def timed(i):
+                call(i)
+                return 200
+
+            # Untimed pass: first calls pay lazy imports / engine start-up
+            _drive(timed, 1, min(5, len(clips)))
+            with _PeakMemory(lambda: [os.getpid()]) as memory:
+                entry = _measure(timed, 1, max(1, options['iterations']), options['repeat'])
+            entry['peak_rss_mb'] = memory.peak_rss_mb
+            results[f'micro.{name}'] = entry
+            self.stderr.write(f"micro.{name}: p50 {entry['latency_ms']['p50']} ms")
+        return results
+
+    def _client(self, clips, levels, options):
+        from django.test import Client
+        from crydetector.model_loader import warm_up
+
+        if not warm_up():
+            raise CommandError("Model unavailable")
+        local = threading.local()
+
+        def call(i):
+            # Client instances are not thread-safe
+            client = getattr(local, 'client', None) or Client()
+            local.client = client
+            name, data = clips[i % len(clips)]
+            upload = io.BytesIO(data)
+            upload.name = name
+            return client.post('/api/v1/predict/', {'audio': upload}, HTTP_X_API_KEY=settings.API_KEY).status_code
+
+        results = {}
+        _drive(call, 1, min(5, len(clips)))
+        for level in levels:
+            with _PeakMemory(lambda: [os.getpid()]) as memory:
+                entry = _measure(call, level, max(1, options['requests']), options['repeat'])
+            results[f'client.c{level}'] = {'concurrency': level, **entry, 'peak_rss_mb': memory.peak_rss_mb}
+            self.stderr.write(f"client.c{level}: {entry['throughput_per_sec']} req/s, "
+                              f"p50 {entry['latency_ms']['p50']} ms")
+        return results
+
+    def _gunicorn(self, clips, levels, options):
+        import requests
+
+        base = f"http://127.0.0.1:{options['port']}"
+        env = dict(os.environ, PREDICTION_CACHE='True' if options['cache'] else 'False')
+        cmd = [sys.executable, '-m', 'gunicorn', 'crybaby.wsgi', '--workers', str(options['workers']),
+               '--bind', f"127.0.0.1:{options['port']}", '--timeout', str(int(options['timeout'])),
+               '--log-level', 'warning']
+        server = subprocess.Popen(cmd, cwd=str(settings.BASE_DIR), env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            session = requests.Session()
+            deadline = time.perf_counter() + options['timeout']
+            # Every worker answers readiness once warm; ask a few times so each gets probed
+            ready = 0
+            while ready < 2 * options['workers']:
+                if server.poll() is not None:
+                    raise CommandError(f"gunicorn exited with {server.returncode}")
+                if time.perf_counter() > deadline:
+                    raise CommandError(f"gunicorn not ready within {options['timeout']}s")
+                try:
+                    ok = session.get(f'{base}/health/ready/', timeout=10).status_code == 200
+                except requests.RequestException:
+                    ok = False
+                ready = ready + 1 if ok else 0
+                if not ok:
+                    time.sleep(0.2)
+
+            local = threading.local()
+
+            def call(i):
+                s = getattr(local, 'session', None) or requests.Session()
+                local.session = s
+                name, data = clips[i % len(clips)]
+                return s.post(f'{base}/api/v1/predict/', headers={'X-API-KEY': settings.API_KEY},
+                              files={'audio': (name, data, 'audio/wav')}, timeout=options['timeout']).status_code
+
+            results = {}
+            _drive(call, options['workers'], 2 * options['workers'])
+            for level in levels:
+                with _PeakMemory(lambda: [server.pid, *_children(server.pid)], interval=0.1) as memory:
+                    entry = _measure(call, level, max(1, options['requests']), options['repeat'])
+                results[f'gunicorn.c{level}'] = {
+                    'concurrency': level, 'workers': options['workers'], **entry,
+                    'peak_rss_mb': memory.peak_rss_mb, 'peak_pss_mb': memory.peak_pss_mb,
+                }
+                self.stderr.write(f"gunicorn.c{level}: {entry['throughput_per_sec']} req/s, "
+                                  f"p50 {entry['latency_ms']['p50']} ms")
+            return results
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+    @staticmethod
+    def _compare(results, baseline, tolerance):
+        """
+        Relative change of every COMPARED metric per suite; regressions are
+        changes in the bad direction beyond `tolerance`.
+        """
+        suites, regressions = {}, []
+        for suite, current in results.items():
+            before = baseline.get('suites', {}).get(suite)
+            if not before:
+                continue
+            rows = {}
+            for metric, higher_is_better in COMPARED:
+                now, then = _metric(current, metric), _metric(before, metric)
+                if not now or not then:
+                    continue
+                change = (now - then) / then
+                regressed = change < -tolerance if higher_is_better else change > tolerance
+                rows[metric] = {'baseline': then, 'current': now, 'change_percent': round(change * 100.0, 1),
+                                'regression': regressed}
+                if regressed:
+                    regressions.append({'suite': suite, 'metric': metric, **rows[metric]})
+            suites[suite] = rows
+        return {'tolerance': tolerance, 'suites': suites, 'regressions': regressions}
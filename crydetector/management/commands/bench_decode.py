@@ -0,0 +1,79 @@
+"""
+Compare per-clip decode time of the direct WAV decoder against the
+previous librosa.load path on corpus files.
+
+    python manage.py bench_decode --limit 100
+"""
+
+import io
+import glob
+import json
+import os
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Benchmark WAV decoding: fast decoder vs. librosa.load."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--limit', type=int, default=100, help='Number of clips to decode')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed passes per clip (best is kept)')
+
+    def handle(self, *args, **options):
+        import librosa
+        from crydetector.audio_utils import load_audio
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        paths = paths[:options['limit']]
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+
+        sr = settings.AUDIO_CONFIG['SAMPLE_RATE']
+        duration = settings.AUDIO_CONFIG['DURATION']
+        target = int(sr * duration)
+
+        def librosa_path(data):
+            y, _ = librosa.load(io.BytesIO(data), sr=sr, mono=True)
+            return y[:target]
+
+        def fast_path(data):
+            return load_audio(data, sr, duration)
+
+        clips = []
+        for p in paths:
+            with open(p, 'rb') as fh:
+                clips.append(fh.read())
+
+        # Warm-up (resampler init, numba JIT) outside the timed region
+        librosa_path(clips[0])
+        fast_path(clips[0])
+
+        old_ms, new_ms, max_diff = [], [], 0.0
+        for data in clips:
+            old_ms.append(self._best(librosa_path, data, options['repeat']))
+            new_ms.append(self._best(fast_path, data, options['repeat']))
+            a, b = librosa_path(data), fast_path(data)
+            n = min(len(a), len(b))
+            max_diff = max(max_diff, float(np.max(np.abs(a[:n] - b[:n]))) if n else 0.0)
+
+        report = {
+            'clips': len(clips),
+            'librosa_load_ms': {'mean': round(float(np.mean(old_ms)), 3), 'p50': round(float(np.median(old_ms)), 3)},
+            'fast_decode_ms': {'mean': round(float(np.mean(new_ms)), 3), 'p50': round(float(np.median(new_ms)), 3)},
+            'speedup': round(float(np.mean(old_ms) / np.mean(new_ms)), 2),
+            'max_abs_diff': max_diff,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def _best(fn, data, repeat):
+        best = float('inf')
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            fn(data)
+            best = min(best, time.perf_counter() - started)
+        return best * 1000.0
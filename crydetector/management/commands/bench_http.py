@@ -0,0 +1,106 @@
+"""
+Drive a running server with concurrent /api/v1/predict/ uploads of corpus
+clips and report latency percentiles, throughput and status codes.
+Used to compare deployment profiles (WSGI gunicorn vs. ASGI uvicorn).
+Start the server with PREDICTION_CACHE=False, otherwise repeated clips are
+served from the cache and the numbers mostly measure the cache.
+
+    gunicorn crybaby.wsgi --workers 2 --threads 4 &
+    python manage.py bench_http --url http://127.0.0.1:8000 --concurrency 16 --requests 400
+
+    ASYNC_VIEWS=True gunicorn crybaby.asgi:application -k uvicorn.workers.UvicornWorker --workers 2 &
+    python manage.py bench_http --url http://127.0.0.1:8000 --concurrency 16 --requests 400
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Load-test /api/v1/predict/ on a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+        parser.add_argument('--path', default='/api/v1/predict/')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=200, help='Total requests')
+        parser.add_argument('--clips', type=int, default=50, help='Distinct corpus clips to cycle through')
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--api-key', default=settings.API_KEY)
+        parser.add_argument('--timeout', type=float, default=120.0)
+
+    def handle(self, *args, **options):
+        import requests
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+        rng = np.random.default_rng(0)
+        clips = []
+        for p in rng.choice(paths, min(options['clips'], len(paths)), replace=False):
+            with open(p, 'rb') as fh:
+                clips.append((os.path.basename(p), fh.read()))
+
+        url = options['url'].rstrip('/') + options['path']
+        headers = {'X-API-KEY': options['api_key']}
+        total = max(1, options['requests'])
+        counter = iter(range(total))
+        counter_lock = threading.Lock()
+        latencies, statuses, errors = [], {}, []
+        results_lock = threading.Lock()
+
+        def client():
+            session = requests.Session()
+            while True:
+                with counter_lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                name, data = clips[i % len(clips)]
+                started = time.perf_counter()
+                try:
+                    r = session.post(url, headers=headers, files={'audio': (name, data, 'audio/wav')},
+                                     timeout=options['timeout'])
+                    status = r.status_code
+                except requests.RequestException as e:
+                    status = 'error'
+                    with results_lock:
+                        errors.append(str(e))
+                elapsed = (time.perf_counter() - started) * 1000.0
+                with results_lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 200:
+                        latencies.append(elapsed)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(max(1, options['concurrency']))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        ok = np.array(latencies) if latencies else np.zeros(1)
+        report = {
+            'url': url,
+            'concurrency': options['concurrency'],
+            'requests': total,
+            'wall_seconds': round(wall, 3),
+            'throughput_rps': round(len(latencies) / wall, 2),
+            'status_counts': {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+            'latency_ms': {
+                'p50': round(float(np.percentile(ok, 50)), 2),
+                'p95': round(float(np.percentile(ok, 95)), 2),
+                'p99': round(float(np.percentile(ok, 99)), 2),
+                'max': round(float(ok.max()), 2),
+            },
+        }
+        if errors:
+            report['first_error'] = errors[0]
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,75 @@
+"""
+Measure inference throughput against the number of concurrent threads,
+with and without the micro-batching engine.
+
+    python manage.py bench_inference --threads 1,2,4,8 --requests 400
+"""
+
+import json
+import time
+import threading
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Benchmark predict throughput vs. thread count (batched and unbatched)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,2,4,8', help='Comma-separated thread counts')
+        parser.add_argument('--requests', type=int, default=400, help='Total single-clip requests per run')
+        parser.add_argument('--max-batch-size', type=int, default=settings.INFERENCE_BATCHING['MAX_BATCH_SIZE'])
+        parser.add_argument('--max-wait-ms', type=float, default=settings.INFERENCE_BATCHING['MAX_WAIT_MS'])
+
+    def handle(self, *args, **options):
+        from crydetector.inference_backends import backend_path
+        from crydetector.model_loader import BatchInferenceEngine, _run_model, get_model
+
+        model = get_model()
+        if model is None:
+            raise CommandError(f"Model unavailable at {backend_path(settings.INFERENCE_BACKEND['NAME'])}")
+
+        cfg = settings.AUDIO_CONFIG
+        features = np.random.default_rng(0).standard_normal(
+            (1, cfg['N_MFCC'], cfg['MAX_PAD_LEN'], 1)).astype(np.float32)
+        thread_counts = [int(t) for t in options['threads'].split(',') if t.strip()]
+        total = options['requests']
+
+        results = []
+        for threads in thread_counts:
+            unbatched = self._run(lambda: _run_model(model, features), threads, total)
+            engine = BatchInferenceEngine(model, options['max_batch_size'], options['max_wait_ms'])
+            batched = self._run(lambda: engine.submit(features), threads, total)
+            stats = engine.stats()
+            results.append({
+                'threads': threads,
+                'unbatched_rps': unbatched,
+                'batched_rps': batched,
+                'avg_batch_size': stats['avg_batch_size'],
+                'by_batch_size': stats['by_batch_size'],
+            })
+            self.stdout.write(
+                f"threads={threads:<3} unbatched={unbatched:8.1f} req/s  "
+                f"batched={batched:8.1f} req/s  avg_batch={stats['avg_batch_size']}"
+            )
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    def _run(call, threads, total):
+        per_thread = max(1, total // threads)
+        call()  # warm-up outside the timed region
+
+        def worker():
+            for _ in range(per_thread):
+                call()
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - started
+        return round(per_thread * threads / elapsed, 1)
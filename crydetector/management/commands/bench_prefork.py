@@ -0,0 +1,202 @@
+"""
+Start gunicorn with and without preload_app and compare how long it takes
+to serve the first prediction / to have a model in every worker, and how
+much memory the master and each worker hold afterwards.
+
+    python manage.py bench_prefork --workers 3
+    python manage.py bench_prefork --workers 3 --backend onnx
+
+RSS counts shared pages in every process that maps them. PSS splits shared
+pages between their users (the sum over processes is the real footprint)
+and USS is what a process holds alone. Linux only (/proc).
+"""
+
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = {'preload': 'True', 'per-worker': 'False'}
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            return [int(p) for p in fh.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_mb(pid):
+    """
+    rss / pss / uss of a process in MB (from smaps_rollup).
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {
+        'pid': pid,
+        'rss_mb': round(fields.get('Rss', 0) / 1024.0, 1),
+        'pss_mb': round(fields.get('Pss', 0) / 1024.0, 1),
+        'uss_mb': round(uss / 1024.0, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare gunicorn preload_app against per-worker model loading."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--backend', choices=['keras', 'tflite', 'onnx'], default=None,
+                            help='Inference backend (default: settings.INFERENCE_BACKEND)')
+        parser.add_argument('--modes', default='per-worker,preload', help=f'Comma list of {", ".join(MODES)}')
+        parser.add_argument('--requests', type=int, default=0,
+                            help='Predictions sent once every worker is ready (default: 10 per worker)')
+        parser.add_argument('--port', type=int, default=8019)
+        parser.add_argument('--timeout', type=float, default=300.0, help='Seconds to wait for readiness')
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+
+    def handle(self, *args, **options):
+        import requests
+
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        unknown = [m for m in modes if m not in MODES]
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(unknown)}")
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+        with open(paths[0], 'rb') as fh:
+            clip = (os.path.basename(paths[0]), fh.read())
+
+        report = {'workers': options['workers'],
+                  'backend': options['backend'] or settings.INFERENCE_BACKEND['NAME'], 'modes': {}}
+        for mode in modes:
+            self.stderr.write(f"{mode}: starting gunicorn with {options['workers']} workers")
+            report['modes'][mode] = self._run_mode(mode, options, clip, requests)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _run_mode(self, mode, options, clip, requests):
+        base = f"http://127.0.0.1:{options['port']}"
+        headers = {'X-API-KEY': settings.API_KEY}
+
+        def predict(session):
+            try:
+                r = session.post(f'{base}/api/v1/predict/', headers=headers,
+                                 files={'audio': (clip[0], clip[1], 'audio/wav')}, timeout=options['timeout'])
+                return r.status_code
+            except requests.RequestException:
+                return None
+
+        with tempfile.TemporaryDirectory(prefix='bench-prefork-') as metrics_dir:
+            env = dict(os.environ, GUNICORN_PRELOAD=MODES[mode], PREDICTION_CACHE='False',
+                       PROMETHEUS_MULTIPROC_DIR=metrics_dir, METRICS='True', METRICS_REQUIRE_API_KEY='False')
+            env.pop('INFERENCE_FORK_SAFE', None)
+            if options['backend']:
+                env['INFERENCE_BACKEND'] = options['backend']
+            cmd = [sys.executable, '-m', 'gunicorn', 'crybaby.wsgi', '--workers', str(options['workers']),
+                   '--bind', f"127.0.0.1:{options['port']}", '--timeout', str(int(options['timeout'])),
+                   '--log-level', 'warning']
+            started = time.perf_counter()
+            server = subprocess.Popen(cmd, cwd=str(settings.BASE_DIR), env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                session = requests.Session()
+                deadline = started + options['timeout']
+
+                # 1. First successful prediction from a cold start
+                first = None
+                while first is None:
+                    if server.poll() is not None:
+                        raise CommandError(f"gunicorn exited with {server.returncode} ({mode})")
+                    if time.perf_counter() > deadline:
+                        raise CommandError(f"No successful prediction within {options['timeout']}s ({mode})")
+                    if predict(session) == 200:
+                        first = time.perf_counter() - started
+                    else:
+                        time.sleep(0.1)
+
+                # 2. Every worker has a model: its own load, or the master's when preloaded
+                workers = []
+                all_ready = None
+                while all_ready is None:
+                    if time.perf_counter() > deadline:
+                        raise CommandError(f"Workers not ready within {options['timeout']}s ({mode})")
+                    workers = _children(server.pid)
+                    loaded = self._loaded_pids(session, base)
+                    if len(workers) >= options['workers'] and (server.pid in loaded or set(workers) <= loaded):
+                        all_ready = time.perf_counter() - started
+                    else:
+                        time.sleep(0.1)
+
+                # 3. Real traffic on every worker before sampling memory
+                total = options['requests'] or 10 * options['workers']
+                statuses = []
+                counter = iter(range(total))
+                lock = threading.Lock()
+
+                def client():
+                    s = requests.Session()
+                    while True:
+                        with lock:
+                            if next(counter, None) is None:
+                                return
+                        status = predict(s)
+                        with lock:
+                            statuses.append(status)
+
+                threads = [threading.Thread(target=client) for _ in range(options['workers'])]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+
+                master = _memory_mb(server.pid)
+                per_worker = [m for m in (_memory_mb(pid) for pid in _children(server.pid)) if m]
+                n = max(1, len(per_worker))
+                return {
+                    'first_prediction_seconds': round(first, 2),
+                    'all_workers_ready_seconds': round(all_ready, 2),
+                    'requests_ok': sum(1 for s in statuses if s == 200),
+                    'requests_failed': sum(1 for s in statuses if s != 200),
+                    'master': master,
+                    'workers': per_worker,
+                    'worker_rss_mb_avg': round(sum(m['rss_mb'] for m in per_worker) / n, 1),
+                    'worker_uss_mb_avg': round(sum(m['uss_mb'] for m in per_worker) / n, 1),
+                    'total_pss_mb': round(sum(m['pss_mb'] for m in per_worker) + (master['pss_mb'] if master else 0), 1),
+                }
+            finally:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+                    server.wait()
+
+    def _loaded_pids(self, session, base):
+        """
+        Processes that have reported a model load (crybaby_model_load_seconds).
+        """
+        try:
+            text = session.get(f'{base}/metrics', timeout=10).text
+        except Exception:
+            return set()
+        pids = set()
+        for line in text.splitlines():
+            if line.startswith('crybaby_model_load_seconds{') and 'pid="' in line:
+                pids.add(int(line.split('pid="', 1)[1].split('"', 1)[0]))
+        return pids
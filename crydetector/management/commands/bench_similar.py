@@ -0,0 +1,73 @@
+"""
+Lookup latency and recall of the embedding index at a given size, on
+synthetic clustered embeddings (no audio or model needed).
+
+    python manage.py bench_similar
+    python manage.py bench_similar --rows 10000,100000,500000 --k 10
+
+Recall@k is against an exact float32 cosine scan of the same vectors.
+"""
+
+import json
+import tempfile
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _clustered(rows, dim, rng, clusters=64):
+    """
+    ReLU-like embeddings around a few centres, L2-normalised.
+    """
+    centres = np.maximum(rng.standard_normal((clusters, dim)), 0)
+    vectors = np.maximum(centres[rng.integers(0, clusters, rows)] + 0.7 * rng.standard_normal((rows, dim)), 0)
+    return (vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)).astype(np.float32)
+
+
+class Command(BaseCommand):
+    help = "Benchmark embedding-index lookup latency and recall on synthetic data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='10000,100000', help='Comma-separated index sizes')
+        parser.add_argument('--dim', type=int, default=256)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        from crydetector.embedding_index import EmbeddingIndex, write_index
+
+        rng = np.random.default_rng(0)
+        k = options['k']
+        report = {'candidates': settings.EMBEDDING_INDEX['CANDIDATES'], 'bits': settings.EMBEDDING_INDEX['BITS']}
+        for rows in [int(r) for r in options['rows'].split(',') if r.strip()]:
+            vectors = _clustered(rows, options['dim'], rng)
+            queries = vectors[rng.integers(0, rows, options['queries'])]
+            queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+            with tempfile.TemporaryDirectory() as directory:
+                entries = [{'path': f'clip-{i}.wav', 'label': '', 'stamp': [0, 0]} for i in range(rows)]
+                write_index(directory, 'synthetic', entries, vectors.astype(np.float16))
+                index = EmbeddingIndex(directory)
+                index.search(queries[0], k)
+
+                times, found = [], []
+                for query in queries:
+                    started = time.perf_counter()
+                    result = index.search(query, k)
+                    times.append(time.perf_counter() - started)
+                    found.append({row for row, _ in result})
+                del index
+
+            recalls = []
+            for query, rows_found in zip(queries, found):
+                exact = np.argpartition(-(vectors @ query), k - 1)[:k]
+                recalls.append(len(rows_found.intersection(exact.tolist())) / k)
+            times_ms = np.array(times) * 1000.0
+            report[str(rows)] = {
+                'p50_ms': round(float(np.percentile(times_ms, 50)), 3),
+                'p99_ms': round(float(np.percentile(times_ms, 99)), 3),
+                f'recall_at_{k}': round(float(np.mean(recalls)), 3),
+                'index_mb': round((vectors.size * 2 + rows * report['bits'] / 8) / 1e6, 1),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,119 @@
+"""
+Measure process startup cost in fresh interpreters: import / setup time,
+RSS and which heavy libraries got imported, for
+
+    command   django.setup() + system checks (what migrate / collectstatic pay)
+    worker    + WSGI app, URLconf and a GET /health/ (a serving worker before warm-up)
+    warm      + warm_up() and one prediction (a serving worker ready for traffic)
+
+    python manage.py bench_startup
+    python manage.py bench_startup --profiles command,worker --repeat 3
+"""
+
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('command', 'worker', 'warm')
+HEAVY_MODULES = ('tensorflow', 'librosa', 'numba', 'scipy', 'soxr', 'onnxruntime', 'ai_edge_litert')
+
+
+def _rss_mb():
+    with open('/proc/self/status') as fh:
+        for line in fh:
+            if line.startswith('VmRSS:'):
+                return round(int(line.split()[1]) / 1024.0, 1)
+    return None
+
+
+def _probe(profile, clip_path):
+    """
+    Runs in the child interpreter; prints one JSON line of step timings.
+    """
+    started = time.perf_counter()
+    steps = []
+
+    def step(name):
+        steps.append({
+            'step': name,
+            'seconds': round(time.perf_counter() - started, 3),
+            'rss_mb': _rss_mb(),
+            'heavy_modules': [m for m in HEAVY_MODULES if m in sys.modules],
+        })
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crybaby.settings')
+    import django
+    django.setup()
+    step('django.setup')
+
+    if profile == 'command':
+        from django.core.management import call_command
+        call_command('check', verbosity=0)
+        step('check')
+    else:
+        from django.core.wsgi import get_wsgi_application
+        from django.test import RequestFactory
+        from django.urls import resolve
+        get_wsgi_application()
+        # Resolve through the URLconf (imports every view module) without host checks
+        response = resolve('/health/').func(RequestFactory().get('/health/'))
+        step(f'GET /health/ ({response.status_code})')
+
+    if profile == 'warm':
+        from crydetector.model_loader import warm_up
+        from crydetector.views import predict_audio
+        warm_up()
+        step('warm_up')
+        with open(clip_path, 'rb') as fh:
+            predict_audio(fh.read(), use_gate=False)
+        step('first prediction')
+
+    print(json.dumps(steps))
+
+
+class Command(BaseCommand):
+    help = "Benchmark startup time and memory of management commands and serving workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(PROFILES), help=f'Comma list of {", ".join(PROFILES)}')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per profile (median reported)')
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options['profiles'].split(',') if p.strip()]
+        unknown = [p for p in profiles if p not in PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(unknown)}")
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        if 'warm' in profiles and not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+        clip = paths[0] if paths else ''
+
+        env = dict(os.environ, PREDICTION_CACHE='False')
+        # Plain interpreters: no runserver / gunicorn startup load in AppConfig.ready
+        code = 'import sys; from crydetector.management.commands.bench_startup import _probe; _probe(*sys.argv[1:3])'
+        report = {}
+        for profile in profiles:
+            runs = []
+            for _ in range(max(1, options['repeat'])):
+                started = time.perf_counter()
+                result = subprocess.run([sys.executable, '-c', code, profile, clip], cwd=str(settings.BASE_DIR),
+                                        env=env, capture_output=True, text=True)
+                wall = time.perf_counter() - started
+                if result.returncode != 0:
+                    raise CommandError(f"{profile} probe failed:\n{result.stderr[-2000:]}")
+                runs.append({'wall_seconds': round(wall, 3), 'steps': json.loads(result.stdout.strip().splitlines()[-1])})
+            # Median run by wall time
+            runs.sort(key=lambda r: r['wall_seconds'])
+            median = runs[len(runs) // 2]
+            report[profile] = {
+                **median,
+                'wall_seconds_all': [r['wall_seconds'] for r in runs],
+                'peak_rss_mb': max(s['rss_mb'] or 0 for s in median['steps']),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,101 @@
+"""
+Measure what parsing a /api/v1/predict/ upload and decoding its model
+window costs per request, with Django's default upload handlers
+(read() into bytes) against the streaming WavUploadHandler (memoryview
+of the kept window).
+
+    python manage.py bench_upload
+    python manage.py bench_upload --long-seconds 60,300 --repeat 5
+
+Peak Python / NumPy allocations come from tracemalloc; bytes
+spooled to disk are Django's temp files for uploads above
+FILE_UPLOAD_MAX_MEMORY_SIZE.
+"""
+
+import glob
+import io
+import json
+import os
+import time
+import tracemalloc
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+
+def _synthetic_wav(seconds, sr=44100, channels=2):
+    import soundfile as sf
+    y = (np.random.default_rng(0).standard_normal((int(seconds * sr), channels)) * 0.1).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format='WAV', subtype='PCM_16')
+    return buf.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Compare per-request upload allocations: default handlers vs. streaming WAV handler."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--clips', type=int, default=20, help='Corpus clips to average over')
+        parser.add_argument('--long-seconds', default='60,300', help='Synthetic 44.1 kHz stereo uploads (seconds)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed passes per upload (best time kept)')
+
+    def handle(self, *args, **options):
+        from crydetector.audio_utils import decode_clip
+        from crydetector.upload_handlers import WavUploadHandler, upload_data
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        paths = paths[:options['clips']]
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+        cases = {'corpus clip': []}
+        for p in paths:
+            with open(p, 'rb') as fh:
+                cases['corpus clip'].append(fh.read())
+        for seconds in [float(s) for s in options['long_seconds'].split(',') if s.strip()]:
+            cases[f'{seconds:g} s 44.1 kHz stereo'] = [_synthetic_wav(seconds)]
+
+        factory = RequestFactory()
+
+        def run(data, streaming, traced):
+            upload = io.BytesIO(data)
+            upload.name = 'clip.wav'
+            # The request body is built up front, like bytes arriving on the socket
+            request = factory.post('/api/v1/predict/', {'audio': upload})
+            if traced:
+                tracemalloc.start()
+            started = time.perf_counter()
+            if streaming:
+                request.upload_handlers.insert(0, WavUploadHandler(request))
+            audio_file = request.FILES['audio']
+            decode_clip(upload_data(audio_file))
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if traced else None
+            tracemalloc.stop()
+            spooled = audio_file.size if isinstance(audio_file, TemporaryUploadedFile) else 0
+            kept = audio_file.size
+            audio_file.close()
+            return {'peak_bytes': peak, 'kept_bytes': kept, 'spooled_bytes': spooled, 'seconds': elapsed}
+
+        report = {}
+        for name, uploads in cases.items():
+            entry = {'upload_bytes': int(np.mean([len(d) for d in uploads]))}
+            for mode, streaming in (('default', False), ('streaming', True)):
+                runs = []
+                for data in uploads:
+                    # Timings without tracemalloc's overhead, allocations from one traced pass
+                    best = min((run(data, streaming, False) for _ in range(max(1, options['repeat']))),
+                               key=lambda r: r['seconds'])
+                    runs.append({**best, 'peak_bytes': run(data, streaming, True)['peak_bytes']})
+                entry[mode] = {
+                    'peak_alloc_kb': round(np.mean([r['peak_bytes'] for r in runs]) / 1024.0, 1),
+                    'kept_kb': round(np.mean([r['kept_bytes'] for r in runs]) / 1024.0, 1),
+                    'spooled_to_disk_kb': round(np.mean([r['spooled_bytes'] for r in runs]) / 1024.0, 1),
+                    'ms': round(np.mean([r['seconds'] for r in runs]) * 1000.0, 2),
+                }
+            entry['peak_alloc_saved_percent'] = round(
+                100.0 * (1 - entry['streaming']['peak_alloc_kb'] / entry['default']['peak_alloc_kb']), 1)
+            report[name] = entry
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,54 @@
+"""
+Build or update the "similar cries" embedding index.
+
+    python manage.py build_embedding_index
+    python manage.py build_embedding_index --data-dir /data/archive --workers 8
+    python manage.py build_embedding_index --rebuild
+
+Only clips that are new or changed since the last build (with the same
+model file) are embedded; run it again after adding recordings. Serving
+workers pick up the new index on their next lookup.
+"""
+
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Embed the corpus with the model and write the nearest-neighbour index (incremental)."
+
+    def add_arguments(self, parser):
+        config = settings.EMBEDDING_INDEX
+        parser.add_argument('--data-dir', default=config['DATA_DIR'], help='Corpus to index')
+        parser.add_argument('--index-dir', default=config['DIR'])
+        parser.add_argument('--model', default=None, help='Keras model file (default: MODEL_PATH)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Feature extraction processes')
+        parser.add_argument('--feature-cache', default=os.environ.get('FEATURE_CACHE_DIR', '.feature_cache'))
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--rebuild', action='store_true', help='Re-embed every clip')
+
+    def handle(self, *args, **options):
+        from crydetector.embedding_index import build_index
+        from crydetector.feature_store import FeatureStore
+
+        if settings.INFERENCE_BACKEND['NAME'] != 'keras':
+            raise CommandError("The embedding index needs INFERENCE_BACKEND=keras")
+        if not os.path.isdir(options['data_dir']):
+            raise CommandError(f"Not a directory: {options['data_dir']}")
+        model_path = options['model'] or settings.MODEL_PATH
+        if not os.path.exists(model_path):
+            raise CommandError(f"Model unavailable at {model_path}")
+
+        audio = settings.AUDIO_CONFIG
+        store = FeatureStore(options['feature_cache'], dict(
+            sample_rate=audio['SAMPLE_RATE'], duration=audio['DURATION'], n_mfcc=audio['N_MFCC'],
+            n_fft=audio['N_FFT'], hop_length=audio['HOP_LENGTH'], max_pad_len=audio['MAX_PAD_LEN'],
+        ), workers=options['workers'])
+        try:
+            stats = build_index(options['index_dir'], options['data_dir'], model_path, store,
+                                batch_size=options['batch_size'], rebuild=options['rebuild'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,158 @@
+"""
+Parity and latency/RSS comparison between inference backends on corpus clips.
+Each backend runs in its own subprocess so RSS reflects only that runtime
+(e.g. onnx never pays for `import tensorflow`).
+
+    python manage.py compare_backends --backends keras,tflite,onnx --limit 200
+    python manage.py compare_backends --backends keras,tflite --tflite models/int8.tflite
+
+Parity is reported against the first backend: max |diff| of probabilities
+and argmax agreement. Exits with an error if agreement is below --min-agreement.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _rss_mb():
+    """
+    Current resident set size in MB (Linux), falling back to the peak.
+    """
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Command(BaseCommand):
+    help = "Compare keras / tflite / onnx backends: parity, latency and memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default='keras,tflite,onnx', help='Comma-separated; first is the reference')
+        parser.add_argument('--tflite', default=settings.INFERENCE_BACKEND['TFLITE_PATH'], help='TFLite model path')
+        parser.add_argument('--onnx', default=settings.INFERENCE_BACKEND['ONNX_PATH'], help='ONNX model path')
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--limit', type=int, default=200, help='Corpus clips to score')
+        parser.add_argument('--batch-size', type=int, default=32, help='Batch size for the throughput pass')
+        parser.add_argument('--threads', type=int, default=settings.INFERENCE_BACKEND['NUM_THREADS'])
+        parser.add_argument('--min-agreement', type=float, default=0.0, help='Fail if argmax agreement is lower')
+        # Internal: run one backend in this process
+        parser.add_argument('--worker', help=argparse.SUPPRESS)
+        parser.add_argument('--features', help=argparse.SUPPRESS)
+        parser.add_argument('--out', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self._worker(options)
+
+        from crydetector.audio_utils import preprocess_audio_bytes
+        from crydetector.inference_backends import BACKENDS
+
+        names = [b.strip() for b in options['backends'].split(',') if b.strip()]
+        unknown = [b for b in names if b not in BACKENDS]
+        if unknown:
+            raise CommandError(f"Unknown backend(s): {', '.join(unknown)}")
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))[:options['limit']]
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+        features = []
+        for p in paths:
+            with open(p, 'rb') as fh:
+                try:
+                    features.append(preprocess_audio_bytes(fh.read()))
+                except ValueError:
+                    continue
+        features = np.concatenate(features)
+
+        model_paths = {'keras': settings.MODEL_PATH, 'tflite': options['tflite'], 'onnx': options['onnx']}
+        report = {'clips': len(features), 'reference': names[0], 'backends': {}}
+        outputs = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            features_path = os.path.join(tmp, 'features.npy')
+            np.save(features_path, features)
+            for name in names:
+                out_path = os.path.join(tmp, f'{name}.npy')
+                cmd = [
+                    sys.executable, sys.argv[0], 'compare_backends',
+                    '--worker', name, '--features', features_path, '--out', out_path,
+                    '--batch-size', str(options['batch_size']), '--threads', str(options['threads']),
+                    '--tflite', options['tflite'], '--onnx', options['onnx'],
+                ]
+                proc = subprocess.run(cmd, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    report['backends'][name] = {'path': model_paths[name], 'error': proc.stderr.strip().splitlines()[-1:]}
+                    continue
+                report['backends'][name] = {'path': model_paths[name], **json.loads(proc.stdout)}
+                outputs[name] = np.load(out_path)
+
+        reference = outputs.get(names[0])
+        worst = 1.0
+        for name, probs in outputs.items():
+            if reference is None or name == names[0]:
+                continue
+            agreement = float(np.mean(np.argmax(probs, axis=1) == np.argmax(reference, axis=1)))
+            worst = min(worst, agreement)
+            report['backends'][name]['parity'] = {
+                'max_abs_diff': float(np.max(np.abs(probs - reference))),
+                'mean_abs_diff': float(np.mean(np.abs(probs - reference))),
+                'argmax_agreement': round(agreement, 4),
+            }
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if reference is None:
+            raise CommandError(f"Reference backend '{names[0]}' failed")
+        if worst < options['min_agreement']:
+            raise CommandError(f"Argmax agreement {worst:.4f} below {options['min_agreement']}")
+
+    def _worker(self, options):
+        from crydetector.inference_backends import load_backend
+
+        name = options['worker']
+        path = {'keras': settings.MODEL_PATH, 'tflite': options['tflite'], 'onnx': options['onnx']}[name]
+        features = np.load(options['features'])
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        backend = load_backend(name, path, num_threads=options['threads'])
+        backend.predict(features[:1])
+        load_s = time.perf_counter() - started
+        rss_loaded = _rss_mb()
+
+        single_ms = []
+        for i in range(len(features)):
+            t0 = time.perf_counter()
+            backend.predict(features[i:i + 1])
+            single_ms.append((time.perf_counter() - t0) * 1000.0)
+
+        bs = max(1, options['batch_size'])
+        t0 = time.perf_counter()
+        probs = np.concatenate([backend.predict(features[i:i + bs]) for i in range(0, len(features), bs)])
+        batch_s = time.perf_counter() - t0
+        np.save(options['out'], probs.astype(np.float32))
+
+        self.stdout.write(json.dumps({
+            'file_bytes': os.path.getsize(path),
+            'load_seconds': round(load_s, 3),
+            'rss_mb_before_load': round(rss_before, 1),
+            'rss_mb_loaded': round(rss_loaded, 1),
+            'rss_mb_after_run': round(_rss_mb(), 1),
+            'tensorflow_imported': 'tensorflow' in sys.modules,
+            'single_ms_p50': round(float(np.percentile(single_ms, 50)), 3),
+            'single_ms_p95': round(float(np.percentile(single_ms, 95)), 3),
+            f'batch{bs}_clips_per_sec': round(len(features) / batch_s, 1),
+        }))
@@ -0,0 +1,113 @@
+"""
+Export the Keras model for the lightweight inference backends.
+
+    python manage.py export_model --format tflite --quantize int8
+    python manage.py export_model --format all
+
+TFLite quantization:
+    none     float32 weights and activations
+    float16  float16 weights (half the file size, float32 compute)
+    int8     full-integer weights and activations, calibrated on corpus
+             clips; input/output stay float32 so the backend is drop-in
+"""
+
+import glob
+import json
+import os
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Convert the Keras model to TFLite and/or ONNX."
+
+    def add_arguments(self, parser):
+        config = settings.INFERENCE_BACKEND
+        parser.add_argument('--model', default=settings.MODEL_PATH, help='Source .keras model')
+        parser.add_argument('--format', choices=['tflite', 'onnx', 'all'], default='all')
+        parser.add_argument('--quantize', choices=['none', 'float16', 'int8'], default='none',
+                            help='TFLite post-training quantization')
+        parser.add_argument('--tflite-out', default=config['TFLITE_PATH'])
+        parser.add_argument('--onnx-out', default=config['ONNX_PATH'])
+        parser.add_argument('--opset', type=int, default=17, help='ONNX opset')
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--calibration-samples', type=int, default=200,
+                            help='Corpus clips used to calibrate int8 ranges')
+
+    def handle(self, *args, **options):
+        import tensorflow as tf
+
+        if not os.path.exists(options['model']):
+            raise CommandError(f"Model not found: {options['model']}")
+        model = tf.keras.models.load_model(options['model'], compile=False)
+
+        report = {'source': options['model'], 'source_bytes': os.path.getsize(options['model'])}
+        if options['format'] in ('tflite', 'all'):
+            report['tflite'] = self._export_tflite(tf, model, options)
+        if options['format'] in ('onnx', 'all'):
+            report['onnx'] = self._export_onnx(tf, model, options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _export_tflite(self, tf, model, options):
+        # Keeps the dynamic batch dimension, so the batching engine can send any N
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if options['quantize'] == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif options['quantize'] == 'int8':
+            samples = self._calibration_set(options)
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.representative_dataset = lambda: ([x[np.newaxis]] for x in samples)
+
+        path = options['tflite_out']
+        with open(path, 'wb') as fh:
+            fh.write(converter.convert())
+        self.stderr.write(f"Wrote {path}")
+        return {'path': path, 'bytes': os.path.getsize(path), 'quantize': options['quantize']}
+
+    def _export_onnx(self, tf, model, options):
+        try:
+            import tf2onnx
+        except ImportError:
+            raise CommandError("ONNX export needs tf2onnx (pip install tf2onnx)")
+
+        cfg = settings.AUDIO_CONFIG
+        signature = [tf.TensorSpec([None, cfg['N_MFCC'], cfg['MAX_PAD_LEN'], 1], tf.float32, name='mfcc')]
+        forward = tf.function(lambda x: model(x, training=False), input_signature=signature)
+        path = options['onnx_out']
+        tf2onnx.convert.from_function(forward, input_signature=signature, opset=options['opset'], output_path=path)
+        self.stderr.write(f"Wrote {path}")
+        return {'path': path, 'bytes': os.path.getsize(path), 'opset': options['opset']}
+
+    def _calibration_set(self, options):
+        """
+        Preprocessed features for a fixed, class-balanced sample of corpus clips.
+        """
+        from crydetector.audio_utils import preprocess_audio_bytes
+
+        by_class = {}
+        for path in sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True)):
+            by_class.setdefault(os.path.basename(os.path.dirname(path)), []).append(path)
+        if not by_class:
+            raise CommandError(f"No .wav files under {options['data_dir']} for int8 calibration")
+
+        # Round-robin over classes so the dominant class does not set the ranges alone
+        rng = np.random.default_rng(0)
+        queues = [list(rng.permutation(paths)) for paths in by_class.values()]
+        chosen = []
+        while len(chosen) < options['calibration_samples'] and any(queues):
+            for q in queues:
+                if q and len(chosen) < options['calibration_samples']:
+                    chosen.append(q.pop())
+
+        samples = []
+        for path in chosen:
+            with open(path, 'rb') as fh:
+                try:
+                    samples.append(preprocess_audio_bytes(fh.read())[0])
+                except ValueError:
+                    continue
+        self.stderr.write(f"Calibrating on {len(samples)} clips")
+        return samples
@@ -0,0 +1,72 @@
+"""
+Run the inference worker pool that drains POST /api/v1/jobs/.
+
+    python manage.py run_prediction_workers --workers 2 --batch-size 16
+
+Each worker is a separate process with its own model; they share the queue
+through the database. SIGINT/SIGTERM finish the current batch and exit.
+"""
+
+import multiprocessing
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _worker_main(name, stop_event, batch_size, poll_interval):
+    import django
+    django.setup()
+    from django.db import connections
+    from crydetector.audit import get_audit_log
+    from crydetector.jobs import run_worker
+
+    # The parent handles signals and tells workers to stop via the event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        run_worker(name, stop_event, batch_size, poll_interval)
+    finally:
+        # multiprocessing children skip atexit, so write queued audit records here
+        audit = get_audit_log()
+        if audit is not None:
+            audit.flush()
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Start the prediction job worker pool."
+
+    def add_arguments(self, parser):
+        config = settings.JOB_QUEUE
+        parser.add_argument('--workers', type=int, default=config['WORKERS'])
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'])
+        parser.add_argument('--poll-interval', type=float, default=config['POLL_INTERVAL'])
+
+    def handle(self, *args, **options):
+        from django.db import connections
+
+        batch_size = max(1, options['batch_size'])
+        poll_interval = max(0.01, options['poll_interval'])
+
+        # Children must open their own DB connections
+        connections.close_all()
+        stop_event = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(
+                target=_worker_main, name=f'worker-{i}',
+                args=(f'worker-{i}', stop_event, batch_size, poll_interval),
+            )
+            for i in range(max(1, options['workers']))
+        ]
+        for w in workers:
+            w.start()
+        self.stdout.write(f"Started {len(workers)} prediction workers (batch size {batch_size})")
+
+        def stop(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        for w in workers:
+            w.join()
+        self.stdout.write("Prediction workers stopped")
@@ -0,0 +1,317 @@
+"""
+Score every WAV under a directory tree offline, e.g. to re-score an archive
+with a new model.
+
+    python manage.py score_corpus donateacry_corpus_cleaned_and_updated_data
+    python manage.py score_corpus /data/archive --output archive.csv --workers 8
+    python manage.py score_corpus /data/archive --model models/cry_2026_10.keras
+
+Decoding and feature extraction run in a process pool; the parent batches
+the features through the model. Results are appended as they are scored:
+
+    .parquet  a directory of part files (pandas / pyarrow read it as one table),
+              each written under a temporary name and renamed into place
+    .csv      one file, appended and synced per batch
+
+The output doubles as the checkpoint: a rerun skips every file already in
+it, so an interrupted run resumes where it stopped. Rows record the model
+fingerprint, and resuming with a different model is refused (--restart
+discards the old output). Files that fail to decode get a row with the
+error and are not retried.
+
+When the first folder under the root is a class name (the corpus layout),
+it is taken as the label and a confusion summary is printed at the end.
+"""
+
+import csv
+import glob
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+# Per-process extractor for pool workers (rebuilt from its config, not pickled)
+_worker_config = None
+_worker_extractor = None
+
+
+def _init_worker(audio_config):
+    global _worker_config, _worker_extractor
+    from crydetector.audio_utils import FeatureExtractor
+    _worker_config = audio_config
+    _worker_extractor = FeatureExtractor.from_config(audio_config)
+
+
+def _extract(path):
+    """
+    path -> (path, (n_mfcc, max_pad_len) features or None, error or '').
+    Same decode window and features as the API (audio_utils.decode_clip /
+    clip_features), without the per-request metrics.
+    """
+    from crydetector.audio_utils import load_audio
+    try:
+        with open(path, 'rb') as fh:
+            y = load_audio(fh.read(), _worker_config['SAMPLE_RATE'], _worker_config['DURATION'])
+        return path, _worker_extractor.transform(y).astype(np.float32), ''
+    except Exception as e:
+        return path, None, str(e) or e.__class__.__name__
+
+
+def _columns(classes):
+    return ['path', 'label', 'predicted_label', 'confidence'] + [f'prob_{c}' for c in classes] \
+        + ['model_version', 'error']
+
+
+class CsvResults:
+    """
+    Rows appended to one CSV file, flushed and fsynced per write.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read(self, columns):
+        """
+        {column: [values]} for the rows already written. A line cut short by
+        an interrupted write is dropped from the file first.
+        """
+        out = {c: [] for c in columns}
+        if not self.exists():
+            return out
+        with open(self.path, 'rb+') as fh:
+            data = fh.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                fh.truncate(end)
+        with open(self.path, newline='') as fh:
+            for row in csv.DictReader(fh):
+                for c in columns:
+                    out[c].append(row.get(c, ''))
+        return out
+
+    def write(self, rows):
+        new = not self.exists() or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as fh:
+            writer = csv.DictWriter(fh, fieldnames=self.columns)
+            if new:
+                writer.writeheader()
+            writer.writerows(rows)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
+
+
+class ParquetResults:
+    """
+    Rows written as numbered part files in one directory.
+    """
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        self.path = path
+        self.columns = columns
+        self.schema = pa.schema([
+            (c, pa.float32() if c == 'confidence' or c.startswith('prob_') else pa.string())
+            for c in columns
+        ])
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+
+    def exists(self):
+        return bool(self._parts())
+
+    def read(self, columns):
+        import pyarrow.parquet as pq
+        out = {c: [] for c in columns}
+        for part in self._parts():
+            table = pq.read_table(part, columns=columns)
+            for c in columns:
+                out[c] += table.column(c).to_pylist()
+        return out
+
+    def write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(self.path, exist_ok=True)
+        parts = self._parts()
+        number = int(os.path.basename(parts[-1])[5:-8]) + 1 if parts else 0
+        final = os.path.join(self.path, f'part-{number:06d}.parquet')
+        tmp = os.path.join(self.path, f'.part-{number:06d}.parquet.tmp')
+        pq.write_table(pa.Table.from_pylist(rows, schema=self.schema), tmp)
+        os.replace(tmp, final)
+
+    def remove(self):
+        for part in self._parts():
+            os.remove(part)
+
+
+class Command(BaseCommand):
+    help = "Score a directory tree of WAV files with the model; resumable, Parquet or CSV output."
+
+    def add_arguments(self, parser):
+        parser.add_argument('root', help='Directory to walk for .wav files')
+        parser.add_argument('--output', default='scores.parquet', help='.parquet (directory of parts) or .csv')
+        parser.add_argument('--model', default=None, help='Model file (default: the configured backend path)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Feature extraction processes')
+        parser.add_argument('--batch-size', type=int, default=64, help='Clips per model call')
+        parser.add_argument('--flush-rows', type=int, default=1024, help='Rows per Parquet part file')
+        parser.add_argument('--limit', type=int, default=0, help='Score at most this many new files')
+        parser.add_argument('--restart', action='store_true', help='Discard existing output and score everything')
+
+    def handle(self, *args, **options):
+        from crydetector.inference_backends import backend_path
+        from crydetector.model_loader import _file_version, load_version
+
+        root = os.path.abspath(options['root'])
+        if not os.path.isdir(root):
+            raise CommandError(f"Not a directory: {root}")
+        model_path = options['model'] or backend_path(settings.INFERENCE_BACKEND['NAME'])
+        if not os.path.exists(model_path):
+            raise CommandError(f"Model unavailable at {model_path}")
+        fingerprint = _file_version(model_path)
+
+        classes = settings.CRY_CLASSES
+        columns = _columns(classes)
+        output = options['output']
+        if output.lower().endswith('.csv'):
+            results = CsvResults(output, columns)
+        elif output.lower().endswith('.parquet'):
+            results = ParquetResults(output, columns)
+        else:
+            raise CommandError("--output must end in .parquet or .csv")
+
+        # Resume: the output lists what is already scored
+        if options['restart']:
+            results.remove()
+        done = results.read(['path', 'model_version'])
+        previous = set(done['model_version']) - {fingerprint}
+        if previous:
+            raise CommandError(
+                f"{output} was scored with {', '.join(sorted(previous))}, not {fingerprint}; "
+                f"use another --output or --restart")
+        scored = set(done['path'])
+
+        files = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            files += [os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith('.wav')]
+        remaining = [p for p in files if os.path.relpath(p, root) not in scored]
+        todo = remaining[:options['limit']] if options['limit'] else remaining
+        self.stdout.write(f"{len(files)} files under {root}: {len(files) - len(remaining)} already scored, "
+                          f"{len(todo)} to score")
+
+        if todo:
+            # spawn, not fork: children must not inherit the parent's
+            # TensorFlow runtime threads, whichever is created first
+            pool = ProcessPoolExecutor(
+                max_workers=max(1, options['workers']), mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(dict(settings.AUDIO_CONFIG),),
+            )
+            try:
+                model = load_version(model_path).model
+                self._score(pool, todo, root, results, model, fingerprint, classes, options)
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+        self._summary(results, classes)
+
+    def _score(self, pool, todo, root, results, model, fingerprint, classes, options):
+        from crydetector.model_loader import _run_model
+
+        batch_size = max(1, options['batch_size'])
+        # Bounded read-ahead: workers stay busy without queueing the whole archive's features
+        max_pending = max(2 * batch_size, 4 * options['workers'])
+        pending = deque()
+        paths = iter(todo)
+        buffered = []
+        flush_rows = max(1, options['flush_rows']) if isinstance(results, ParquetResults) else 1
+        started = time.perf_counter()
+        count = failed = 0
+        last_log = started
+
+        def fill():
+            while len(pending) < max_pending:
+                path = next(paths, None)
+                if path is None:
+                    return
+                pending.append(pool.submit(_extract, path))
+
+        def row(path, probs=None, error=''):
+            rel = os.path.relpath(path, root)
+            top = rel.split(os.sep)[0] if os.sep in rel else ''
+            out = {'path': rel, 'label': top if top in classes else '', 'model_version': fingerprint, 'error': error}
+            if probs is None:
+                out.update({'predicted_label': '', 'confidence': None, **{f'prob_{c}': None for c in classes}})
+            else:
+                idx = int(np.argmax(probs))
+                out.update({'predicted_label': classes[idx], 'confidence': float(probs[idx]),
+                            **{f'prob_{c}': float(p) for c, p in zip(classes, probs)}})
+            return out
+
+        fill()
+        while pending:
+            batch, rows = [], []
+            while pending and len(batch) < batch_size:
+                path, features, error = pending.popleft().result()
+                if features is None:
+                    rows.append(row(path, error=error))
+                    failed += 1
+                else:
+                    batch.append((path, features))
+                fill()
+            if batch:
+                probs = _run_model(model, np.stack([f for _, f in batch])[..., np.newaxis])
+                rows += [row(path, p) for (path, _), p in zip(batch, probs)]
+            buffered += rows
+            count += len(rows)
+            if len(buffered) >= flush_rows or not pending:
+                results.write(buffered)
+                buffered = []
+
+            now = time.perf_counter()
+            if now - last_log >= 10.0 or not pending:
+                last_log = now
+                self.stdout.write(f"{count}/{len(todo)} files, {count / max(now - started, 1e-9):.1f} files/sec"
+                                  + (f", {failed} failed" if failed else ""))
+
+    def _summary(self, results, classes):
+        data = results.read(['label', 'predicted_label', 'error'])
+        total = len(data['label'])
+        errors = sum(1 for e in data['error'] if e)
+        self.stdout.write(f"{total} rows in output, {errors} failed to decode")
+
+        pairs = [(t, p) for t, p, e in zip(data['label'], data['predicted_label'], data['error'])
+                 if t in classes and not e]
+        if not pairs:
+            return
+        index = {c: i for i, c in enumerate(classes)}
+        confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+        for t, p in pairs:
+            confusion[index[t], index[p]] += 1
+
+        width = max(len(c) for c in classes) + 2
+        self.stdout.write("\nConfusion (rows: folder label, columns: predicted)")
+        self.stdout.write(" " * width + "".join(f"{c[:10]:>11}" for c in classes) + f"{'recall':>9}{'precision':>11}")
+        for i, c in enumerate(classes):
+            support = confusion[i].sum()
+            predicted = confusion[:, i].sum()
+            recall = confusion[i, i] / support if support else 0.0
+            precision = confusion[i, i] / predicted if predicted else 0.0
+            self.stdout.write(f"{c:<{width}}" + "".join(f"{n:>11}" for n in confusion[i])
+                              + f"{recall:>9.3f}{precision:>11.3f}")
+        self.stdout.write(f"accuracy {np.trace(confusion) / confusion.sum():.3f} over {confusion.sum()} labelled files")
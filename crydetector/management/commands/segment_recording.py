@@ -0,0 +1,38 @@
+"""
+Classify every 4 s window of a long recording and print the timeline.
+
+    python manage.py segment_recording night.wav --hop 2 --output night.json
+"""
+
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Segment a long WAV recording into labelled windows and cry episodes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='WAV file to segment')
+        parser.add_argument('--hop', type=float, default=None, help='Seconds between window starts')
+        parser.add_argument('--silence-dbfs', type=float, default=None, help='Energy gate threshold')
+        parser.add_argument('--output', default=None, help='Write the full JSON result here')
+
+    def handle(self, *args, **options):
+        from crydetector.segmentation import segment_recording
+
+        try:
+            result = segment_recording(options['path'], hop_seconds=options['hop'],
+                                       silence_dbfs=options['silence_dbfs'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(result, fh, indent=2)
+
+        for ep in result['episodes']:
+            self.stdout.write(
+                f"{ep['start']:9.2f}s - {ep['end']:9.2f}s  {ep['label']:<12} "
+                f"peak={ep['peak_confidence']:.2f} windows={ep['windows']}"
+            )
+        self.stdout.write(json.dumps(result['stats'], indent=2))
@@ -0,0 +1,242 @@
+"""
+Sweep TensorFlow runtime settings for the keras backend on this host and
+recommend a profile (settings.TF_RUNTIME + INFERENCE_NUM_THREADS).
+
+    python manage.py tune_runtime --workers 2
+    python manage.py tune_runtime --intra 1,2,4 --inter 1 --modes eager,function --objective latency
+
+Every configuration runs in its own subprocess (thread pools and oneDNN are
+fixed once TensorFlow initializes) and times batch sizes 1-64 on corpus
+clips. The first configuration is today's default (TF thread pools, oneDNN
+off, eager) and serves as the numerical reference; configurations whose
+outputs drift beyond --tolerance are not recommended. With --workers N the
+intra-op candidates are capped at cores // N so N gunicorn workers do not
+oversubscribe the CPU.
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = {
+    'eager': {'TF_FUNCTION': False, 'XLA_JIT': False},
+    'function': {'TF_FUNCTION': True, 'XLA_JIT': False},
+    'xla': {'TF_FUNCTION': True, 'XLA_JIT': True},
+}
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class Command(BaseCommand):
+    help = "Benchmark TF threading / oneDNN / tf.function / XLA settings and recommend a profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=settings.MODEL_PATH)
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--batch-sizes', default='1,2,4,8,16,32,64')
+        parser.add_argument('--workers', type=int, default=1, help='Serving processes sharing the host')
+        parser.add_argument('--intra', default='', help='Intra-op thread counts (default: 1, cores/workers and half that)')
+        parser.add_argument('--inter', default='1,2', help='Inter-op thread counts')
+        parser.add_argument('--onednn', default='0,1', help='oneDNN off/on values to try')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'Comma list of {", ".join(MODES)}')
+        parser.add_argument('--repeats', type=int, default=10, help='Timed calls per batch size')
+        parser.add_argument('--objective', choices=['latency', 'throughput', 'balanced'], default='balanced',
+                            help='latency: batch-1 p50; throughput: best clips/sec; balanced: geometric mean of clips/sec')
+        parser.add_argument('--tolerance', type=float, default=1e-3, help='Max |prob diff| vs. the reference')
+        parser.add_argument('--output', default=str(settings.BASE_DIR / 'tf_runtime_profile.json'))
+        # Internal: benchmark one configuration in this process
+        parser.add_argument('--worker', help=argparse.SUPPRESS)
+        parser.add_argument('--features', help=argparse.SUPPRESS)
+        parser.add_argument('--out', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self._worker(options)
+
+        from crydetector.audio_utils import preprocess_audio_bytes
+
+        if not os.path.exists(options['model']):
+            raise CommandError(f"Model not found: {options['model']}")
+        batch_sizes = sorted(set(_int_list(options['batch_sizes'])))
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        unknown = [m for m in modes if m not in MODES]
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(unknown)}")
+
+        cores = _cores()
+        per_worker = max(1, cores // max(1, options['workers']))
+        intra = _int_list(options['intra']) if options['intra'] else [1, max(1, per_worker // 2), per_worker]
+        intra = sorted({n for n in intra if 1 <= n <= per_worker}) or [per_worker]
+        inter = sorted(set(_int_list(options['inter'])))
+        onednn = sorted(set(_int_list(options['onednn'])))
+
+        reference = {'intra': 0, 'inter': 0, 'onednn': 0, 'mode': 'eager'}
+        configs = [reference] + [
+            {'intra': a, 'inter': b, 'onednn': c, 'mode': m}
+            for a, b, c, m in itertools.product(intra, inter, onednn, modes)
+        ]
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        features = []
+        for p in paths:
+            if len(features) >= max(batch_sizes):
+                break
+            with open(p, 'rb') as fh:
+                try:
+                    features.append(preprocess_audio_bytes(fh.read()))
+                except ValueError:
+                    continue
+        if not features:
+            raise CommandError(f"No usable .wav files under {options['data_dir']}")
+        features = np.concatenate(features)
+        if len(features) < max(batch_sizes):
+            features = np.resize(features, (max(batch_sizes), *features.shape[1:]))
+
+        results = []
+        ref_probs = None
+        with tempfile.TemporaryDirectory() as tmp:
+            features_path = os.path.join(tmp, 'features.npy')
+            np.save(features_path, features)
+            for i, config in enumerate(configs):
+                label = self._label(config)
+                self.stderr.write(f"[{i + 1}/{len(configs)}] {label}")
+                out_path = os.path.join(tmp, f'{i}.npy')
+                cmd = [
+                    sys.executable, sys.argv[0], 'tune_runtime', '--model', options['model'],
+                    '--worker', json.dumps(config), '--features', features_path, '--out', out_path,
+                    '--batch-sizes', ','.join(map(str, batch_sizes)), '--repeats', str(options['repeats']),
+                ]
+                proc = subprocess.run(cmd, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    results.append({'config': config, 'label': label, 'error': proc.stderr.strip().splitlines()[-1:]})
+                    continue
+                entry = {'config': config, 'label': label, **json.loads(proc.stdout)}
+                probs = np.load(out_path)
+                if ref_probs is None and config is reference:
+                    ref_probs = probs
+                if ref_probs is not None:
+                    entry['max_abs_diff'] = float(np.max(np.abs(probs - ref_probs)))
+                    entry['argmax_agreement'] = round(float(np.mean(probs.argmax(1) == ref_probs.argmax(1))), 4)
+                entry['score'] = self._score(entry, options['objective'])
+                results.append(entry)
+
+        ok = [r for r in results if 'error' not in r and r.get('max_abs_diff', 0.0) <= options['tolerance']]
+        if not ok:
+            raise CommandError("No configuration ran successfully")
+        best = max(ok, key=lambda r: r['score'])
+        baseline = results[0] if 'error' not in results[0] else None
+        config = best['config']
+        recommended_env = {
+            'INFERENCE_NUM_THREADS': config['intra'],
+            'TF_INTER_OP_THREADS': config['inter'],
+            'TF_ENABLE_ONEDNN_OPTS': config['onednn'],
+            'TF_FUNCTION': MODES[config['mode']]['TF_FUNCTION'],
+            'TF_XLA_JIT': MODES[config['mode']]['XLA_JIT'],
+        }
+        report = {
+            'host': {
+                'cores': cores, 'workers': options['workers'], 'platform': platform.platform(),
+                'python': platform.python_version(), 'tensorflow': best.get('tensorflow'),
+            },
+            'model': options['model'],
+            'objective': options['objective'],
+            'batch_sizes': batch_sizes,
+            'recommended': {'label': best['label'], 'env': recommended_env, 'score': best['score']},
+            'baseline': {'label': baseline['label'], 'score': baseline['score']} if baseline else None,
+            'results': sorted(results, key=lambda r: -r.get('score', float('-inf'))),
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+        self.stdout.write(f"{'configuration':<44} {'b1 p50 ms':>10} {'best clips/s':>13} {'max|diff|':>10}")
+        for r in report['results']:
+            if 'error' in r:
+                self.stdout.write(f"{r['label']:<44} failed: {' '.join(r['error'])}")
+                continue
+            self.stdout.write(f"{r['label']:<44} {r['by_batch']['1']['p50_ms'] if '1' in r['by_batch'] else '-':>10} "
+                              f"{max(b['clips_per_sec'] for b in r['by_batch'].values()):>13} "
+                              f"{r.get('max_abs_diff', 0.0):>10.2e}")
+        self.stdout.write(f"\nRecommended ({options['objective']}): {best['label']}")
+        for key, value in recommended_env.items():
+            self.stdout.write(f"{key}={value}")
+        self.stdout.write(f"Report written to {options['output']}")
+
+    @staticmethod
+    def _label(config):
+        intra = config['intra'] or 'default'
+        inter = config['inter'] or 'default'
+        return f"intra={intra} inter={inter} onednn={config['onednn']} {config['mode']}"
+
+    @staticmethod
+    def _score(entry, objective):
+        by_batch = entry['by_batch']
+        if objective == 'latency':
+            first = by_batch[min(by_batch, key=int)]
+            return round(-first['p50_ms'], 3)
+        rates = [b['clips_per_sec'] for b in by_batch.values()]
+        if objective == 'throughput':
+            return round(max(rates), 1)
+        return round(float(np.exp(np.mean(np.log(rates)))), 1)
+
+    def _worker(self, options):
+        config = json.loads(options['worker'])
+        from crydetector.inference_backends import load_backend
+
+        features = np.load(options['features'])
+        batch_sizes = _int_list(options['batch_sizes'])
+        runtime = {
+            'INTER_OP_THREADS': config['inter'],
+            'ONEDNN': bool(config['onednn']),
+            **MODES[config['mode']],
+        }
+        started = time.perf_counter()
+        backend = load_backend('keras', options['model'], num_threads=config['intra'], runtime=runtime)
+        load_s = time.perf_counter() - started
+
+        # First call per batch size traces / compiles; keep it out of the timings
+        started = time.perf_counter()
+        for bs in batch_sizes:
+            backend.predict(features[:bs])
+        warm_s = time.perf_counter() - started
+
+        by_batch = {}
+        for bs in batch_sizes:
+            times = []
+            for _ in range(max(1, options['repeats'])):
+                t0 = time.perf_counter()
+                backend.predict(features[:bs])
+                times.append((time.perf_counter() - t0) * 1000.0)
+            p50 = float(np.percentile(times, 50))
+            by_batch[str(bs)] = {
+                'p50_ms': round(p50, 3),
+                'p95_ms': round(float(np.percentile(times, 95)), 3),
+                'clips_per_sec': round(bs / (p50 / 1000.0), 1),
+            }
+        np.save(options['out'], backend.predict(features[:max(batch_sizes)]).astype(np.float32))
+
+        import tensorflow as tf
+        self.stdout.write(json.dumps({
+            'load_seconds': round(load_s, 3),
+            'warm_up_seconds': round(warm_s, 3),
+            'tensorflow': tf.__version__,
+            'by_batch': by_batch,
+        }))
@@ -0,0 +1,85 @@
+"""
+Check that FeatureExtractor reproduces the librosa.feature.mfcc pipeline
+within tolerance on corpus clips, and report the per-clip speedup.
+
+    python manage.py verify_features --limit 100 --atol 1e-4
+"""
+
+import glob
+import json
+import os
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Verify FeatureExtractor output against librosa.feature.mfcc."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', default=str(settings.BASE_DIR / 'donateacry_corpus_cleaned_and_updated_data'))
+        parser.add_argument('--limit', type=int, default=100, help='Number of clips to compare')
+        parser.add_argument('--atol', type=float, default=1e-4, help='Max abs difference of normalized features')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed passes (best is reported)')
+
+    def handle(self, *args, **options):
+        import librosa
+        from crydetector.audio_utils import get_feature_extractor, load_audio
+
+        paths = sorted(glob.glob(os.path.join(options['data_dir'], '**', '*.wav'), recursive=True))
+        paths = paths[:options['limit']]
+        if not paths:
+            raise CommandError(f"No .wav files under {options['data_dir']}")
+
+        cfg = settings.AUDIO_CONFIG
+        extractor = get_feature_extractor()
+
+        def reference(y):
+            y = extractor.fix_length(y)
+            mfcc = librosa.feature.mfcc(y=y, sr=cfg['SAMPLE_RATE'], n_mfcc=cfg['N_MFCC'],
+                                        n_fft=cfg['N_FFT'], hop_length=cfg['HOP_LENGTH'])
+            if mfcc.shape[1] < cfg['MAX_PAD_LEN']:
+                mfcc = np.pad(mfcc, ((0, 0), (0, cfg['MAX_PAD_LEN'] - mfcc.shape[1])))
+            mfcc = mfcc[:, :cfg['MAX_PAD_LEN']]
+            return (mfcc - np.mean(mfcc)) / (np.std(mfcc) + 1e-8)
+
+        clips = []
+        for p in paths:
+            with open(p, 'rb') as fh:
+                clips.append(load_audio(fh.read(), cfg['SAMPLE_RATE'], cfg['DURATION']))
+
+        reference(clips[0])
+        extractor.transform(clips[0])
+
+        expected, ref_ms = self._timed(reference, clips, options['repeat'])
+        actual, new_ms = self._timed(extractor.transform, clips, options['repeat'])
+
+        batch = extractor.transform(np.stack([extractor.fix_length(y) for y in clips]))
+
+        max_diff = max(float(np.max(np.abs(a - e))) for a, e in zip(actual, expected))
+        batch_diff = float(np.max(np.abs(batch - np.stack(actual))))
+        report = {
+            'clips': len(clips),
+            'max_abs_diff': max_diff,
+            'batch_vs_single_max_abs_diff': batch_diff,
+            'librosa_ms_per_clip': round(ref_ms, 3),
+            'extractor_ms_per_clip': round(new_ms, 3),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if max_diff > options['atol'] or batch_diff > options['atol']:
+            raise CommandError(f"Feature mismatch exceeds tolerance {options['atol']}")
+        self.stdout.write(self.style.SUCCESS("Features match within tolerance."))
+
+    @staticmethod
+    def _timed(fn, clips, repeat):
+        """
+        Run `fn` over all clips `repeat` times; return outputs and best ms/clip.
+        """
+        best = float('inf')
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            outputs = [fn(y) for y in clips]
+            best = min(best, time.perf_counter() - started)
+        return outputs, best * 1000.0 / len(clips)
@@ -0,0 +1,217 @@
+"""
+Prometheus metrics for the prediction hot path, exposed at /metrics.
+
+Stages (crybaby_stage_seconds{stage=...}):
+    decode     WAV bytes -> mono waveform (includes resampling)
+    resample   the resampling part of decode alone
+    features   waveform -> MFCC model input
+    inference  one forward pass (per batch, not per request)
+End-to-end time per endpoint is crybaby_request_seconds; per model
+version (see model_registry) crybaby_model_version_seconds.
+
+Under gunicorn every worker is its own process. gunicorn.conf.py sets
+PROMETHEUS_MULTIPROC_DIR before the app is imported, so prometheus_client
+keeps per-process files there and /metrics merges them on every scrape:
+counters and histograms are summed over all workers (including ones that
+have exited), gauges are reported per live pid.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+STAGES = ('decode', 'resample', 'features', 'inference')
+
+# 1 ms .. 30 s; a clip is ~5-50 ms per stage, whole requests can queue for seconds
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    'crybaby_stage_seconds', 'Time spent in each prediction stage.',
+    ['stage'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    'crybaby_request_seconds', 'End-to-end request time per endpoint.',
+    ['endpoint'], buckets=LATENCY_BUCKETS,
+)
+INFERENCE_BATCH_ROWS = Histogram(
+    'crybaby_inference_batch_rows', 'Clips per forward pass.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+VERSION_SECONDS = Histogram(
+    'crybaby_model_version_seconds', 'Inference time per call by model version (batching wait included).',
+    ['version'], buckets=LATENCY_BUCKETS,
+)
+PREDICTIONS = Counter(
+    'crybaby_predictions_total', 'Predictions returned, by label and model version.', ['label', 'version'],
+)
+ERRORS = Counter('crybaby_errors_total', 'Error responses by endpoint and HTTP status.', ['endpoint', 'status'])
+MODEL_LOAD_SECONDS = Gauge(
+    'crybaby_model_load_seconds', 'Time to load the model in this process.',
+    ['backend'], multiprocess_mode='liveall',
+)
+MODEL_WARMUP_SECONDS = Gauge(
+    'crybaby_model_warmup_seconds', 'Time of the warm-up forward pass in this process.',
+    ['backend'], multiprocess_mode='liveall',
+)
+VERSION_TRAFFIC = Gauge(
+    'crybaby_model_traffic_percent', 'Share of new requests routed to each model version.',
+    ['version'], multiprocess_mode='liveall',
+)
+ADMISSION = Counter(
+    'crybaby_admission_total', 'Prediction requests by API key and admission outcome (admitted, rate_limited, busy).',
+    ['key', 'outcome'],
+)
+AUDIT_RECORDS = Counter(
+    'crybaby_audit_records_total', 'Prediction audit records by outcome (written, dropped, failed).', ['outcome'],
+)
+RESIDENT_MEMORY = Gauge(
+    'crybaby_process_resident_memory_bytes', 'Resident set size of this process.',
+    multiprocess_mode='liveall',
+)
+
+# Bound children up front so the hot path skips the label lookup
+_stage_children = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+_page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Per-request stage times (ms) for the audit log; see collect_stages
+_stage_log = ContextVar('crybaby_stage_log', default=None)
+
+
+@contextmanager
+def collect_stages(timings=None):
+    """
+    Also add the stage times (ms) observed by this thread / task inside the
+    block to `timings` (a new dict by default), which is yielded.
+    """
+    timings = {} if timings is None else timings
+    token = _stage_log.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_log.reset(token)
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Observe the wall time of the block under crybaby_stage_seconds{stage}.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def observe_stage(stage, seconds):
+    _stage_children[stage].observe(seconds)
+    timings = _stage_log.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1000.0
+
+
+def count_prediction(label, version=None):
+    PREDICTIONS.labels(label, version or '').inc()
+
+
+def observe_version(version, seconds):
+    VERSION_SECONDS.labels(version).observe(seconds)
+
+
+_traffic_versions = set()
+
+
+def set_traffic(shares):
+    """
+    Publish {version: percent}; versions no longer routed drop to 0.
+    """
+    for version in _traffic_versions - set(shares):
+        VERSION_TRAFFIC.labels(version).set(0)
+    for version, percent in shares.items():
+        VERSION_TRAFFIC.labels(version).set(percent)
+    _traffic_versions.update(shares)
+
+
+def record_model_load(backend, load_seconds, warmup_seconds):
+    MODEL_LOAD_SECONDS.labels(backend).set(load_seconds)
+    MODEL_WARMUP_SECONDS.labels(backend).set(warmup_seconds)
+    update_rss()
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * _page_size
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def update_rss():
+    rss = _rss_bytes()
+    if rss is not None:
+        RESIDENT_MEMORY.set(rss)
+
+
+# Report something sensible for a worker that has not served a request yet
+update_rss()
+
+
+def render():
+    """
+    Current metrics in the Prometheus text format, merged across worker
+    processes when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    update_rss()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def _record_request(request, response, started):
+    match = getattr(request, 'resolver_match', None)
+    # Unrouted paths (404s, static files) would only add label cardinality
+    if match is None or not match.url_name or match.url_name == 'metrics':
+        return
+    endpoint = match.url_name
+    REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+    if response.status_code >= 400:
+        ERRORS.labels(endpoint, str(response.status_code)).inc()
+    update_rss()
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Request latency and error-status counters for every routed endpoint.
+    Listed first in MIDDLEWARE so the time covers the whole stack.
+    """
+    if not settings.METRICS['ENABLED']:
+        raise MiddlewareNotUsed()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            response = await get_response(request)
+            _record_request(request, response, started)
+            return response
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            response = get_response(request)
+            _record_request(request, response, started)
+            return response
+    return middleware
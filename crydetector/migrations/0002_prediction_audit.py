@@ -0,0 +1,34 @@
+# Generated by Django 4.2.28 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crydetector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('endpoint', models.CharField(max_length=32)),
+                ('api_key', models.CharField(blank=True, default='', max_length=64)),
+                ('audio_sha256', models.CharField(blank=True, default='', max_length=64)),
+                ('label', models.CharField(max_length=32)),
+                ('confidence', models.FloatField()),
+                ('probabilities', models.JSONField(default=dict)),
+                ('model_version', models.CharField(blank=True, default='', max_length=128)),
+                ('cached', models.BooleanField(default=False)),
+                ('gated', models.BooleanField(default=False)),
+                ('timings_ms', models.JSONField(default=dict)),
+                ('total_ms', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
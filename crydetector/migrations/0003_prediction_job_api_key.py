@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-17 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crydetector', '0002_prediction_audit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionjob',
+            name='api_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
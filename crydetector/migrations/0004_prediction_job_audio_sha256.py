@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-17 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crydetector', '0003_prediction_job_api_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionjob',
+            name='audio_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
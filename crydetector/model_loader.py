@@ -1,52 +1,529 @@
 import os
+import time
+import queue
 import logging
-import tensorflow as tf
+import threading
+import numpy as np
 from django.conf import settings
 
-# Speed Optimization: Disable unnecessary TF logs
+from . import metrics
+from .audio_utils import get_feature_extractor
+from .inference_backends import backend_path, import_runtime, load_backend, shareable_across_fork
+from .metrics import INFERENCE_BATCH_ROWS, record_model_load, stage_timer
+
+# Speed Optimization: Disable unnecessary TF logs (TF itself is only
+# imported by the keras backend, which applies settings.TF_RUNTIME)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
 logger = logging.getLogger(__name__)
 
-_model = None
+# The single configured model, when the model registry is disabled
+_static = None
+_static_lock = threading.Lock()
+_warm_lock = threading.Lock()
+_warm_state = {'ready': False, 'warming': False, 'error': None, 'seconds': None}
+# True in forked children (gunicorn workers). Only models loaded before a
+# fork in a FORK_SAFE process need the single-threaded runtime.
+_forked = False
+
+def _after_fork():
+    global _forked
+    _forked = True
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def load_version(path, name=None):
+    """
+    Load the model file at `path` with the configured backend and warm it up.
+    Returns a ModelVersion named after the file; raises if it cannot be loaded.
+    """
+    config = settings.INFERENCE_BACKEND
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    logger.info(f"Loading {config['NAME']} model {name}...")
+    fingerprint = _file_version(path)
+    started = time.perf_counter()
+    model = load_backend(config['NAME'], path, num_threads=config['NUM_THREADS'],
+                         fork_safe=config['FORK_SAFE'] and not _forked, runtime=settings.TF_RUNTIME)
+    loaded = time.perf_counter()
+
+    # Warm-up call: forces the runtime to initialize kernels/buffers
+    # Prevents 1-2s delay on the first real prediction
+    logger.info("Warming up model...")
+    for rows in _warm_up_batch_sizes(model):
+        model.predict(np.zeros((rows, 40, 173, 1), dtype=np.float32))
+    warmup = time.perf_counter() - loaded
+    record_model_load(config['NAME'], loaded - started, warmup)
+    logger.info(f"Model {name} ready (load {loaded - started:.2f}s, warm-up {warmup:.2f}s).")
+    return ModelVersion(name, path, fingerprint, model)
+
+def _get_static_version():
+    global _static
+    if _static is None:
+        with _static_lock:
+            if _static is None:
+                try:
+                    _static = load_version(backend_path(settings.INFERENCE_BACKEND['NAME']))
+                except Exception as e:
+                    logger.error(f"Model load failed: {e}")
+                    return None
+    return _static
+
+def get_active_version():
+    """
+    The version serving default traffic: the registry's active version, or
+    the model from settings.INFERENCE_BACKEND (loaded on first use).
+    None when no model is available.
+    """
+    if settings.MODEL_REGISTRY['ENABLED']:
+        from .model_registry import get_registry
+        return get_registry().active_version()
+    return _get_static_version()
+
+def select_version():
+    """
+    Version that serves one request: the active one, or another version
+    picked by the registry's traffic split. A request keeps the version it
+    was given for all of its inference, even if a newer one is swapped in.
+    """
+    if settings.MODEL_REGISTRY['ENABLED']:
+        from .model_registry import get_registry
+        return get_registry().route()
+    return _get_static_version()
 
 def get_model():
     """
     Singleton loader with warm-up logic to eliminate latency.
+    Returns the inference backend of the active version.
+    """
+    version = get_active_version()
+    return version.model if version is not None else None
+
+def _warm_up_batch_sizes(model):
     """
-    global _model
-    if _model is None:
+    One call normally; with XLA, every padded batch size up to the batching
+    engine's maximum is compiled up front (larger batches compile on first use).
+    """
+    if not getattr(model, 'xla_jit', False):
+        return [1]
+    largest = settings.INFERENCE_BATCHING['MAX_BATCH_SIZE'] if settings.INFERENCE_BATCHING['ENABLED'] else 1
+    return [1 << i for i in range(max(0, largest - 1).bit_length() + 1)]
+
+def _file_version(path):
+    """
+    Identifier for a model file on disk: name, size and mtime.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 'unavailable'
+    return f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}"
+
+def get_model_version():
+    """
+    Version of the active model (or of the file that would be loaded).
+    """
+    version = get_active_version() if is_model_loaded() else None
+    if version is not None:
+        return version.fingerprint
+    return _file_version(backend_path(settings.INFERENCE_BACKEND['NAME']))
+
+def _run_model(model, features):
+    """
+    Single forward pass over an (N, 40, 173, 1) batch.
+    """
+    INFERENCE_BATCH_ROWS.observe(features.shape[0])
+    with stage_timer('inference'):
+        return model.predict(features)
+
+
+# Queued by BatchInferenceEngine.close() to wake the batching thread
+_CLOSE = object()
+
+
+class _PendingRequest:
+    __slots__ = ('features', 'rows', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, features):
+        self.features = features
+        self.rows = features.shape[0]
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchInferenceEngine:
+    """
+    Dynamic micro-batching in front of the model.
+    Concurrent callers are queued and grouped into a single forward pass
+    of up to `max_batch_size` rows, waiting at most `max_wait_ms` for
+    the batch to fill while other callers are still in flight.
+    close() stops the batching thread once queued requests are scored;
+    later calls run unbatched on the caller's thread.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._closed = False
+        self._closing = False
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, features):
+        """
+        Queue an (N, 40, 173, 1) array and block until its rows are scored.
+        """
+        request = _PendingRequest(np.asarray(features, dtype=np.float32))
+        with self._in_flight_lock:
+            closed = self._closed
+            if not closed:
+                self._in_flight += 1
+        if closed:
+            return _run_model(self.model, request.features)
         try:
-            logger.info("Loading model for the first time...")
-            _model = tf.keras.models.load_model(settings.MODEL_PATH, compile=False)
-            
-            # Warm-up call: forces TF to initialize graph/kernels
-            # Prevents 1-2s delay on the first real prediction
-            logger.info("Warming up model...")
-            dummy = tf.zeros((1, 40, 173, 1))
-            _model(dummy, training=False)
-            logger.info("Model ready.")
-        except Exception as e:
-            logger.error(f"Model load failed: {e}")
+            self._queue.put(request)
+            request.done.wait()
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        """
+        Block for the first request, then gather more until the batch is
+        full, the wait budget is spent, or no other caller is pending.
+        """
+        first = self._take()
+        if first is None:
+            return [], 0
+        batch = [first]
+        rows = first.rows
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            # Only wait when other threads are inside submit(); a lone
+            # request should not pay the batching delay.
+            with self._in_flight_lock:
+                others_pending = self._in_flight > len(batch)
+            timeout = deadline - time.perf_counter()
+            try:
+                if others_pending and timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _CLOSE:
+                self._closing = True
+                break
+            batch.append(request)
+            rows += request.rows
+        return batch, rows
+
+    def _take(self):
+        """
+        Block for the next request. Once closing, poll until every caller
+        that entered submit() before close() has been served; then None.
+        """
+        while True:
+            try:
+                request = self._queue.get(timeout=0.05 if self._closing else None)
+            except queue.Empty:
+                with self._in_flight_lock:
+                    if self._in_flight == 0:
+                        return None
+                continue
+            if request is _CLOSE:
+                self._closing = True
+                continue
+            return request
+
+    def _run(self):
+        while True:
+            batch, rows = self._collect()
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                if len(batch) == 1:
+                    features = batch[0].features
+                else:
+                    features = np.concatenate([r.features for r in batch], axis=0)
+                probs = _run_model(self.model, features)
+                offset = 0
+                for r in batch:
+                    r.result = probs[offset:offset + r.rows]
+                    offset += r.rows
+            except Exception as e:
+                logger.error(f"Batched inference failed: {e}")
+                for r in batch:
+                    r.error = e
+            finished = time.perf_counter()
+            self._record(rows, finished - started, max(finished - r.enqueued_at for r in batch))
+            for r in batch:
+                r.done.set()
+
+    def close(self):
+        with self._in_flight_lock:
+            self._closed = True
+        self._queue.put(_CLOSE)
+
+    def _record(self, rows, infer_s, total_s):
+        with self._stats_lock:
+            entry = self._stats.setdefault(rows, {
+                'batches': 0, 'infer_ms_total': 0.0, 'infer_ms_max': 0.0, 'latency_ms_max': 0.0,
+            })
+            entry['batches'] += 1
+            entry['infer_ms_total'] += infer_s * 1000.0
+            entry['infer_ms_max'] = max(entry['infer_ms_max'], infer_s * 1000.0)
+            entry['latency_ms_max'] = max(entry['latency_ms_max'], total_s * 1000.0)
+
+    def stats(self):
+        """
+        Per-batch-size counters: number of batches and forward-pass latency.
+        """
+        with self._stats_lock:
+            by_size = {}
+            for rows, entry in sorted(self._stats.items()):
+                by_size[rows] = {
+                    'batches': entry['batches'],
+                    'infer_ms_avg': round(entry['infer_ms_total'] / entry['batches'], 3),
+                    'infer_ms_max': round(entry['infer_ms_max'], 3),
+                    'latency_ms_max': round(entry['latency_ms_max'], 3),
+                }
+        batches = sum(e['batches'] for e in by_size.values())
+        items = sum(rows * e['batches'] for rows, e in by_size.items())
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': batches,
+            'items': items,
+            'avg_batch_size': round(items / batches, 3) if batches else 0.0,
+            'by_batch_size': by_size,
+        }
+
+
+class ModelVersion:
+    """
+    One loaded, warmed model file with its own batching engine and latency
+    counters. Requests keep the version they started with, so swapping in
+    a newer one never interrupts them; retire() stops the engine after the
+    requests already queued on it.
+    """
+
+    def __init__(self, name, path, fingerprint, model):
+        self.name = name
+        self.path = path
+        self.fingerprint = fingerprint
+        self.model = model
+        self.loaded_at = time.time()
+        self._engine = None
+        self._engine_lock = threading.Lock()
+        self._retired = False
+        self._stats = {'requests': 0, 'rows': 0, 'errors': 0, 'latency_ms_total': 0.0, 'latency_ms_max': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def get_engine(self):
+        """
+        Lazily start the batching engine (after fork, so each worker owns its thread).
+        Returns None when batching is disabled or the version is retired.
+        """
+        config = settings.INFERENCE_BATCHING
+        if not config['ENABLED'] or self._retired:
             return None
-    return _model
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None and not self._retired:
+                    self._engine = BatchInferenceEngine(
+                        self.model,
+                        max_batch_size=config['MAX_BATCH_SIZE'],
+                        max_wait_ms=config['MAX_WAIT_MS'],
+                    )
+        return self._engine
+
+    def predict(self, features):
+        """
+        Score an (N, 40, 173, 1) array, through the batching engine when enabled.
+        """
+        started = time.perf_counter()
+        try:
+            engine = self.get_engine()
+            if engine is not None:
+                probs = engine.submit(features)
+            else:
+                probs = _run_model(self.model, features)
+        except Exception:
+            self._record(features.shape[0], None)
+            raise
+        self._record(features.shape[0], time.perf_counter() - started)
+        return probs
+
+    def embed(self, features):
+        """
+        (embeddings, probabilities) for an (N, 40, 173, 1) array in one
+        forward pass, outside the batching engine. Keras backend only.
+        """
+        embed = getattr(self.model, 'embed', None)
+        if embed is None:
+            raise NotImplementedError(f"The {self.model.name} backend has no embedding output")
+        started = time.perf_counter()
+        try:
+            with stage_timer('inference'):
+                embeddings, probs = embed(features)
+        except Exception:
+            self._record(features.shape[0], None)
+            raise
+        self._record(features.shape[0], time.perf_counter() - started)
+        return embeddings, probs
+
+    def _record(self, rows, seconds):
+        with self._stats_lock:
+            if seconds is None:
+                self._stats['errors'] += 1
+                return
+            self._stats['requests'] += 1
+            self._stats['rows'] += rows
+            self._stats['latency_ms_total'] += seconds * 1000.0
+            self._stats['latency_ms_max'] = max(self._stats['latency_ms_max'], seconds * 1000.0)
+        metrics.observe_version(self.name, seconds)
+
+    def retire(self):
+        with self._engine_lock:
+            self._retired = True
+            engine, self._engine = self._engine, None
+        if engine is not None:
+            engine.close()
+
+    def stats(self):
+        """
+        Request count and latency (batching wait included) for this version.
+        """
+        with self._stats_lock:
+            entry = dict(self._stats)
+        return {
+            'fingerprint': self.fingerprint,
+            'loaded_at': round(self.loaded_at, 3),
+            'requests': entry['requests'],
+            'rows': entry['rows'],
+            'errors': entry['errors'],
+            'latency_ms_avg': round(entry['latency_ms_total'] / entry['requests'], 3) if entry['requests'] else 0.0,
+            'latency_ms_max': round(entry['latency_ms_max'], 3),
+        }
+
+
+def predict_batch(features, version=None):
+    """
+    Score an (N, 40, 173, 1) array and return (N, n_classes) probabilities.
+    Uses `version` when given (see select_version), else picks one.
+    Goes through the batching engine when enabled.
+    """
+    version = version or select_version()
+    if version is None: raise RuntimeError("Model unavailable")
+    return version.predict(features)
 
-def predict_fast(features):
+def predict_fast(features, version=None):
     """
-    High-speed inference using direct __call__.
-    Faster than .predict() for single samples.
+    High-speed inference for a single preprocessed clip.
+    Concurrent calls are coalesced into one forward pass by the batching engine.
     """
-    model = get_model()
-    if model is None: raise RuntimeError("Model unavailable")
-    
-    # Input conversion
-    tensor_input = tf.convert_to_tensor(features)
-    
-    # Single sample inference is faster via direct call
-    logits = model(tensor_input, training=False)
-    
-    return logits.numpy()[0]
+    return predict_batch(features, version)[0]
+
+def get_inference_stats():
+    backend = settings.INFERENCE_BACKEND['NAME']
+    stats = {'backend': backend, 'batching_enabled': settings.INFERENCE_BATCHING['ENABLED']}
+    if settings.MODEL_REGISTRY['ENABLED']:
+        from . import model_registry
+        registry = model_registry.peek_registry()
+        stats['registry'] = registry.stats() if registry is not None else {'started': False}
+        version = registry.active_version() if registry is not None else None
+    else:
+        version = _static
+        if version is not None:
+            stats['versions'] = {version.name: version.stats()}
+    engine = version._engine if version is not None else None
+    if engine is None:
+        return {**stats, 'batches': 0}
+    return {**stats, **engine.stats()}
 
 def is_model_available():
     return get_model() is not None
+
+def is_model_loaded():
+    """
+    Whether a model is already in memory; never triggers a load.
+    """
+    if settings.MODEL_REGISTRY['ENABLED']:
+        from . import model_registry
+        registry = model_registry.peek_registry()
+        return registry is not None and registry.active_version() is not None
+    return _static is not None
+
+def _warm_audio_stack():
+    import librosa
+    extractor = get_feature_extractor()
+    sr = extractor.sample_rate
+    # The first resample pulls in the resampler backend (soxr / scipy)
+    librosa.resample(np.zeros(sr // 10, dtype=np.float32), orig_sr=sr // 2, target_sr=sr)
+    extractor.transform(np.random.default_rng(0).standard_normal(extractor.target_samples).astype(np.float32))
+
+def warm_up():
+    """
+    Explicit warm-up: import the audio stack (librosa, resampler), build the
+    feature tables and load + warm the model. Safe to call repeatedly;
+    returns True once the process can serve predictions.
+    """
+    with _warm_lock:
+        if _warm_state['ready']:
+            return True
+        _warm_state['warming'] = True
+        started = time.perf_counter()
+        try:
+            _warm_audio_stack()
+            ready = get_model() is not None
+            error = None if ready else 'Model unavailable'
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+            ready, error = False, str(e)
+        _warm_state.update(ready=ready, warming=False, error=error,
+                           seconds=round(time.perf_counter() - started, 3))
+        return ready
+
+def loads_after_fork():
+    """
+    True in a process that forks its workers later (gunicorn preload) when
+    the configured model cannot run across fork(): TF graphs need the
+    inter-op thread pool, which the children would not have. The same
+    goes for the model registry's watcher thread.
+    """
+    config = settings.INFERENCE_BACKEND
+    if not config['FORK_SAFE'] or _forked:
+        return False
+    return settings.MODEL_REGISTRY['ENABLED'] or not shareable_across_fork(config['NAME'], settings.TF_RUNTIME)
+
+def preload_runtime():
+    """
+    Pre-fork part of warm_up(): audio stack and runtime imports, no model.
+    Workers finish with warm_up() after the fork.
+    """
+    _warm_audio_stack()
+    import_runtime(settings.INFERENCE_BACKEND['NAME'], settings.TF_RUNTIME)
+
+def start_warm_up():
+    """
+    warm_up() on a background thread, unless it is done or already running.
+    """
+    if _warm_state['ready'] or _warm_state['warming']:
+        return
+    _warm_state['warming'] = True
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+def warm_up_state():
+    return {**_warm_state, 'model_loaded': is_model_loaded()}
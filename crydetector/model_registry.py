@@ -0,0 +1,286 @@
+"""
+Model registry: serve the model files in settings.MODEL_REGISTRY['DIR'] as
+named versions, pick up new ones without a restart and split traffic
+between them.
+
+    models/
+        cry_2026_09.keras     one version per model file of the configured
+        cry_2026_10.keras     backend (.keras / .h5, .tflite or .onnx),
+        registry.json         named after the file without its extension
+
+A watcher thread rescans the directory every POLL_SECONDS. Versions that
+are wanted (the active one plus any with a traffic share) and are new or
+changed on disk are loaded and warmed on that thread; only then is the
+routing table replaced, in a single assignment, so no request ever waits
+for a load. Requests that already picked a version finish on it, and
+versions that are no longer routed are retired.
+
+The active version is ACTIVE, or else the newest file. TRAFFIC
+("cry_2026_10=10") sends that percentage of requests to other versions;
+the rest go to the active one. registry.json overrides both and is
+re-read on every scan, so promotions and rollbacks need no restart:
+
+    {"active": "cry_2026_09", "traffic": {"cry_2026_10": 10}}
+
+Copy new files in under a temporary name and rename them into place; a
+file that fails to load is retried only once it changes again. With no
+model files in DIR, the configured model (MODEL_PATH, or the tflite /
+onnx path) is served as the only version.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from django.conf import settings
+
+from . import metrics
+from .inference_backends import MODEL_EXTENSIONS, backend_path
+from .model_loader import _file_version, load_version
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = 'registry.json'
+
+_registry = None
+_registry_lock = threading.Lock()
+# (time.monotonic(), error) of the last failed start; not retried for POLL_SECONDS
+_start_failure = None
+
+
+def parse_traffic(value):
+    """
+    "cry_v2=10, cry_v3=5" -> {'cry_v2': 10.0, 'cry_v3': 5.0}
+    """
+    traffic = {}
+    for part in value.split(','):
+        if part.strip():
+            name, _, percent = part.partition('=')
+            traffic[name.strip()] = float(percent)
+    return traffic
+
+
+class ModelRegistry:
+
+    def __init__(self, directory, poll_seconds=10.0, active='', traffic=None):
+        self.directory = str(directory)
+        self.poll_seconds = max(1.0, float(poll_seconds))
+        self.default_active = active
+        self.default_traffic = dict(traffic or {})
+        self.last_scan = None
+        # (active ModelVersion, ((cumulative percent, ModelVersion), ...)),
+        # replaced as a whole so route() never sees a half-built table
+        self._routes = (None, ())
+        self._versions = {}
+        self._traffic = {}
+        self._failed = {}
+        self._scan_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Load the initial versions, then keep watching in the background.
+        A failed first scan is retried by the watcher, not by the caller.
+        """
+        try:
+            self.scan()
+        except Exception as e:
+            logger.error(f"Model registry scan failed, retrying in {self.poll_seconds:g}s: {e}")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"Model registry scan failed: {e}")
+
+    def files(self):
+        """
+        {version name: path} of the model files the registry can serve.
+        """
+        extensions = MODEL_EXTENSIONS.get(settings.INFERENCE_BACKEND['NAME'], ())
+        files = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    name, ext = os.path.splitext(entry.name)
+                    if ext.lower() in extensions and not name.startswith('.') and entry.is_file():
+                        files[name] = entry.path
+        except OSError as e:
+            logger.warning(f"Cannot read model directory {self.directory}: {e}")
+        if not files:
+            path = backend_path(settings.INFERENCE_BACKEND['NAME'])
+            if os.path.isfile(path):
+                files[os.path.splitext(os.path.basename(path))[0]] = path
+        return files
+
+    def _config(self):
+        """
+        (active name, {name: percent}) from registry.json, else settings.
+        """
+        active, traffic = self.default_active, self.default_traffic
+        path = os.path.join(self.directory, CONFIG_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    data = json.load(fh)
+                active = data.get('active') or active
+                traffic = {str(k): float(v) for k, v in data.get('traffic', traffic).items()}
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logger.error(f"Ignoring {path}: {e}")
+        return active, traffic
+
+    def scan(self):
+        """
+        Load wanted versions that are new or changed on disk, then swap
+        the routing table. Safe to call from any thread.
+        """
+        with self._scan_lock:
+            files = self.files()
+            active, traffic = self._config()
+            previous = self._routes[0]
+
+            mtimes = {}
+            for name, path in list(files.items()):
+                try:
+                    mtimes[name] = os.path.getmtime(path)
+                except OSError:
+                    # Deleted or renamed since it was listed (e.g. a deploy
+                    # renaming a new file into place); the next scan sees it
+                    del files[name]
+
+            # Configured / newest first; if that file does not load, keep
+            # the version already serving, else fall back to older files
+            newest = sorted(files, key=mtimes.get, reverse=True)
+            candidates = [active if active in files else newest[0]] if files else []
+            if previous is not None and previous.name in files:
+                candidates.append(previous.name)
+            candidates += newest
+
+            versions = {}
+            active_version = None
+            for name in candidates:
+                active_version = self._load(name, files[name])
+                if active_version is not None:
+                    versions[name] = active_version
+                    break
+
+            shares = {}
+            for name, percent in traffic.items():
+                if percent <= 0 or name not in files or name in versions:
+                    continue
+                version = self._load(name, files[name])
+                if version is not None:
+                    versions[name] = version
+                    shares[name] = percent
+            self._swap(versions, active_version, shares)
+            self.last_scan = time.time()
+
+    def _load(self, name, path):
+        """
+        The loaded version `name`, (re)loading it when the file changed.
+        A file that fails keeps the previous load until it changes again.
+        """
+        fingerprint = _file_version(path)
+        current = self._versions.get(name)
+        if current is not None and current.fingerprint == fingerprint:
+            return current
+        if self._failed.get(name) == fingerprint:
+            return current
+        try:
+            version = load_version(path, name)
+        except Exception as e:
+            logger.error(f"Model version {name} failed to load: {e}")
+            self._failed[name] = fingerprint
+            return current
+        self._failed.pop(name, None)
+        return version
+
+    def _swap(self, versions, active, shares):
+        routes, bound, traffic = [], 0.0, {}
+        for name, percent in shares.items():
+            share = min(percent, 100.0 - bound)
+            bound += share
+            routes.append((bound, versions[name]))
+            traffic[name] = share
+        if active is not None:
+            traffic[active.name] = 100.0 - bound
+        self._routes = (active, tuple(routes))
+
+        retired = [v for name, v in self._versions.items() if versions.get(name) is not v]
+        self._versions = versions
+        for version in retired:
+            version.retire()
+
+        metrics.set_traffic(traffic)
+        if traffic != self._traffic or retired:
+            split = ', '.join(f"{name} {percent:g}%" for name, percent in traffic.items())
+            logger.info(f"Model registry now serving: {split or 'nothing'}")
+        self._traffic = traffic
+
+    def route(self):
+        """
+        Version for one request, drawn from the traffic split.
+        """
+        active, routes = self._routes
+        if routes:
+            draw = random.random() * 100.0
+            for bound, version in routes:
+                if draw < bound:
+                    return version
+        return active
+
+    def active_version(self):
+        return self._routes[0]
+
+    def stats(self):
+        active = self._routes[0]
+        versions = self._versions
+        return {
+            'directory': self.directory,
+            'active': active.name if active is not None else None,
+            'traffic_percent': dict(self._traffic),
+            'failed': sorted(self._failed),
+            'last_scan': round(self.last_scan, 3) if self.last_scan else None,
+            'versions': {name: v.stats() for name, v in versions.items()},
+        }
+
+
+def get_registry():
+    """
+    Process-wide registry, started on first use (after fork under gunicorn,
+    so each worker runs its own watcher thread). If starting fails (e.g. a
+    malformed MODEL_TRAFFIC), callers get RuntimeError at once and the start
+    is retried only after POLL_SECONDS.
+    """
+    global _registry, _start_failure
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                config = settings.MODEL_REGISTRY
+                if _start_failure is not None and time.monotonic() - _start_failure[0] < config['POLL_SECONDS']:
+                    raise RuntimeError(f"Model registry failed to start: {_start_failure[1]}")
+                try:
+                    registry = ModelRegistry(config['DIR'], config['POLL_SECONDS'], config['ACTIVE'],
+                                             parse_traffic(config['TRAFFIC']))
+                    registry.start()
+                except Exception as e:
+                    logger.error(f"Model registry failed to start, retrying in {config['POLL_SECONDS']:g}s: {e}")
+                    _start_failure = (time.monotonic(), e)
+                    raise
+                _start_failure = None
+                _registry = registry
+    return _registry
+
+
+def peek_registry():
+    """
+    The registry if it has been started; never starts it.
+    """
+    return _registry
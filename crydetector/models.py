@@ -0,0 +1,98 @@
+"""
+Database models for crydetector.
+"""
+
+import uuid
+from django.db import models
+
+
+class PredictionJob(models.Model):
+    """
+    One asynchronous prediction: the upload is stored with the job, drained
+    by `manage.py run_prediction_workers` and the result kept for polling.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    filename = models.CharField(max_length=255)
+    # Cleared once the job finishes so the queue table stays small
+    audio = models.BinaryField()
+    use_gate = models.BooleanField(default=True)
+    # Name of the submitting API key (settings.API_KEYS); only it can poll the job
+    api_key = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # sha256 of the whole upload (`audio` may only hold the model window)
+    audio_sha256 = models.CharField(max_length=64, blank=True, default='')
+
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    # Set atomically by the worker that claims the job
+    claim_token = models.UUIDField(null=True, blank=True, db_index=True)
+    worker = models.CharField(max_length=64, blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    # Queue metrics
+    queue_depth_at_submit = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+    @property
+    def wait_ms(self):
+        if self.started_at is None:
+            return None
+        return round((self.started_at - self.created_at).total_seconds() * 1000.0, 1)
+
+    @property
+    def processing_ms(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return round((self.finished_at - self.started_at).total_seconds() * 1000.0, 1)
+
+
+class PredictionAudit(models.Model):
+    """
+    One served prediction, for analytics and model monitoring. Rows are
+    queued in memory and bulk-inserted by a background thread (see audit.py),
+    so `created_at` is the request time, not the insert time.
+    """
+
+    created_at = models.DateTimeField(db_index=True)
+    endpoint = models.CharField(max_length=32)
+    # Key name from settings.API_KEYS (see verify_api_key), never the key itself
+    api_key = models.CharField(max_length=64, blank=True, default='')
+    audio_sha256 = models.CharField(max_length=64, blank=True, default='')
+    label = models.CharField(max_length=32)
+    confidence = models.FloatField()
+    probabilities = models.JSONField(default=dict)
+    model_version = models.CharField(max_length=128, blank=True, default='')
+    cached = models.BooleanField(default=False)
+    gated = models.BooleanField(default=False)
+    # decode / resample / features / inference in ms; total_ms covers all of
+    # them (inference includes the batching wait)
+    timings_ms = models.JSONField(default=dict)
+    total_ms = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} {self.endpoint} {self.label}"
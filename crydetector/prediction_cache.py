@@ -0,0 +1,158 @@
+"""
+Content-addressed prediction cache.
+Keys are a SHA-256 of the uploaded bytes plus a fingerprint of the model
+version and AUDIO_CONFIG, so a retrained model or changed preprocessing
+never serves stale results. Two tiers:
+  1. In-process LRU with size and TTL limits (per worker)
+  2. Optional Django cache alias shared across gunicorn workers
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class PredictionCache:
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, alias=''):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits_local': 0, 'hits_shared': 0, 'misses': 0,
+            'evictions': 0, 'expirations': 0, 'shared_errors': 0,
+        }
+        # Model version -> fingerprint; several versions may serve at once
+        self._fingerprints = {}
+
+    def _shared(self):
+        if not self.alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def _config_fingerprint(self, version=None):
+        if version is None:
+            from .model_loader import get_model_version
+            version = get_model_version()
+        fingerprint = self._fingerprints.get(version)
+        if fingerprint is None:
+            payload = json.dumps({
+                'model': version,
+                'audio': settings.AUDIO_CONFIG,
+                'classes': settings.CRY_CLASSES,
+            }, sort_keys=True)
+            fingerprint = hashlib.sha256(payload.encode()).hexdigest()[:16]
+            self._fingerprints[version] = fingerprint
+        return fingerprint
+
+    def make_key(self, audio_data, model_version=None, digest=None):
+        """
+        `model_version` is the fingerprint of the version that will score
+        the clip (ModelVersion.fingerprint); default: the active model.
+        `digest` is the sha256 hex digest of audio_data, when already known.
+        """
+        digest = digest or hashlib.sha256(audio_data).hexdigest()
+        return f"pred:{self._config_fingerprint(model_version)}:{digest}"
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        """
+        Return cached probabilities (np.ndarray) or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, probs = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits_local'] += 1
+                    return probs
+                del self._entries[key]
+                self._counters['expirations'] += 1
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                value = shared.get(key)
+            except Exception as e:
+                logger.warning(f"Shared prediction cache read failed: {e}")
+                self._count('shared_errors')
+                value = None
+            if value is not None:
+                probs = np.asarray(value, dtype=np.float32)
+                self._store_local(key, probs)
+                self._count('hits_shared')
+                return probs
+
+        self._count('misses')
+        return None
+
+    def set(self, key, probs):
+        probs = np.asarray(probs, dtype=np.float32)
+        self._store_local(key, probs)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, probs.tolist(), timeout=self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared prediction cache write failed: {e}")
+                self._count('shared_errors')
+
+    def _store_local(self, key, probs):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, probs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters['hits_local'] + counters['hits_shared'] + counters['misses']
+        hits = counters['hits_local'] + counters['hits_shared']
+        return {
+            **counters,
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'shared_alias': self.alias or None,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def get_prediction_cache():
+    """
+    Process-wide cache built from settings.PREDICTION_CACHE, or None if disabled.
+    """
+    global _cache
+    config = settings.PREDICTION_CACHE
+    if not config['ENABLED']:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(
+                    max_entries=config['MAX_ENTRIES'],
+                    ttl_seconds=config['TTL_SECONDS'],
+                    alias=config['ALIAS'],
+                )
+    return _cache
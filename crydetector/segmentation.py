@@ -0,0 +1,188 @@
+"""
+Long-recording segmentation.
+Streams a multi-minute recording in blocks (never loading it whole),
+slides a 4 s window over it with a configurable hop, skips silent
+windows with a cheap energy gate, batches the rest through the model and
+returns a timeline plus merged cry episodes.
+"""
+
+import time
+import numpy as np
+from django.conf import settings
+
+from .audio_utils import get_feature_extractor
+
+
+def iter_audio_blocks(source, sr, block_seconds):
+    """
+    Yield mono float32 blocks at `sr` from a path or file-like WAV source.
+    Resampling is streamed (soxr) so block boundaries leave no artifacts.
+    """
+    import soundfile as sf
+
+    try:
+        f = sf.SoundFile(source)
+    except sf.SoundFileError as e:
+        raise ValueError(f"Unreadable audio: {e}")
+
+    with f:
+        resampler = None
+        if f.samplerate != sr:
+            import soxr
+            resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype='float32')
+
+        blocksize = max(1, int(block_seconds * f.samplerate))
+        for block in f.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+            y = block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+            if resampler is not None:
+                y = resampler.resample_chunk(y)
+            if y.size:
+                yield y
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if tail.size:
+                yield tail
+
+
+def iter_windows(blocks, window, hop, min_samples):
+    """
+    Re-chunk a block stream into (start_sample, samples) windows of `window`
+    samples every `hop` samples. A trailing partial window is yielded if it
+    reaches past the last full window and holds at least `min_samples`.
+    """
+    buf = np.empty(0, dtype=np.float32)
+    offset = 0   # stream position of buf[0]
+    covered = 0  # stream position where the last full window ended
+    for block in blocks:
+        buf = np.concatenate([buf, block])
+        while buf.size >= window:
+            yield offset, buf[:window]
+            covered = offset + window
+            buf = buf[hop:]
+            offset += hop
+    if offset + buf.size > covered and buf.size >= min_samples:
+        yield offset, buf
+
+
+def _window_dbfs(y):
+    rms = np.sqrt(np.mean(np.square(y, dtype=np.float32)))
+    return 20.0 * np.log10(max(float(rms), 1e-10))
+
+
+def merge_episodes(segments, max_gap):
+    """
+    Merge crying segments that overlap or are within `max_gap` seconds.
+    The episode label is the one with the highest summed confidence.
+    """
+    episodes = []
+    for seg in segments:
+        if not seg.get('is_crying'):
+            continue
+        if episodes and seg['start'] <= episodes[-1]['end'] + max_gap:
+            ep = episodes[-1]
+            ep['end'] = max(ep['end'], seg['end'])
+            ep['windows'] += 1
+            ep['peak_confidence'] = max(ep['peak_confidence'], seg['confidence'])
+        else:
+            ep = {'start': seg['start'], 'end': seg['end'], 'windows': 1,
+                  'peak_confidence': seg['confidence'], '_votes': {}}
+            episodes.append(ep)
+        ep['_votes'][seg['label']] = ep['_votes'].get(seg['label'], 0.0) + seg['confidence']
+
+    for ep in episodes:
+        votes = ep.pop('_votes')
+        ep['label'] = max(votes, key=votes.get)
+    return episodes
+
+
+def segment_recording(source, hop_seconds=None, silence_dbfs=None):
+    """
+    Classify every window of a long recording.
+    Returns {'segments', 'episodes', 'stats'}; segment times are in seconds.
+    stats['cpu_seconds'] is this thread's CPU time for decoding, the
+    silence gate and feature extraction (time.thread_time, so requests
+    running alongside do not count); the model calls, which may run on
+    the backend's own threads, are reported as wall time in
+    stats['inference_seconds'].
+    """
+    from .model_loader import predict_batch, select_version
+
+    config = settings.LONG_AUDIO
+    hop_seconds = hop_seconds or config['HOP_SECONDS']
+    silence_dbfs = config['SILENCE_DBFS'] if silence_dbfs is None else silence_dbfs
+    classes = settings.CRY_CLASSES
+    threshold = settings.CRY_CONFIDENCE_THRESHOLD
+
+    extractor = get_feature_extractor()
+    sr = extractor.sample_rate
+    window = extractor.target_samples
+    hop = min(max(1, int(hop_seconds * sr)), window)
+    max_samples = int(config['MAX_SECONDS'] * sr)
+    n_mfcc, max_len = extractor.n_mfcc, extractor.max_pad_len
+    # One model version for the whole recording, even mid A/B split or reload
+    version = select_version()
+
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    segments, pending = [], []
+    audio_samples = 0
+    # Wall and thread CPU time spent inside predict_batch
+    inference_wall = inference_cpu = 0.0
+
+    def flush():
+        nonlocal inference_wall, inference_cpu
+        batch = extractor.transform(np.stack([extractor.fix_length(y) for _, y in pending]))
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        probs = predict_batch(batch.reshape(len(pending), n_mfcc, max_len, 1), version)
+        inference_wall += time.perf_counter() - started
+        inference_cpu += time.thread_time() - cpu_started
+        for (seg, _), row in zip(pending, probs):
+            idx = int(np.argmax(row))
+            seg.update(
+                label=classes[idx],
+                confidence=round(float(row[idx]), 4),
+                is_crying=bool(row[idx] > threshold),
+            )
+        pending.clear()
+
+    def counted(blocks):
+        nonlocal audio_samples
+        for block in blocks:
+            audio_samples += block.size
+            if audio_samples > max_samples:
+                raise ValueError(f"Recording exceeds {config['MAX_SECONDS']}s limit")
+            yield block
+
+    blocks = counted(iter_audio_blocks(source, sr, config['BLOCK_SECONDS']))
+    for start, y in iter_windows(blocks, window, hop, min_samples=sr):
+        seg = {'start': round(start / sr, 3), 'end': round((start + y.size) / sr, 3)}
+        segments.append(seg)
+        if _window_dbfs(y) < silence_dbfs:
+            seg.update(label=None, confidence=0.0, is_crying=False, silent=True)
+            continue
+        seg['silent'] = False
+        # Copy: the window is a view into the rolling buffer
+        pending.append((seg, y.copy()))
+        if len(pending) >= config['BATCH_SIZE']:
+            flush()
+    if pending:
+        flush()
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.thread_time() - cpu_start - inference_cpu
+    audio_seconds = audio_samples / sr
+    classified = sum(1 for s in segments if not s['silent'])
+    return {
+        'model_version': version.name if version is not None else None,
+        'segments': segments,
+        'episodes': merge_episodes(segments, config['MERGE_GAP_SECONDS']),
+        'stats': {
+            'audio_seconds': round(audio_seconds, 3),
+            'windows': len(segments),
+            'windows_classified': classified,
+            'windows_silent': len(segments) - classified,
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(cpu, 3),
+            'inference_seconds': round(inference_wall, 3),
+            'audio_seconds_per_cpu_second': round(audio_seconds / cpu, 2) if cpu > 0 else None,
+        },
+    }
@@ -0,0 +1,248 @@
+"""
+Real-time cry detection over WebSocket (ASGI).
+
+Clients stream raw mono PCM chunks to STREAM_PATH and receive a JSON
+event for every 4 s window, evaluated every STREAMING['STRIDE_SECONDS'].
+Per connection we keep:
+  - a tail of < n_fft + hop samples not yet turned into a full frame
+  - a fixed ring of MAX_PAD_LEN log-mel frames
+so each chunk only costs the STFT of the newly completed hop frames, and
+memory per connection is bounded regardless of stream length.
+
+Admission (see admission.py) applies per connection and per window: the
+connection and every window scored take a request from the API key's rate
+limit, and each inference holds an inference slot. A connection over the
+limit is refused (close code 4429); a window over it or without a free
+slot is skipped with an error event carrying retry_after.
+
+Query parameters:
+  api_key       API key (browsers cannot set X-API-KEY on WebSockets)
+  sample_rate   input rate in Hz (default AUDIO_CONFIG['SAMPLE_RATE'])
+  encoding      'pcm_s16le' (default) or 'f32le'
+"""
+
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+import numpy as np
+from django.conf import settings
+
+from .admission import AdmissionRejected, get_admission
+from .audio_utils import get_feature_extractor
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/ws/v1/stream/'
+
+ENCODINGS = {
+    'pcm_s16le': (np.dtype('<i2'), 1.0 / 32768.0),
+    'f32le': (np.dtype('<f4'), 1.0),
+}
+
+# WebSocket close codes
+CLOSE_POLICY_VIOLATION = 4401
+CLOSE_BAD_REQUEST = 4400
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_RATE_LIMITED = 4429
+
+_active_connections = 0
+
+
+class StreamingWindow:
+    """
+    Incremental MFCC state for one stream.
+    push() consumes samples at any rate and returns model-ready features
+    for the most recent window when a stride boundary has been crossed.
+    """
+
+    def __init__(self, extractor, stride_seconds, input_rate):
+        self.extractor = extractor
+        self.sample_rate = extractor.sample_rate
+        self.hop = extractor.hop_length
+        self.window_frames = extractor.max_pad_len
+        self.stride_frames = max(1, int(round(stride_seconds * self.sample_rate / self.hop)))
+
+        self._frames = np.zeros((self.window_frames, extractor.mel_basis_t.shape[1]), dtype=np.float32)
+        self._tail = np.empty(0, dtype=np.float32)
+        self.frames_seen = 0
+        self._next_emit = self.window_frames
+        self.windows_skipped = 0
+
+        self._resampler = None
+        if input_rate != self.sample_rate:
+            import soxr
+            self._resampler = soxr.ResampleStream(input_rate, self.sample_rate, 1, dtype='float32')
+
+    @property
+    def window_seconds(self):
+        return ((self.window_frames - 1) * self.hop + self.extractor.n_fft) / self.sample_rate
+
+    def push(self, samples):
+        """
+        Feed float32 samples. Returns (features, end_seconds) for the newest
+        due window, or (None, None). Windows that fell due within the same
+        chunk are skipped (only the latest is classified) and counted.
+        """
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+
+        buf = np.concatenate([self._tail, samples]) if self._tail.size else samples
+        log_mel = self.extractor.log_mel_frames(buf)
+        n = log_mel.shape[0]
+        self._tail = buf[n * self.hop:].copy()
+        if n == 0:
+            return None, None
+
+        # Write the new frames into the ring (only the last window's worth matters)
+        if n > self.window_frames:
+            self.frames_seen += n - self.window_frames
+            log_mel = log_mel[-self.window_frames:]
+        slots = (self.frames_seen + np.arange(log_mel.shape[0])) % self.window_frames
+        self._frames[slots] = log_mel
+        self.frames_seen += log_mel.shape[0]
+
+        if self.frames_seen < self._next_emit:
+            return None, None
+
+        due = 1 + (self.frames_seen - self._next_emit) // self.stride_frames
+        self.windows_skipped += due - 1
+        self._next_emit += due * self.stride_frames
+
+        # Oldest frame first
+        ordered = np.roll(self._frames, -(self.frames_seen % self.window_frames), axis=0)
+        end_seconds = ((self.frames_seen - 1) * self.hop + self.extractor.n_fft) / self.sample_rate
+        return self.extractor.transform_log_mel(ordered), end_seconds
+
+
+def _key_name(scope, params):
+    """
+    Name of the connection's API key, or None when it is not valid.
+    """
+    headers = dict(scope.get('headers') or [])
+    key = headers.get(b'x-api-key', b'').decode('latin-1') or params.get('api_key', [''])[0]
+    return get_admission().authenticate(key)
+
+
+async def _check_rate(admission, name):
+    # A shared-cache bucket is a network round trip: keep it off the event loop
+    if admission.alias:
+        await asyncio.to_thread(admission.check_rate, name)
+    else:
+        admission.check_rate(name)
+
+
+def _rejected_event(rejected):
+    return json.dumps({'type': 'error', 'error': rejected.error, 'retry_after': rejected.retry_after})
+
+
+def _prediction_event(probs, window, end_seconds, version):
+    classes = settings.CRY_CLASSES
+    idx = int(np.argmax(probs))
+    confidence = float(probs[idx])
+    return {
+        'type': 'prediction',
+        'start': round(max(0.0, end_seconds - window.window_seconds), 3),
+        'end': round(end_seconds, 3),
+        'label': classes[idx],
+        'confidence': round(confidence, 4),
+        'is_crying': confidence > settings.CRY_CONFIDENCE_THRESHOLD,
+        'probabilities': {cls: round(float(p), 4) for cls, p in zip(classes, probs)},
+        'model_version': version.name if version is not None else None,
+        'windows_skipped': window.windows_skipped,
+    }
+
+
+async def stream_application(scope, receive, send):
+    """
+    ASGI app for STREAM_PATH.
+    """
+    global _active_connections
+    from .model_loader import predict_fast, select_version
+
+    config = settings.STREAMING
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    name = _key_name(scope, params)
+    if name is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_POLICY_VIOLATION})
+        return
+
+    encoding = params.get('encoding', ['pcm_s16le'])[0]
+    try:
+        dtype, scale = ENCODINGS[encoding]
+        input_rate = int(params.get('sample_rate', [settings.AUDIO_CONFIG['SAMPLE_RATE']])[0])
+        if not 4000 <= input_rate <= 192000:
+            raise ValueError(input_rate)
+    except (KeyError, ValueError):
+        await send({'type': 'websocket.close', 'code': CLOSE_BAD_REQUEST})
+        return
+
+    if _active_connections >= config['MAX_CONNECTIONS']:
+        await send({'type': 'websocket.close', 'code': CLOSE_TRY_AGAIN_LATER})
+        return
+
+    admission = get_admission()
+    try:
+        await _check_rate(admission, name)
+    except AdmissionRejected:
+        await send({'type': 'websocket.close', 'code': CLOSE_RATE_LIMITED})
+        return
+
+    _active_connections += 1
+    try:
+        await send({'type': 'websocket.accept'})
+        window = StreamingWindow(get_feature_extractor(), config['STRIDE_SECONDS'], input_rate)
+        max_chunk_bytes = int(config['MAX_CHUNK_SECONDS'] * input_rate) * dtype.itemsize
+        n_mfcc, max_len = settings.AUDIO_CONFIG['N_MFCC'], settings.AUDIO_CONFIG['MAX_PAD_LEN']
+        # One model version per connection, so a stream's scores stay comparable
+        version = await asyncio.to_thread(select_version)
+        leftover = b''
+
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            data = message.get('bytes')
+            if data is None:
+                # Text frames are not part of the protocol; report and keep going
+                await send({'type': 'websocket.send', 'text': json.dumps(
+                    {'type': 'error', 'error': 'Send audio as binary PCM frames'})})
+                continue
+            if len(data) > max_chunk_bytes:
+                await send({'type': 'websocket.close', 'code': CLOSE_MESSAGE_TOO_BIG})
+                break
+
+            # Carry a partial sample over to the next chunk
+            data = leftover + data
+            usable = len(data) - len(data) % dtype.itemsize
+            leftover = data[usable:]
+            samples = np.frombuffer(data, dtype=dtype, count=usable // dtype.itemsize).astype(np.float32)
+            if scale != 1.0:
+                samples *= np.float32(scale)
+
+            features, end_seconds = window.push(samples)
+            if features is None:
+                continue
+
+            # Inference is sync (TF / batching engine); keep the event loop free.
+            # Awaiting here also applies backpressure to the client.
+            try:
+                await _check_rate(admission, name)
+                with admission.inference_slot(name):
+                    probs = await asyncio.to_thread(predict_fast, features.reshape(1, n_mfcc, max_len, 1), version)
+            except AdmissionRejected as e:
+                await send({'type': 'websocket.send', 'text': _rejected_event(e)})
+                continue
+            except Exception as e:
+                logger.error(f"Streaming inference failed: {e}")
+                await send({'type': 'websocket.send', 'text': json.dumps(
+                    {'type': 'error', 'error': 'Inference unavailable'})})
+                continue
+            await send({'type': 'websocket.send', 'text': json.dumps(_prediction_event(probs, window, end_seconds, version))})
+    finally:
+        _active_connections -= 1
@@ -0,0 +1,92 @@
+"""
+Shared fixtures: synthetic WAV clips and a fake model version, so view
+and pipeline tests run without TensorFlow or a trained model.
+"""
+
+import io
+import numpy as np
+from django.conf import settings
+
+from crydetector import admission, model_loader, prediction_cache
+from crydetector.model_loader import ModelVersion
+
+SR = 22050
+
+# Prediction endpoints without the per-process singletons that would
+# outlive a test (cache, audit writer thread, rate limits)
+ISOLATED = {
+    'PREDICTION_CACHE': {**settings.PREDICTION_CACHE, 'ENABLED': False},
+    'AUDIT_LOG': {**settings.AUDIT_LOG, 'ENABLED': False},
+    'RATE_LIMIT': {**settings.RATE_LIMIT, 'ENABLED': False, 'MAX_IN_FLIGHT': 0},
+    'MODEL_REGISTRY': {**settings.MODEL_REGISTRY, 'ENABLED': False},
+}
+
+
+def cry(seconds, sample_rate=SR, seed=0):
+    """
+    A crying-like waveform: a wobbling harmonic tone over light noise,
+    which passes the pre-gate.
+    """
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    f0 = 450 + 60 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    y = sum(0.3 / k * np.sin(k * phase) for k in (1, 2, 3))
+    y += 0.01 * np.random.default_rng(seed).standard_normal(t.shape)
+    return y.astype(np.float32)
+
+
+def wav_bytes(y, sample_rate=SR, subtype='PCM_16'):
+    import soundfile as sf
+
+    buf = io.BytesIO()
+    sf.write(buf, y, sample_rate, format='WAV', subtype=subtype)
+    return buf.getvalue()
+
+
+class FakeBackend:
+    """
+    Inference backend returning fixed probabilities (one row per input
+    row) and recording the batch size of every call.
+    """
+    name = 'fake'
+
+    def __init__(self, label='hungry', confidence=0.9):
+        classes = settings.CRY_CLASSES
+        rest = (1.0 - confidence) / (len(classes) - 1)
+        self.probs = np.array([confidence if c == label else rest for c in classes], dtype=np.float32)
+        self.calls = []
+
+    def predict(self, features):
+        self.calls.append(features.shape[0])
+        return np.tile(self.probs, (features.shape[0], 1))
+
+    def embed(self, features):
+        return np.ones((features.shape[0], 8), dtype=np.float32), self.predict(features)
+
+
+def install_model(testcase, backend=None, name='fake'):
+    """
+    Serve `backend` as the single configured model for the rest of the test.
+    """
+    version = ModelVersion(name, '', f'{name}:1:1', backend or FakeBackend())
+
+    def restore():
+        version.retire()
+        model_loader._static = None
+
+    model_loader._static = version
+    testcase.addCleanup(restore)
+    return version
+
+
+def reset_singletons(testcase):
+    """
+    Rebuild the admission and prediction-cache singletons from the test's
+    settings, and again after it.
+    """
+    def reset():
+        admission._admission = None
+        prediction_cache._cache = None
+
+    reset()
+    testcase.addCleanup(reset)
@@ -0,0 +1,253 @@
+import math
+import threading
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from crydetector import admission
+from crydetector.admission import Admission, AdmissionRejected, TokenBucket
+
+
+class Clock:
+    """
+    Stand-in for time.monotonic / time.time that only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _keys(**limits):
+    """
+    name=(rate, burst) -> settings.API_KEYS entries with key 'k-<name>'.
+    """
+    return {name: {'KEY': f'k-{name}', 'RATE': rate, 'BURST': burst} for name, (rate, burst) in limits.items()}
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('crydetector.admission.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        self.assertEqual([bucket.take() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.take(), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(bucket.take(), 0.0)
+        # Idle time never fills the bucket past the burst
+        self.clock.now += 60
+        self.assertEqual(bucket.take(3), 0.0)
+        self.assertAlmostEqual(bucket.take(), 0.5)
+
+    def test_rejected_take_costs_nothing(self):
+        bucket = TokenBucket(rate=1.0, burst=4)
+        bucket.take(3)
+        self.assertAlmostEqual(bucket.take(2), 1.0)
+        self.assertEqual(bucket.take(1), 0.0)
+
+    def test_cost_above_burst_never_fits(self):
+        bucket = TokenBucket(rate=1.0, burst=4)
+        self.assertEqual(bucket.take(5), math.inf)
+        self.assertEqual(bucket.take(4), 0.0)
+
+
+class AdmissionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('crydetector.admission.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make(self, **kwargs):
+        keys = _keys(tiny=(1.0, 2), free=(0, None), default=(None, None))
+        return Admission(keys, rate=10.0, burst=5, **kwargs)
+
+    def test_authenticate(self):
+        a = self.make()
+        self.assertEqual(a.authenticate('k-tiny'), 'tiny')
+        self.assertIsNone(a.authenticate('k-tin'))
+        self.assertIsNone(a.authenticate(''))
+
+    def test_per_key_limits_with_defaults(self):
+        a = self.make()
+        self.assertEqual(a.limits, {'tiny': (1.0, 2), 'free': (0, 5), 'default': (10.0, 5)})
+
+    def test_empty_bucket_is_429_with_retry_after(self):
+        a = self.make()
+        a.check_rate('tiny')
+        a.check_rate('tiny')
+        with self.assertRaises(AdmissionRejected) as cm:
+            a.check_rate('tiny')
+        self.assertEqual((cm.exception.status, cm.exception.retry_after), (429, 1))
+        # Keys have separate buckets
+        a.check_rate('default')
+        self.clock.now += 1.0
+        a.check_rate('tiny')
+
+    def test_cost_above_burst_is_413(self):
+        a = self.make()
+        with self.assertRaises(AdmissionRejected) as cm:
+            a.check_rate('tiny', cost=3)
+        self.assertEqual((cm.exception.status, cm.exception.retry_after), (413, None))
+        # Nothing was taken from the bucket
+        a.check_rate('tiny', cost=2)
+
+    def test_paid_part_is_not_charged_twice(self):
+        a = self.make()
+        a.check_rate('tiny')
+        a.check_rate('tiny', cost=2, paid=1)
+        with self.assertRaises(AdmissionRejected):
+            a.check_rate('tiny')
+        # Above the burst even when partly paid
+        with self.assertRaises(AdmissionRejected) as cm:
+            a.check_rate('tiny', cost=3, paid=2)
+        self.assertEqual(cm.exception.status, 413)
+
+    def test_unlimited_keys_and_disabled(self):
+        a = self.make()
+        for _ in range(100):
+            a.check_rate('free')
+        a = self.make(enabled=False)
+        for _ in range(100):
+            a.check_rate('tiny', cost=50)
+
+    def test_inference_slot_cap(self):
+        a = self.make(max_in_flight=1, retry_after=3)
+        with a.inference_slot('tiny'):
+            self.assertEqual(a.stats()['in_flight'], 1)
+            with self.assertRaises(AdmissionRejected) as cm:
+                with a.inference_slot('default'):
+                    pass
+            self.assertEqual((cm.exception.status, cm.exception.retry_after), (503, 3))
+        self.assertEqual(a.stats()['in_flight'], 0)
+        with a.inference_slot('default'):
+            pass
+
+    def test_slot_is_released_on_error(self):
+        a = self.make(max_in_flight=1)
+        with self.assertRaises(ValueError):
+            with a.inference_slot('tiny'):
+                raise ValueError
+        with a.inference_slot('tiny'):
+            pass
+
+    def test_no_cap_by_default(self):
+        a = self.make()
+        entered = threading.Barrier(4, timeout=5)
+
+        def hold():
+            with a.inference_slot('tiny'):
+                entered.wait()
+
+        threads = [threading.Thread(target=hold) for _ in range(3)]
+        for t in threads:
+            t.start()
+        entered.wait()
+        self.assertEqual(a.stats()['in_flight'], 3)
+        for t in threads:
+            t.join(5)
+
+    def test_one_outcome_per_request(self):
+        a = self.make(max_in_flight=1)
+        a.check_rate('tiny')
+        with a.inference_slot('tiny'):
+            a.check_rate('tiny')
+            with self.assertRaises(AdmissionRejected):
+                with a.inference_slot('tiny'):
+                    pass
+        with self.assertRaises(AdmissionRejected):
+            a.check_rate('tiny')
+        with self.assertRaises(AdmissionRejected):
+            a.check_rate('tiny', cost=3)
+        counters = a.stats()['keys']['tiny']
+        self.assertEqual({o: counters[o] for o in admission.OUTCOMES},
+                         {'admitted': 1, 'busy': 1, 'rate_limited': 2})
+
+
+@override_settings(CACHES={**settings.CACHES, 'ratelimit-test': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ratelimit-test'}})
+class SharedAdmissionTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['ratelimit-test'].clear()
+        self.clock = Clock()
+        patcher = mock.patch('crydetector.admission.time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_per_window_in_the_cache(self):
+        # Two processes sharing the cache share the limit
+        keys = _keys(tiny=(1.0, 2))
+        first = Admission(keys, rate=1.0, burst=2, alias='ratelimit-test')
+        second = Admission(keys, rate=1.0, burst=2, alias='ratelimit-test')
+        first.check_rate('tiny')
+        second.check_rate('tiny')
+        with self.assertRaises(AdmissionRejected) as cm:
+            first.check_rate('tiny')
+        self.assertEqual(cm.exception.status, 429)
+        # Next refill window (BURST / RATE = 2 s)
+        self.clock.now += 2.0
+        second.check_rate('tiny', cost=2)
+
+    def test_rejected_requests_do_not_use_up_the_window(self):
+        a = Admission(_keys(tiny=(1.0, 3)), rate=1.0, burst=3, alias='ratelimit-test')
+        a.check_rate('tiny')
+        for _ in range(5):
+            with self.assertRaises(AdmissionRejected):
+                a.check_rate('tiny', cost=3)
+        # The retries above took nothing: two requests still fit this window
+        a.check_rate('tiny', cost=2)
+        with self.assertRaises(AdmissionRejected):
+            a.check_rate('tiny')
+
+    def test_falls_back_to_local_bucket(self):
+        a = Admission(_keys(tiny=(1.0, 2)), rate=1.0, burst=2, alias='no-such-cache')
+        with self.assertLogs('crydetector.admission', 'WARNING'):
+            a.check_rate('tiny')
+            a.check_rate('tiny')
+            with self.assertRaises(AdmissionRejected):
+                a.check_rate('tiny')
+        self.assertEqual(a.stats()['shared_errors'], 3)
+
+
+@override_settings(
+    API_KEYS=_keys(tiny=(0.001, 2)),
+    RATE_LIMIT={**settings.RATE_LIMIT, 'ENABLED': True, 'MAX_IN_FLIGHT': 0, 'ALIAS': ''},
+)
+class AdmissionViewTests(SimpleTestCase):
+
+    def setUp(self):
+        admission._admission = None
+        self.addCleanup(setattr, admission, '_admission', None)
+
+    def test_invalid_key(self):
+        response = self.client.post('/api/v1/predict/', HTTP_X_API_KEY='wrong')
+        self.assertEqual(response.status_code, 401)
+
+    def test_throttled_key_gets_429_before_the_body_is_read(self):
+        for _ in range(2):
+            response = self.client.post('/api/v1/predict/', HTTP_X_API_KEY='k-tiny')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/predict/', HTTP_X_API_KEY='k-tiny')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_batch_above_burst_gets_413(self):
+        files = [SimpleUploadedFile(f'{i}.wav', b'RIFF', 'audio/wav') for i in range(3)]
+        response = self.client.post('/api/v1/predict/batch/', {'audio': files}, HTTP_X_API_KEY='k-tiny')
+        self.assertEqual(response.status_code, 413)
+        self.assertNotIn('Retry-After', response)
+        # Only the first file was charged before the count was known
+        response = self.client.post('/api/v1/predict/', HTTP_X_API_KEY='k-tiny')
+        self.assertEqual(response.status_code, 400)
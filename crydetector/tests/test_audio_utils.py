@@ -0,0 +1,140 @@
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from crydetector import audio_utils
+from crydetector.audio_utils import AudioGate, FeatureExtractor
+from crydetector.tests.helpers import ISOLATED, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+
+def _clip(seconds, seed=0):
+    """
+    Chirp plus noise at the model sample rate.
+    """
+    sr = settings.AUDIO_CONFIG['SAMPLE_RATE']
+    t = np.arange(int(sr * seconds)) / sr
+    rng = np.random.default_rng(seed)
+    y = 0.5 * np.sin(2 * np.pi * (300 + 400 * t) * t) + 0.05 * rng.standard_normal(t.shape)
+    return y.astype(np.float32)
+
+
+class FeatureExtractorTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = settings.AUDIO_CONFIG
+        cls.extractor = FeatureExtractor.from_config(cls.config)
+
+    def reference(self, y):
+        """
+        The librosa pipeline the model was trained on (see verify_features).
+        """
+        import librosa
+
+        cfg = self.config
+        y = self.extractor.fix_length(y)
+        mfcc = librosa.feature.mfcc(y=y, sr=cfg['SAMPLE_RATE'], n_mfcc=cfg['N_MFCC'],
+                                    n_fft=cfg['N_FFT'], hop_length=cfg['HOP_LENGTH'])
+        if mfcc.shape[1] < cfg['MAX_PAD_LEN']:
+            mfcc = np.pad(mfcc, ((0, 0), (0, cfg['MAX_PAD_LEN'] - mfcc.shape[1])))
+        mfcc = mfcc[:, :cfg['MAX_PAD_LEN']]
+        return (mfcc - np.mean(mfcc)) / (np.std(mfcc) + 1e-8)
+
+    def test_matches_librosa(self):
+        # Full window, a short clip (zero padded) and a long one (trimmed)
+        for seconds in (self.config['DURATION'], 1.5, self.config['DURATION'] + 2):
+            with self.subTest(seconds=seconds):
+                y = _clip(seconds)
+                features = self.extractor.transform(y)
+                self.assertEqual(features.shape, (self.config['N_MFCC'], self.config['MAX_PAD_LEN']))
+                self.assertEqual(features.dtype, np.float32)
+                np.testing.assert_allclose(features, self.reference(y), atol=1e-4)
+
+    def test_batch_matches_single_clips(self):
+        clips = [_clip(self.config['DURATION'], seed) for seed in range(3)]
+        batch = self.extractor.transform(np.stack(clips))
+        self.assertEqual(batch.shape, (3, self.config['N_MFCC'], self.config['MAX_PAD_LEN']))
+        for features, y in zip(batch, clips):
+            np.testing.assert_allclose(features, self.extractor.transform(y), atol=1e-5)
+
+    def test_log_mel_frames_match_transform(self):
+        # Incremental path (streaming): uncentered frames, so compare against a
+        # signal already padded the way stft(center=True) pads it
+        y = self.extractor.fix_length(_clip(self.config['DURATION']))
+        half = self.config['N_FFT'] // 2
+        log_mel = self.extractor.log_mel_frames(np.pad(y, (half, half)))
+        np.testing.assert_allclose(self.extractor.transform_log_mel(log_mel),
+                                   self.extractor.transform(y), atol=1e-4)
+
+
+class AudioGateTests(SimpleTestCase):
+
+    def setUp(self):
+        self.gate = AudioGate.from_config(settings.AUDIO_GATE)
+        self.sr = settings.AUDIO_CONFIG['SAMPLE_RATE']
+
+    def test_cry_passes(self):
+        passed, details = self.gate.check(cry(4))
+        self.assertTrue(passed)
+        self.assertNotIn('reason', details)
+        self.assertGreater(details['active_ratio'], 0.9)
+
+    def test_silence_is_rejected(self):
+        quiet = 1e-5 * np.random.default_rng(0).standard_normal(4 * self.sr).astype(np.float32)
+        for y in (np.zeros(4 * self.sr, np.float32), quiet, np.zeros(100, np.float32)):
+            passed, details = self.gate.check(y)
+            self.assertFalse(passed)
+            self.assertEqual(details['reason'], 'silence')
+
+    def test_broadband_noise_is_rejected(self):
+        noise = 0.3 * np.random.default_rng(0).standard_normal(4 * self.sr).astype(np.float32)
+        passed, details = self.gate.check(noise)
+        self.assertFalse(passed)
+        self.assertEqual(details['reason'], 'noise')
+
+    def test_a_short_burst_is_enough(self):
+        y = np.zeros(4 * self.sr, np.float32)
+        y[:self.sr // 2] = cry(0.5)
+        self.assertTrue(self.gate.check(y)[0])
+
+    def test_stats(self):
+        self.gate.check(cry(4))
+        self.gate.check(np.zeros(4 * self.sr, np.float32))
+        self.gate.record_bypass()
+        self.assertEqual(self.gate.stats(), {'checked': 2, 'passed': 1, 'rejected_silence': 1, 'rejected_noise': 0,
+                                             'bypassed': 1, 'short_circuit_rate': 0.5})
+
+
+@override_settings(**{**ISOLATED, 'PREDICTION_CACHE': {**settings.PREDICTION_CACHE, 'ENABLED': True, 'ALIAS': ''}})
+class GatedPredictViewTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.addCleanup(setattr, audio_utils, '_gate', None)
+        audio_utils._gate = None
+        self.backend = FakeBackend()
+        install_model(self, self.backend)
+        self.silence = wav_bytes(np.zeros(4 * settings.AUDIO_CONFIG['SAMPLE_RATE'], np.float32))
+
+    def predict(self, **params):
+        audio = SimpleUploadedFile('clip.wav', self.silence, 'audio/wav')
+        return self.client.post('/api/v1/predict/', {'audio': audio, **params}, HTTP_X_API_KEY=settings.API_KEY)
+
+    def test_silent_clip_skips_the_model(self):
+        body = self.predict().json()
+        self.assertTrue(body['gated'])
+        self.assertEqual(body['label'], 'not_crying')
+        self.assertIsNone(body['model_version'])
+        self.assertEqual(self.backend.calls, [])
+
+    def test_bypassed_result_is_not_cached(self):
+        bypassed = self.predict(gate='false').json()
+        self.assertFalse(bypassed['gated'])
+        self.assertEqual(bypassed['label'], 'hungry')
+        # A gated caller must still get the gate's answer, not the bypassed score
+        self.assertTrue(self.predict().json()['gated'])
+        self.assertFalse(self.predict(gate='false').json()['cached'])
+        self.assertEqual(self.backend.calls, [1, 1])
+        self.assertEqual(audio_utils.get_audio_gate().stats()['bypassed'], 2)
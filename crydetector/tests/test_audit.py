@@ -0,0 +1,157 @@
+import hashlib
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from crydetector import audit
+from crydetector.audit import BLOCK, DROP, AuditLog, get_audit_log
+from crydetector.models import PredictionAudit
+from crydetector.tests.helpers import ISOLATED, cry, install_model, reset_singletons, wav_bytes
+
+
+def _entry(label='hungry', created_at=None, **fields):
+    return {'created_at': created_at or timezone.now(), 'endpoint': 'predict', 'label': label,
+            'confidence': 0.9, 'probabilities': {label: 0.9}, 'total_ms': 10.0, **fields}
+
+
+def _without_writer(log):
+    """
+    Keep the writer thread from starting, so the test drains the queue itself.
+    """
+    log._thread = threading.current_thread()
+    return log
+
+
+class AuditQueueTests(SimpleTestCase):
+
+    def test_drop_policy_never_waits(self):
+        log = _without_writer(AuditLog(max_queue=2, batch_size=10, flush_seconds=0, policy=DROP))
+        started = time.perf_counter()
+        self.assertEqual([log.record(_entry()) for _ in range(4)], [True, True, False, False])
+        self.assertLess(time.perf_counter() - started, 0.05)
+        stats = log.stats()
+        self.assertEqual((stats['enqueued'], stats['dropped'], stats['queued']), (2, 2, 2))
+
+    def test_block_policy_waits_for_room_then_drops(self):
+        log = _without_writer(AuditLog(max_queue=1, batch_size=10, flush_seconds=0, policy=BLOCK, block_seconds=0.2))
+        log.record(_entry())
+        started = time.perf_counter()
+        self.assertFalse(log.record(_entry()))
+        self.assertGreaterEqual(time.perf_counter() - started, 0.2)
+
+        # Room made within BLOCK_SECONDS: the record is kept
+        timer = threading.Timer(0.05, log._queue.get_nowait)
+        timer.start()
+        self.addCleanup(timer.join)
+        self.assertTrue(log.record(_entry()))
+        self.assertEqual(log.stats()['dropped'], 1)
+
+    def test_batches_take_what_arrives_within_flush_seconds(self):
+        log = _without_writer(AuditLog(max_queue=10, batch_size=3, flush_seconds=0.05))
+        for _ in range(5):
+            log.record(_entry())
+        self.assertEqual(len(log._take(log._queue.get_nowait())), 3)
+        self.assertEqual(len(log._take(log._queue.get_nowait())), 2)
+
+    def test_unknown_policy(self):
+        with self.assertRaisesRegex(ValueError, "'drop' or 'block'"):
+            AuditLog(max_queue=1, batch_size=1, flush_seconds=0, policy='wait')
+
+
+class AuditWriteTests(TestCase):
+
+    def test_flush_bulk_inserts_in_batches(self):
+        log = _without_writer(AuditLog(max_queue=10, batch_size=2, flush_seconds=0))
+        for label in ('hungry', 'tired', 'burping'):
+            log.record(_entry(label))
+        log.flush()
+        self.assertEqual(sorted(PredictionAudit.objects.values_list('label', flat=True)),
+                         ['burping', 'hungry', 'tired'])
+        stats = log.stats()
+        self.assertEqual((stats['written'], stats['batches'], stats['queued']), (3, 2, 0))
+
+    def test_failed_batches_are_counted_not_raised(self):
+        log = _without_writer(AuditLog(max_queue=10, batch_size=10, flush_seconds=0))
+        log.record(_entry(no_such_field=1))
+        with self.assertLogs('crydetector.audit', 'ERROR'):
+            log.flush()
+        self.assertEqual((log.stats()['failed'], log.stats()['written']), (1, 0))
+
+    def test_prune_keeps_recent_rows(self):
+        now = timezone.now()
+        PredictionAudit.objects.bulk_create([PredictionAudit(**_entry(created_at=now - timedelta(days=days)))
+                                             for days in (1, 29, 31, 400)])
+        log = AuditLog(max_queue=1, batch_size=1, flush_seconds=0, retention_days=30)
+        log._prune()
+        self.assertEqual(PredictionAudit.objects.count(), 2)
+        # At most once per PRUNE_INTERVAL_SECONDS
+        PredictionAudit.objects.create(**_entry(created_at=now - timedelta(days=60)))
+        log._prune()
+        self.assertEqual(PredictionAudit.objects.count(), 3)
+
+    def test_audit_report(self):
+        now = timezone.now()
+        PredictionAudit.objects.bulk_create([
+            PredictionAudit(**_entry('hungry', now)),
+            PredictionAudit(**_entry('hungry', now, cached=True, total_ms=30.0)),
+            PredictionAudit(**_entry('not_crying', now, gated=True, endpoint='batch')),
+            PredictionAudit(**_entry('tired', now - timedelta(hours=30))),
+        ])
+        out = io.StringIO()
+        call_command('audit_report', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['predictions'], 3)
+        self.assertEqual([(r['label'], r['count'], r['cached']) for r in report['by_label']],
+                         [('hungry', 2, 1), ('not_crying', 1, 0)])
+        self.assertEqual(report['by_label'][0]['mean_ms'], 20.0)
+        self.assertEqual(sum(h['gated'] for h in report['by_hour']), 1)
+
+        out = io.StringIO()
+        call_command('audit_report', '--hours', '48', '--endpoint', 'predict', stdout=out)
+        self.assertIn('3 predictions since', out.getvalue())
+
+
+@override_settings(**{**ISOLATED, 'AUDIT_LOG': {**settings.AUDIT_LOG, 'ENABLED': True}})
+class AuditedPredictTests(TestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        install_model(self)
+        self.addCleanup(setattr, audit, '_audit', None)
+        audit._audit = None
+        self.log = _without_writer(get_audit_log())
+
+    def test_record_per_prediction_with_the_full_upload_hash(self):
+        data = wav_bytes(cry(10))
+        audio = SimpleUploadedFile('clip.wav', data, 'audio/wav')
+        response = self.client.post('/api/v1/predict/', {'audio': audio}, HTTP_X_API_KEY=settings.API_KEY)
+        self.assertEqual(response.status_code, 200)
+        self.log.flush()
+        record = PredictionAudit.objects.get()
+        self.assertEqual((record.endpoint, record.api_key, record.label), ('predict', 'default', 'hungry'))
+        # Only the model window was kept, but the hash covers everything sent
+        self.assertEqual(record.audio_sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(record.model_version, 'fake')
+        self.assertGreater(record.total_ms, 0)
+        self.assertIn('decode', record.timings_ms)
+
+
+class AuditWriterThreadTests(TransactionTestCase):
+
+    def test_writer_thread_inserts_without_the_request_waiting(self):
+        log = AuditLog(max_queue=10, batch_size=10, flush_seconds=0.01)
+        with mock.patch('crydetector.audit.atexit.register'):
+            log.record(_entry())
+        deadline = time.monotonic() + 5
+        while log.stats()['written'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(PredictionAudit.objects.count(), 1)
+        self.assertEqual(log._thread.name, 'audit-writer')
@@ -0,0 +1,131 @@
+import io
+import tarfile
+import zipfile
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from crydetector.audio_utils import ArchiveTooLarge, extract_archive
+from crydetector.tests.helpers import ISOLATED, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+URL = '/api/v1/predict/batch/'
+
+
+def _zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def _tar(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class ExtractArchiveTests(SimpleTestCase):
+
+    def test_unpacks_zip_and_tar(self):
+        members = {'a.wav': b'RIFF-a', 'dir/b.wav': b'RIFF-b'}
+        for data in (_zip(members), _tar(members)):
+            unpacked = extract_archive(io.BytesIO(data), max_files=10, max_bytes=1000)
+            self.assertEqual({m.name: m.read() for m in unpacked}, {'a.wav': b'RIFF-a', 'b.wav': b'RIFF-b'})
+
+    def test_limits_are_checked_before_reading(self):
+        # 4 MB of zeros deflates to a few KB: the declared size must stop it
+        bomb = _zip({'a.wav': b'\0' * (4 << 20)})
+        self.assertLess(len(bomb), 64 << 10)
+        with self.assertRaisesRegex(ArchiveTooLarge, 'too large uncompressed'):
+            extract_archive(io.BytesIO(bomb), max_files=10, max_bytes=1 << 20)
+        for data in (_zip({f'{i}.wav': b'RIFF' for i in range(4)}), _tar({f'{i}.wav': b'RIFF' for i in range(4)})):
+            with self.assertRaisesRegex(ArchiveTooLarge, 'Too many files'):
+                extract_archive(io.BytesIO(data), max_files=3, max_bytes=1000)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_member_larger_than_memory_limit(self):
+        with self.assertRaises(ValueError) as cm:
+            extract_archive(io.BytesIO(_zip({'a.wav': b'\0' * 101})), max_files=10, max_bytes=1000)
+        self.assertNotIsInstance(cm.exception, ArchiveTooLarge)
+
+    def test_unreadable_archive(self):
+        with self.assertRaisesRegex(ValueError, 'Unreadable archive'):
+            extract_archive(io.BytesIO(b'not an archive at all'), max_files=10, max_bytes=1000)
+
+
+@override_settings(**ISOLATED)
+class BatchViewTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        install_model(self, self.backend)
+        self.clip = wav_bytes(cry(4))
+
+    def post(self, **fields):
+        return self.client.post(URL, fields, HTTP_X_API_KEY=settings.API_KEY)
+
+    def test_per_file_results_in_input_order(self):
+        files = [
+            SimpleUploadedFile('good.wav', self.clip, 'audio/wav'),
+            SimpleUploadedFile('notes.mp3', b'ID3', 'audio/mpeg'),
+            SimpleUploadedFile('broken.wav', b'RIFF garbage', 'audio/wav'),
+            SimpleUploadedFile('silent.wav', wav_bytes(np.zeros(4 * 22050, np.float32)), 'audio/wav'),
+            SimpleUploadedFile('again.wav', self.clip, 'audio/wav'),
+        ]
+        response = self.post(audio=files)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 5)
+        results = body['results']
+        self.assertEqual([r['filename'] for r in results], [f.name for f in files])
+        self.assertEqual([r['status'] for r in results], [200, 415, 422, 200, 200])
+        self.assertEqual(results[0]['label'], 'hungry')
+        self.assertEqual(results[0]['model_version'], 'fake')
+        self.assertTrue(results[3]['gated'])
+        # Both clean clips in one forward pass; gated and failed ones never reach the model
+        self.assertEqual(self.backend.calls, [2])
+
+    def test_archive_members_are_scored(self):
+        archive = SimpleUploadedFile('clips.zip', _zip({'a.wav': self.clip, 'b.wav': self.clip}))
+        response = self.post(archive=archive, audio=SimpleUploadedFile('c.wav', self.clip, 'audio/wav'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(r['filename'], r['status']) for r in response.json()['results']],
+                         [('c.wav', 200), ('a.wav', 200), ('b.wav', 200)])
+
+    def test_archive_with_too_many_members(self):
+        archive = SimpleUploadedFile('clips.zip', _zip({f'{i}.wav': self.clip for i in range(4)}))
+        with override_settings(BATCH_PREDICT={**settings.BATCH_PREDICT, 'MAX_FILES': 3}):
+            response = self.post(archive=archive)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('Too many files', response.json()['error'])
+        self.assertEqual(self.backend.calls, [])
+
+    def test_archive_too_large_uncompressed(self):
+        archive = SimpleUploadedFile('clips.zip', _zip({'a.wav': self.clip, 'b.wav': self.clip}))
+        limit = len(self.clip) + 1
+        with override_settings(BATCH_PREDICT={**settings.BATCH_PREDICT, 'MAX_ARCHIVE_BYTES': limit}):
+            response = self.post(archive=archive)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('too large', response.json()['error'])
+        self.assertEqual(self.backend.calls, [])
+
+    def test_unreadable_archive(self):
+        response = self.post(archive=SimpleUploadedFile('clips.zip', b'PK not really'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_parts(self):
+        files = [SimpleUploadedFile(f'{i}.wav', self.clip, 'audio/wav') for i in range(3)]
+        with override_settings(BATCH_PREDICT={**settings.BATCH_PREDICT, 'MAX_FILES': 2},
+                               DATA_UPLOAD_MAX_NUMBER_FILES=10):
+            response = self.post(audio=files)
+        self.assertEqual(response.status_code, 413)
+
+    def test_no_files(self):
+        self.assertEqual(self.post().status_code, 400)
@@ -0,0 +1,183 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from crydetector import embedding_index
+from crydetector.embedding_index import (
+    EmbeddingIndex, EmbeddingIndexError, _normalize, build_index, find_similar, get_embedding_index, write_index,
+)
+from crydetector.model_loader import ModelVersion, _file_version
+from crydetector.tests.helpers import ISOLATED, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+
+def _entries(n):
+    return [{'path': f'{i}.wav', 'label': 'hungry' if i % 2 else '', 'stamp': [0, 0]} for i in range(n)]
+
+
+def _vectors(n, dim=32, seed=0):
+    return _normalize(np.random.default_rng(seed).standard_normal((n, dim))).astype(np.float16)
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.addCleanup(setattr, embedding_index, '_index', None)
+        embedding_index._index = None
+
+    def test_exact_search(self):
+        vectors = _vectors(50)
+        write_index(self.dir, 'm', _entries(50), vectors)
+        index = EmbeddingIndex(self.dir)
+        query = vectors[7].astype(np.float32)
+        scores = vectors.astype(np.float32) @ query
+        expected = list(np.argsort(-scores)[:5])
+        self.assertEqual([row for row, _ in index.search(query * 3, 5)], expected)
+        self.assertAlmostEqual(index.search(query, 1)[0][1], 1.0, places=2)
+        self.assertEqual(len(index.search(query, 100)), 50)
+
+    def test_sign_code_prefilter_finds_near_neighbours(self):
+        vectors = _vectors(2000)
+        write_index(self.dir, 'm', _entries(2000), vectors)
+        with override_settings(EMBEDDING_INDEX={**settings.EMBEDDING_INDEX, 'CANDIDATES': 50}):
+            index = EmbeddingIndex(self.dir)
+        rng = np.random.default_rng(1)
+        for row in (3, 500, 1999):
+            query = vectors[row].astype(np.float32) + 0.05 * rng.standard_normal(32).astype(np.float32)
+            self.assertEqual(index.search(query, 1)[0][0], row)
+
+    def test_rebuild_is_picked_up_and_old_files_removed(self):
+        write_index(self.dir, 'm', _entries(3), _vectors(3))
+        with override_settings(EMBEDDING_INDEX={**settings.EMBEDDING_INDEX, 'DIR': self.dir}):
+            first = get_embedding_index()
+            self.assertIs(get_embedding_index(), first)
+            write_index(self.dir, 'm', _entries(4), _vectors(4))
+            # Make sure index.json's mtime moves even on coarse clocks
+            stat = os.stat(os.path.join(self.dir, 'index.json'))
+            os.utime(os.path.join(self.dir, 'index.json'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(len(get_embedding_index()), 4)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['codes-2.npy', 'index.json', 'projection-2.npz', 'vectors-2.npy'])
+
+    def test_missing_index_and_other_model(self):
+        with override_settings(EMBEDDING_INDEX={**settings.EMBEDDING_INDEX, 'DIR': self.dir}):
+            with self.assertRaisesRegex(EmbeddingIndexError, 'run manage.py build_embedding_index'):
+                get_embedding_index()
+            write_index(self.dir, 'model.keras:1:1', _entries(3), _vectors(3))
+            version = ModelVersion('v', '', 'model.keras:2:2', FakeBackend())
+            with self.assertRaisesRegex(EmbeddingIndexError, 'built with model.keras:1:1'):
+                find_similar(np.ones(32), version, 2)
+            version = ModelVersion('v', '', 'model.keras:1:1', FakeBackend())
+            similar = find_similar(np.ones(32), version, 2)
+        self.assertEqual([set(s) for s in similar], [{'path', 'label', 'similarity'}] * 2)
+
+
+class FakeFeatureStore:
+    """
+    FeatureStore stand-in: zero MFCCs, row -1 for files named broken*.
+    """
+
+    def __init__(self):
+        self.opened = []
+
+    def open(self, paths):
+        self.opened += [os.path.basename(p) for p in paths]
+        rows = np.array([-1 if os.path.basename(p).startswith('broken') else i for i, p in enumerate(paths)])
+        return np.zeros((len(paths), 40, 173), np.float32), rows
+
+
+class BuildIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.data = os.path.join(self.dir, 'data')
+        self.index = os.path.join(self.dir, 'index')
+        for rel in ('hungry/a.wav', 'tired/b.wav', 'c.wav', 'hungry/broken.wav'):
+            self.touch(rel)
+        self.model = os.path.join(self.dir, 'model.keras')
+        with open(self.model, 'wb') as fh:
+            fh.write(b'model')
+        self.backend = FakeBackend()
+        patcher = mock.patch('crydetector.model_loader.load_version',
+                             side_effect=lambda path: ModelVersion('m', path, _file_version(path), self.backend))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def touch(self, rel, content=b'RIFF'):
+        path = os.path.join(self.data, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+
+    def build(self, **kwargs):
+        store = FakeFeatureStore()
+        return build_index(self.index, self.data, self.model, store, **kwargs), store.opened
+
+    def test_only_new_or_changed_clips_are_embedded(self):
+        stats, opened = self.build()
+        self.assertEqual((stats['clips'], stats['embedded'], stats['failed']), (3, 3, 1))
+        self.assertEqual(len(opened), 4)
+        index = EmbeddingIndex(self.index)
+        self.assertEqual(index.paths, ['c.wav', 'hungry/a.wav', 'tired/b.wav'])
+        self.assertEqual(index.labels, [None, 'hungry', 'tired'])
+
+        self.touch('tired/b.wav', b'RIFF changed')
+        self.touch('hungry/d.wav')
+        os.remove(os.path.join(self.data, 'c.wav'))
+        stats, opened = self.build()
+        self.assertEqual((stats['clips'], stats['embedded'], stats['reused'], stats['removed']), (3, 2, 1, 1))
+        self.assertEqual(sorted(opened), ['b.wav', 'broken.wav', 'd.wav'])
+
+        stats, _ = self.build(rebuild=True)
+        self.assertEqual((stats['embedded'], stats['reused']), (3, 0))
+
+    def test_new_model_re_embeds_everything(self):
+        self.build()
+        with open(self.model, 'wb') as fh:
+            fh.write(b'retrained model')
+        stats, _ = self.build()
+        self.assertEqual((stats['embedded'], stats['reused']), (3, 0))
+        self.assertEqual(EmbeddingIndex(self.index).model, _file_version(self.model))
+
+
+@override_settings(**ISOLATED)
+class SimilarViewTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        self.version = install_model(self, self.backend)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.addCleanup(setattr, embedding_index, '_index', None)
+        embedding_index._index = None
+        vectors = _vectors(5, dim=8)
+        # FakeBackend embeds every clip as ones(8)
+        vectors[3] = _normalize(np.ones(8))
+        write_index(self.dir, self.version.fingerprint, _entries(5), vectors)
+
+    def predict(self, **params):
+        audio = SimpleUploadedFile('clip.wav', wav_bytes(cry(4)), 'audio/wav')
+        with override_settings(EMBEDDING_INDEX={**settings.EMBEDDING_INDEX, 'DIR': self.dir}):
+            return self.client.post('/api/v1/predict/', {'audio': audio, **params}, HTTP_X_API_KEY=settings.API_KEY)
+
+    def test_similar_clips(self):
+        body = self.predict(similar='2').json()
+        self.assertEqual(body['label'], 'hungry')
+        self.assertEqual(len(body['similar']), 2)
+        best = body['similar'][0]
+        self.assertEqual((best['path'], best['label']), ('3.wav', 'hungry'))
+        self.assertAlmostEqual(best['similarity'], 1.0, places=3)
+
+    def test_bad_or_unavailable(self):
+        self.assertEqual(self.predict(similar='many').status_code, 400)
+        shutil.rmtree(self.dir)
+        self.assertEqual(self.predict(similar='2').status_code, 503)
+        self.assertNotIn('similar', self.predict().json())
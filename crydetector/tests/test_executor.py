@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+
+from crydetector import views
+from crydetector.executor import BoundedExecutor, ExecutorFull
+from crydetector.tests.helpers import ISOLATED, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+
+class BoundedExecutorTests(SimpleTestCase):
+
+    async def test_runs_off_the_event_loop(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0)
+        self.addCleanup(executor._pool.shutdown)
+        self.assertNotEqual(await executor.run(threading.get_ident), threading.get_ident())
+        self.assertEqual(await executor.run(divmod, 7, 2), (3, 1))
+
+    async def test_rejects_past_capacity_until_a_call_finishes(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        self.addCleanup(executor._pool.shutdown)
+        release = threading.Event()
+        admitted = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with self.assertRaises(ExecutorFull):
+            await executor.run(int)
+        release.set()
+        self.assertEqual(await asyncio.gather(*admitted), [True, True])
+        self.assertEqual(await executor.run(int), 0)
+        stats = executor.stats()
+        self.assertEqual((stats['submitted'], stats['rejected'], stats['max_in_flight'], stats['in_flight']),
+                         (3, 1, 2, 0))
+
+    async def test_cancelled_calls_hold_their_slot(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0)
+        self.addCleanup(executor._pool.shutdown)
+        release = threading.Event()
+        waiting = asyncio.ensure_future(executor.run(release.wait, 5))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(ExecutorFull):
+            await executor.run(int)
+        release.set()
+
+
+@override_settings(**ISOLATED)
+class AsyncPredictViewTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        install_model(self, self.backend)
+        self.executor = BoundedExecutor(max_workers=1, max_queue=0)
+        self.addCleanup(self.executor._pool.shutdown)
+        patcher = mock.patch.object(views, 'get_executor', return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, name='clip.wav'):
+        audio = SimpleUploadedFile(name, wav_bytes(cry(4)), 'audio/wav')
+        return AsyncRequestFactory().post('/api/v1/predict/', {'audio': audio},
+                                        headers={'X-API-Key': settings.API_KEY})
+
+    async def test_predicts_like_the_sync_view(self):
+        response = await views.api_v1_predict_async(self.request())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['label'], 'hungry')
+        self.assertEqual(self.backend.calls, [1])
+
+    async def test_full_executor_answers_503(self):
+        release = threading.Event()
+        busy = asyncio.ensure_future(self.executor.run(release.wait, 5))
+        await asyncio.sleep(0)
+        try:
+            response = await views.api_v1_predict_async(self.request())
+        finally:
+            release.set()
+            await busy
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ASYNC_VIEWS['RETRY_AFTER_SECONDS']))
+        self.assertEqual(self.backend.calls, [])
+
+    async def test_rejected_before_the_executor(self):
+        response = await views.api_v1_predict_async(self.request(name='clip.mp3'))
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.executor.stats()['submitted'], 0)
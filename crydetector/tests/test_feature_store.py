@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+
+from crydetector.audio_utils import FeatureExtractor, load_audio
+from crydetector.feature_store import FeatureStore
+from crydetector.tests.helpers import SR, cry, wav_bytes
+
+CONFIG = dict(sample_rate=SR, duration=4, n_mfcc=40, n_fft=2048, hop_length=512, max_pad_len=173)
+
+
+class FeatureStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmp, f'{i}.wav')
+            with open(path, 'wb') as fh:
+                fh.write(wav_bytes(cry(4, seed=i) * (i + 1) / 4))
+            self.paths.append(path)
+        self.broken = os.path.join(self.tmp, 'broken.wav')
+        with open(self.broken, 'wb') as fh:
+            fh.write(b'RIFF not audio')
+        self.root = os.path.join(self.tmp, 'cache')
+
+    def expected(self, path):
+        with open(path, 'rb') as fh:
+            return FeatureExtractor(**CONFIG).transform(load_audio(fh.read(), SR))
+
+    def test_computes_and_reuses(self):
+        store = FeatureStore(self.root, CONFIG, workers=2)
+        X, ok = store.load(self.paths + [self.broken])
+        self.assertEqual(ok.tolist(), [True, True, True, False])
+        for features, path in zip(X, self.paths):
+            np.testing.assert_allclose(features, self.expected(path), atol=1e-6)
+
+        # A second store with the same config reads everything from disk
+        with self.assertLogs('crydetector.feature_store', 'INFO') as logs:
+            features, rows = FeatureStore(self.root, CONFIG, workers=2).open(self.paths[::-1])
+        self.assertIn('all 3 entries cached', '\n'.join(logs.output))
+        np.testing.assert_array_equal(features[rows], X[:3][::-1])
+
+    def test_recomputes_changed_files_only(self):
+        store = FeatureStore(self.root, CONFIG, workers=1)
+        store.open(self.paths)
+        with open(self.paths[1], 'wb') as fh:
+            fh.write(wav_bytes(cry(2, seed=9)))
+        os.utime(self.paths[1], ns=(1, 1))
+        with self.assertLogs('crydetector.feature_store', 'INFO') as logs:
+            X, ok = store.load(self.paths)
+        self.assertIn('1 computed, 0 failed, 2 reused', '\n'.join(logs.output))
+        self.assertTrue(ok.all())
+        np.testing.assert_allclose(X[1], self.expected(self.paths[1]), atol=1e-6)
+        # Old generations are removed
+        self.assertEqual(len([f for f in os.listdir(self.root) if f.endswith('.npy')]), 1)
+
+    def test_configs_are_stored_separately(self):
+        FeatureStore(self.root, CONFIG, workers=1).open(self.paths[:1])
+        other = FeatureStore(self.root, {**CONFIG, 'n_mfcc': 20}, workers=1)
+        X, ok = other.load(self.paths[:1])
+        self.assertEqual(X.shape, (1, 20, 173))
+        self.assertEqual(len([f for f in os.listdir(self.root) if f.startswith('index-')]), 2)
@@ -0,0 +1,98 @@
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from crydetector.inference_backends import load_backend
+
+
+def _installed(*modules):
+    return all(importlib.util.find_spec(m) is not None for m in modules)
+
+
+HAS_RUNTIMES = (_installed('tensorflow', 'tf2onnx', 'onnxruntime')
+                and (_installed('ai_edge_litert') or _installed('tflite_runtime')))
+
+
+@unittest.skipUnless(HAS_RUNTIMES, 'needs tensorflow, tf2onnx, onnxruntime and a TFLite runtime')
+class BackendParityTests(SimpleTestCase):
+    """
+    A small CNN with the served input shape, exported with export_model,
+    must score the same under every backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import tensorflow as tf
+
+        cfg = settings.AUDIO_CONFIG
+        cls.tmp = tempfile.mkdtemp()
+        cls.paths = {
+            'keras': os.path.join(cls.tmp, 'model.keras'),
+            'tflite': os.path.join(cls.tmp, 'model.tflite'),
+            'onnx': os.path.join(cls.tmp, 'model.onnx'),
+        }
+        tf.keras.utils.set_random_seed(0)
+        model = tf.keras.Sequential([
+            tf.keras.layers.Input((cfg['N_MFCC'], cfg['MAX_PAD_LEN'], 1)),
+            tf.keras.layers.Conv2D(8, 3, activation='relu'),
+            tf.keras.layers.MaxPooling2D(2),
+            tf.keras.layers.SeparableConv2D(8, 3, activation='relu'),
+            tf.keras.layers.GlobalAveragePooling2D(),
+            tf.keras.layers.Dense(16, activation='relu'),
+            tf.keras.layers.Dense(len(settings.CRY_CLASSES), activation='softmax'),
+        ])
+        model.save(cls.paths['keras'])
+        call_command('export_model', model=cls.paths['keras'], format='all',
+                     tflite_out=cls.paths['tflite'], onnx_out=cls.paths['onnx'],
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        rng = np.random.default_rng(0)
+        cls.features = rng.standard_normal((3, cfg['N_MFCC'], cfg['MAX_PAD_LEN'], 1)).astype(np.float32)
+        cls.reference = load_backend('keras', cls.paths['keras']).predict(cls.features)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def assert_matches_reference(self, backend):
+        # Batch sizes 1 and 3 and back to 1: TFLite resizes its input tensor
+        for rows in (1, 3, 1):
+            probs = backend.predict(self.features[:rows])
+            self.assertEqual(probs.shape, (rows, len(settings.CRY_CLASSES)))
+            np.testing.assert_allclose(probs, self.reference[:rows], atol=1e-5)
+
+    def test_exported_backends_match_keras(self):
+        for name in ('tflite', 'onnx'):
+            for fork_safe in (False, True):
+                with self.subTest(backend=name, fork_safe=fork_safe):
+                    self.assert_matches_reference(load_backend(name, self.paths[name], fork_safe=fork_safe))
+
+    def test_traced_keras_matches_eager(self):
+        for runtime in ({'TF_FUNCTION': True}, {'XLA_JIT': True}):
+            with self.subTest(runtime=runtime):
+                self.assert_matches_reference(load_backend('keras', self.paths['keras'], runtime=runtime))
+
+    def test_embed_returns_classifier_input(self):
+        backend = load_backend('keras', self.paths['keras'])
+        embeddings, probs = backend.embed(self.features)
+        self.assertEqual(embeddings.shape, (3, 16))
+        np.testing.assert_allclose(probs, self.reference, atol=1e-5)
+
+
+class LoadBackendTests(SimpleTestCase):
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            load_backend('torch', __file__)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            load_backend('onnx', os.path.join(tempfile.gettempdir(), 'no-such-model.onnx'))
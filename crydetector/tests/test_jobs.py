@@ -0,0 +1,107 @@
+import hashlib
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from crydetector.jobs import claim_batch, enqueue, fail_batch, process_batch, requeue_stale
+from crydetector.models import PredictionJob
+from crydetector.tests.helpers import ISOLATED, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+KEYS = {
+    'app': {'KEY': 'app-key', 'RATE': 0.0, 'BURST': None},
+    'device': {'KEY': 'device-key', 'RATE': 0.0, 'BURST': None},
+}
+
+
+@override_settings(**ISOLATED)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        install_model(self, self.backend)
+        self.clip = wav_bytes(cry(4))
+
+    def test_claims_oldest_first_and_never_twice(self):
+        jobs = [enqueue(self.clip, f'{i}.wav') for i in range(5)]
+        first = claim_batch('w1', 3)
+        second = claim_batch('w2', 3)
+        self.assertEqual([j.id for j in first], [j.id for j in jobs[:3]])
+        self.assertEqual([j.id for j in second], [j.id for j in jobs[3:]])
+        self.assertEqual(claim_batch('w3', 3), [])
+        self.assertEqual({j.worker for j in first}, {'w1'})
+        self.assertTrue(all(j.status == PredictionJob.RUNNING and j.started_at for j in first + second))
+        self.assertEqual(jobs[4].queue_depth_at_submit, 4)
+
+    def test_process_batch_scores_in_one_pass(self):
+        silent = wav_bytes(np.zeros(4 * 22050, np.float32))
+        for name, data in (('a.wav', self.clip), ('silent.wav', silent), ('broken.wav', b'RIFF garbage'),
+                           ('b.wav', self.clip)):
+            enqueue(data, name)
+        process_batch(claim_batch('w1', 10))
+        jobs = {j.filename: j for j in PredictionJob.objects.all()}
+        self.assertEqual(self.backend.calls, [2])
+        self.assertEqual(jobs['a.wav'].status, PredictionJob.DONE)
+        self.assertEqual(jobs['a.wav'].result['label'], 'hungry')
+        self.assertTrue(jobs['silent.wav'].result['gated'])
+        self.assertEqual((jobs['broken.wav'].status, jobs['broken.wav'].error_status), (PredictionJob.FAILED, 422))
+        # Uploads are dropped once a job has finished
+        self.assertTrue(all(bytes(j.audio) == b'' and j.attempts == 1 for j in jobs.values()))
+
+    def test_fail_batch(self):
+        enqueue(self.clip, 'a.wav')
+        fail_batch(claim_batch('w1', 10), 'Internal server error')
+        job = PredictionJob.objects.get()
+        self.assertEqual((job.status, job.error_status, bytes(job.audio)), (PredictionJob.FAILED, 500, b''))
+
+    def test_stale_jobs_are_requeued(self):
+        enqueue(self.clip, 'a.wav')
+        enqueue(self.clip, 'b.wav')
+        stale, fresh = claim_batch('w1', 2)
+        PredictionJob.objects.filter(id=stale.id).update(started_at=timezone.now() - timedelta(seconds=600))
+        self.assertEqual(requeue_stale(300), 1)
+        [again] = claim_batch('w2', 10)
+        self.assertEqual((again.id, again.worker), (stale.id, 'w2'))
+        self.assertEqual(PredictionJob.objects.get(id=fresh.id).worker, 'w1')
+
+
+@override_settings(**ISOLATED, API_KEYS=KEYS)
+class JobViewTests(TestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        install_model(self)
+        self.clip = wav_bytes(cry(4))
+
+    def submit(self, key='app-key', name='clip.wav', **fields):
+        audio = SimpleUploadedFile(name, self.clip, 'audio/wav')
+        return self.client.post('/api/v1/jobs/', {'audio': audio, **fields}, HTTP_X_API_KEY=key)
+
+    def test_submit_then_poll(self):
+        response = self.submit(gate='false')
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        job = PredictionJob.objects.get(id=body['job_id'])
+        self.assertEqual((job.api_key, job.use_gate, body['status']), ('app', False, 'queued'))
+        self.assertEqual(job.audio_sha256, hashlib.sha256(self.clip).hexdigest())
+        self.assertEqual(self.client.get(body['status_url'], HTTP_X_API_KEY='app-key').json()['status'], 'queued')
+
+        process_batch(claim_batch('w1', 10))
+        polled = self.client.get(body['status_url'], HTTP_X_API_KEY='app-key').json()
+        self.assertEqual(polled['status'], 'done')
+        self.assertEqual(polled['result']['label'], 'hungry')
+        self.assertIsNotNone(polled['timings']['processing_ms'])
+
+    def test_only_the_submitting_key_can_poll(self):
+        url = self.submit().json()['status_url']
+        self.assertEqual(self.client.get(url, HTTP_X_API_KEY='device-key').status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_rejected_submissions(self):
+        self.assertEqual(self.submit(name='clip.mp3').status_code, 415)
+        self.assertEqual(self.submit(key='wrong').status_code, 401)
+        self.assertEqual(self.client.post('/api/v1/jobs/', HTTP_X_API_KEY='app-key').status_code, 400)
+        self.assertFalse(PredictionJob.objects.exists())
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from prometheus_client import REGISTRY
+
+from crydetector import metrics
+from crydetector.tests.helpers import ISOLATED, cry, install_model, reset_singletons, wav_bytes
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class StageTimerTests(SimpleTestCase):
+
+    def test_stage_times_go_to_the_histogram_and_the_collector(self):
+        before = _value('crybaby_stage_seconds_count', stage='features')
+        with metrics.collect_stages() as timings:
+            with metrics.stage_timer('features'):
+                pass
+            metrics.observe_stage('features', 0.002)
+        # Outside the block nothing is collected any more
+        metrics.observe_stage('features', 1.0)
+        self.assertEqual(list(timings), ['features'])
+        self.assertGreaterEqual(timings['features'], 2.0)
+        self.assertLess(timings['features'], 100.0)
+        self.assertEqual(_value('crybaby_stage_seconds_count', stage='features') - before, 3)
+
+    def test_traffic_of_dropped_versions_goes_to_zero(self):
+        metrics.set_traffic({'v1': 90, 'v2': 10})
+        metrics.set_traffic({'v2': 100})
+        self.assertEqual(_value('crybaby_model_traffic_percent', version='v1'), 0)
+        self.assertEqual(_value('crybaby_model_traffic_percent', version='v2'), 100)
+
+
+@override_settings(**ISOLATED)
+class MetricsEndpointTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        install_model(self)
+
+    def test_predict_request_is_measured(self):
+        stages = {stage: _value('crybaby_stage_seconds_count', stage=stage)
+                  for stage in ('decode', 'features', 'inference')}
+        requests = _value('crybaby_request_seconds_count', endpoint='api_v1_predict')
+        predictions = _value('crybaby_predictions_total', label='hungry', version='fake')
+        audio = SimpleUploadedFile('clip.wav', wav_bytes(cry(4)), 'audio/wav')
+        response = self.client.post('/api/v1/predict/', {'audio': audio}, HTTP_X_API_KEY=settings.API_KEY)
+        self.assertEqual(response.status_code, 200)
+        for stage, count in stages.items():
+            self.assertEqual(_value('crybaby_stage_seconds_count', stage=stage) - count, 1, stage)
+        self.assertEqual(_value('crybaby_request_seconds_count', endpoint='api_v1_predict') - requests, 1)
+        self.assertEqual(_value('crybaby_predictions_total', label='hungry', version='fake') - predictions, 1)
+
+    def test_error_responses_are_counted(self):
+        errors = _value('crybaby_errors_total', endpoint='api_v1_predict', status='401')
+        self.client.post('/api/v1/predict/')
+        self.assertEqual(_value('crybaby_errors_total', endpoint='api_v1_predict', status='401') - errors, 1)
+
+    def test_exposition(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'crybaby_stage_seconds_bucket{', response.content)
+        self.assertIn(b'crybaby_process_resident_memory_bytes', response.content)
+
+    def test_api_key_can_be_required(self):
+        with override_settings(METRICS={**settings.METRICS, 'REQUIRE_API_KEY': True}):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_X_API_KEY=settings.API_KEY).status_code, 200)
@@ -0,0 +1,125 @@
+import threading
+import time
+import numpy as np
+from django.test import SimpleTestCase
+
+from crydetector.model_loader import BatchInferenceEngine
+
+
+def _features(value, rows=1):
+    return np.full((rows, 40, 173, 1), value, dtype=np.float32)
+
+
+class FakeModel:
+    """
+    Returns each row's first feature as its 'probability' and records the
+    batch sizes it was called with. While `gate` is clear, calls block
+    (after setting `entered`).
+    """
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.threads = []
+        self.error = error
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def predict(self, features):
+        self.entered.set()
+        self.gate.wait(5)
+        self.calls.append(features.shape[0])
+        self.threads.append(threading.current_thread())
+        if self.error is not None:
+            raise self.error
+        return features[:, 0, 0, :].copy()
+
+
+class BatchInferenceEngineTests(SimpleTestCase):
+
+    def make_engine(self, model, **kwargs):
+        engine = BatchInferenceEngine(model, **kwargs)
+        self.addCleanup(engine.close)
+        return engine
+
+    def submit_concurrently(self, engine, model, values):
+        """
+        Hold the batching thread inside the model on a first request (-1)
+        until every caller in `values` is queued, so they are grouped
+        deterministically. Returns {value: result or exception}.
+        """
+        results = {}
+
+        def call(value):
+            try:
+                results[value] = engine.submit(_features(value))
+            except Exception as e:
+                results[value] = e
+
+        model.gate.clear()
+        model.entered.clear()
+        blocker = threading.Thread(target=call, args=(-1,))
+        blocker.start()
+        model.entered.wait(5)
+        threads = [threading.Thread(target=call, args=(v,)) for v in values]
+        for t in threads:
+            t.start()
+        deadline = time.monotonic() + 5
+        while engine._queue.qsize() < len(values) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        model.gate.set()
+        for t in [blocker] + threads:
+            t.join(5)
+        del results[-1]
+        return results
+
+    def test_single_request_is_not_delayed(self):
+        model = FakeModel()
+        engine = self.make_engine(model, max_batch_size=8, max_wait_ms=1000)
+        started = time.perf_counter()
+        result = engine.submit(_features(3, rows=2))
+        self.assertLess(time.perf_counter() - started, 0.5)
+        np.testing.assert_array_equal(result, [[3], [3]])
+        self.assertEqual(engine.stats()['by_batch_size'][2]['batches'], 1)
+
+    def test_concurrent_requests_share_a_forward_pass(self):
+        model = FakeModel()
+        engine = self.make_engine(model, max_batch_size=32, max_wait_ms=50)
+        results = self.submit_concurrently(engine, model, range(8))
+        # Every caller gets its own rows back
+        for value in range(8):
+            np.testing.assert_array_equal(results[value], [[value]])
+        self.assertEqual(model.calls, [1, 8])
+        stats = engine.stats()
+        self.assertEqual((stats['batches'], stats['items']), (2, 9))
+
+    def test_batches_are_capped_at_max_batch_size(self):
+        model = FakeModel()
+        engine = self.make_engine(model, max_batch_size=4, max_wait_ms=50)
+        results = self.submit_concurrently(engine, model, range(8))
+        self.assertEqual(sorted(results), list(range(8)))
+        self.assertEqual(model.calls, [1, 4, 4])
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        model = FakeModel(error=RuntimeError('model failed'))
+        engine = self.make_engine(model, max_batch_size=8, max_wait_ms=50)
+        with self.assertLogs('crydetector.model_loader', 'ERROR'):
+            results = self.submit_concurrently(engine, model, range(4))
+        self.assertEqual(len(results), 4)
+        for result in results.values():
+            self.assertIsInstance(result, RuntimeError)
+            self.assertEqual(str(result), 'model failed')
+        # The batching thread survives a failed batch
+        model.error = None
+        np.testing.assert_array_equal(engine.submit(_features(5)), [[5]])
+
+    def test_close_serves_later_calls_on_the_caller_thread(self):
+        model = FakeModel()
+        engine = self.make_engine(model)
+        engine.submit(_features(1))
+        self.assertIsNot(model.threads[-1], threading.current_thread())
+        engine.close()
+        np.testing.assert_array_equal(engine.submit(_features(2)), [[2]])
+        self.assertIs(model.threads[-1], threading.current_thread())
+        engine._worker.join(5)
+        self.assertFalse(engine._worker.is_alive())
@@ -0,0 +1,151 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from crydetector import model_registry
+from crydetector.model_loader import ModelVersion, _file_version
+from crydetector.model_registry import ModelRegistry, get_registry, parse_traffic
+from crydetector.tests.helpers import FakeBackend
+
+
+def _fake_load(path, name=None):
+    with open(path, 'rb') as fh:
+        if fh.read() == b'broken':
+            raise ValueError('not a model')
+    return ModelVersion(name, path, _file_version(path), FakeBackend())
+
+
+@override_settings(INFERENCE_BACKEND={**settings.INFERENCE_BACKEND, 'NAME': 'onnx'})
+class ModelRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        patcher = mock.patch('crydetector.model_registry.load_version', side_effect=_fake_load)
+        self.load = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mtime = 1_000_000
+
+    def add(self, name, content=b'model'):
+        """
+        Write a model file, each one newer than the last.
+        """
+        path = os.path.join(self.dir, f'{name}.onnx')
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        self.mtime += 10
+        os.utime(path, (self.mtime, self.mtime))
+        return path
+
+    def registry(self, **kwargs):
+        registry = ModelRegistry(self.dir, **kwargs)
+        registry.scan()
+        return registry
+
+    def test_newest_file_is_active(self):
+        self.add('cry_v1')
+        self.add('cry_v2')
+        with open(os.path.join(self.dir, 'notes.txt'), 'w') as fh:
+            fh.write('not a model')
+        registry = self.registry()
+        self.assertEqual(registry.active_version().name, 'cry_v2')
+        self.assertEqual(sorted(registry.files()), ['cry_v1', 'cry_v2'])
+        self.assertEqual(registry.stats()['traffic_percent'], {'cry_v2': 100.0})
+
+    def test_configured_active_and_registry_json(self):
+        self.add('cry_v1')
+        self.add('cry_v2')
+        registry = self.registry(active='cry_v1')
+        self.assertEqual(registry.active_version().name, 'cry_v1')
+        with open(os.path.join(self.dir, 'registry.json'), 'w') as fh:
+            json.dump({'active': 'cry_v2'}, fh)
+        registry.scan()
+        self.assertEqual(registry.active_version().name, 'cry_v2')
+
+    def test_traffic_split(self):
+        self.add('cry_v1')
+        self.add('cry_v2')
+        self.add('cry_v3')
+        registry = self.registry(active='cry_v3', traffic=parse_traffic('cry_v1=10, cry_v2=5'))
+        self.assertEqual(registry.stats()['traffic_percent'], {'cry_v1': 10.0, 'cry_v2': 5.0, 'cry_v3': 85.0})
+        for draw, expected in ((0.05, 'cry_v1'), (0.12, 'cry_v2'), (0.15, 'cry_v3'), (0.99, 'cry_v3')):
+            with mock.patch('crydetector.model_registry.random.random', return_value=draw):
+                self.assertEqual(registry.route().name, expected)
+
+    def test_hot_swap_retires_the_old_version(self):
+        self.add('cry_v1')
+        registry = self.registry()
+        old = registry.active_version()
+        self.add('cry_v2')
+        registry.scan()
+        self.assertEqual(registry.active_version().name, 'cry_v2')
+        self.assertTrue(old._retired)
+        # Unchanged files are not reloaded
+        registry.scan()
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_failed_load_keeps_serving_and_waits_for_a_change(self):
+        self.add('cry_v1')
+        registry = self.registry()
+        self.add('cry_v2', b'broken')
+        with self.assertLogs('crydetector.model_registry', 'ERROR'):
+            registry.scan()
+        self.assertEqual(registry.active_version().name, 'cry_v1')
+        self.assertEqual(registry.stats()['failed'], ['cry_v2'])
+        registry.scan()
+        self.assertEqual(self.load.call_count, 2)
+        self.add('cry_v2')
+        registry.scan()
+        self.assertEqual(registry.active_version().name, 'cry_v2')
+        self.assertEqual(registry.stats()['failed'], [])
+
+    def test_file_vanishing_during_a_scan(self):
+        # cry_v2 was listed, then renamed away before its mtime was read
+        path = self.add('cry_v1')
+        ghost = os.path.join(self.dir, 'cry_v2.onnx')
+        registry = ModelRegistry(self.dir)
+        with mock.patch.object(registry, 'files', return_value={'cry_v1': path, 'cry_v2': ghost}):
+            registry.scan()
+        self.assertEqual(registry.active_version().name, 'cry_v1')
+
+    def test_failed_first_scan_is_left_to_the_watcher(self):
+        registry = ModelRegistry(self.dir, poll_seconds=3600)
+        with mock.patch.object(registry, 'scan', side_effect=OSError('disk gone')):
+            with self.assertLogs('crydetector.model_registry', 'ERROR'):
+                registry.start()
+        self.assertTrue(registry._thread.is_alive())
+        self.assertIsNone(registry.active_version())
+
+
+class GetRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        def reset():
+            model_registry._registry = None
+            model_registry._start_failure = None
+
+        reset()
+        self.addCleanup(reset)
+
+    @override_settings(MODEL_REGISTRY={**settings.MODEL_REGISTRY, 'ENABLED': True, 'POLL_SECONDS': 30,
+                                       'TRAFFIC': 'cry_v2=ten'})
+    def test_failed_start_backs_off(self):
+        with mock.patch('crydetector.model_registry.time.monotonic', return_value=100.0), \
+                mock.patch('crydetector.model_registry.parse_traffic', wraps=parse_traffic) as parse:
+            with self.assertLogs('crydetector.model_registry', 'ERROR'):
+                with self.assertRaises(ValueError):
+                    get_registry()
+            for _ in range(3):
+                with self.assertRaisesRegex(RuntimeError, 'failed to start'):
+                    get_registry()
+            self.assertEqual(parse.call_count, 1)
+        with mock.patch('crydetector.model_registry.time.monotonic', return_value=131.0), \
+                mock.patch('crydetector.model_registry.parse_traffic', wraps=parse_traffic) as parse:
+            with self.assertLogs('crydetector.model_registry', 'ERROR'):
+                with self.assertRaises(ValueError):
+                    get_registry()
+            self.assertEqual(parse.call_count, 1)
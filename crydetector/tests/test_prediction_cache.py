@@ -0,0 +1,99 @@
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from crydetector.prediction_cache import PredictionCache, get_prediction_cache
+from crydetector.tests.helpers import ISOLATED, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+PROBS = [0.1, 0.2, 0.7]
+
+
+class PredictionCacheTests(SimpleTestCase):
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_entries=2)
+        cache.set('a', PROBS)
+        cache.set('b', PROBS)
+        cache.get('a')  # 'b' is now the least recently used
+        cache.set('c', PROBS)
+        self.assertIsNone(cache.get('b'))
+        np.testing.assert_allclose(cache.get('a'), PROBS)
+        self.assertIsNotNone(cache.get('c'))
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['hits_local'], stats['misses']), (2, 1, 3, 1))
+
+    def test_entries_expire(self):
+        cache = PredictionCache(ttl_seconds=10)
+        with mock.patch('crydetector.prediction_cache.time.monotonic', return_value=100.0):
+            cache.set('a', PROBS)
+        with mock.patch('crydetector.prediction_cache.time.monotonic', return_value=109.0):
+            self.assertIsNotNone(cache.get('a'))
+        with mock.patch('crydetector.prediction_cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_key_depends_on_audio_model_and_preprocessing(self):
+        cache = PredictionCache()
+        key = cache.make_key(b'audio', 'model:1')
+        self.assertEqual(cache.make_key(b'audio', 'model:1'), key)
+        self.assertNotEqual(cache.make_key(b'other', 'model:1'), key)
+        self.assertNotEqual(cache.make_key(b'audio', 'model:2'), key)
+        with override_settings(AUDIO_CONFIG={**settings.AUDIO_CONFIG, 'N_MFCC': 20}):
+            self.assertNotEqual(PredictionCache().make_key(b'audio', 'model:1'), key)
+        # A known digest stands in for hashing the bytes
+        digest = key.rsplit(':', 1)[1]
+        self.assertEqual(cache.make_key(b'ignored', 'model:1', digest=digest), key)
+
+    def test_shared_tier_is_read_through(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        writer, reader = PredictionCache(alias='default'), PredictionCache(alias='default')
+        writer.set('k', PROBS)
+        np.testing.assert_allclose(reader.get('k'), PROBS)
+        reader.get('k')
+        self.assertEqual((reader.stats()['hits_shared'], reader.stats()['hits_local']), (1, 1))
+
+    def test_shared_tier_failures_are_misses(self):
+        cache = PredictionCache(alias='default')
+        with mock.patch.object(caches['default'], 'get', side_effect=ConnectionError('down')), \
+                self.assertLogs('crydetector.prediction_cache', 'WARNING'):
+            self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.stats()['shared_errors'], 1)
+
+    @override_settings(PREDICTION_CACHE={**settings.PREDICTION_CACHE, 'ENABLED': False})
+    def test_disabled(self):
+        self.assertIsNone(get_prediction_cache())
+
+
+@override_settings(**{**ISOLATED, 'PREDICTION_CACHE': {**settings.PREDICTION_CACHE, 'ENABLED': True, 'ALIAS': ''}})
+class CachedPredictViewTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        self.version = install_model(self, self.backend)
+        self.clip = wav_bytes(cry(4))
+
+    def predict(self, data=None, **params):
+        audio = SimpleUploadedFile('clip.wav', data or self.clip, 'audio/wav')
+        return self.client.post('/api/v1/predict/', {'audio': audio, **params}, HTTP_X_API_KEY=settings.API_KEY)
+
+    def test_repeat_upload_skips_inference(self):
+        first, second = self.predict().json(), self.predict().json()
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['label'], first['label'])
+        self.assertEqual(self.backend.calls, [1])
+        self.predict(wav_bytes(cry(4, seed=1)))
+        self.assertEqual(self.backend.calls, [1, 1])
+
+    def test_new_model_version_misses(self):
+        self.predict()
+        backend = FakeBackend()
+        install_model(self, backend, name='retrained')
+        self.assertFalse(self.predict().json()['cached'])
+        self.assertEqual(backend.calls, [1])
@@ -0,0 +1,114 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from crydetector.management.commands.score_corpus import CsvResults
+from crydetector.model_loader import ModelVersion, _file_version
+from crydetector.tests.helpers import FakeBackend, cry, wav_bytes
+
+
+class ScoreCorpusTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        for path, data in (('hungry/a.wav', wav_bytes(cry(4))), ('hungry/b.wav', wav_bytes(cry(4, seed=1))),
+                           ('tired/c.wav', wav_bytes(cry(4, seed=2))), ('tired/broken.wav', b'RIFF garbage'),
+                           ('notes.txt', b'not audio')):
+            os.makedirs(os.path.dirname(os.path.join(cls.root, path)), exist_ok=True)
+            with open(os.path.join(cls.root, path), 'wb') as fh:
+                fh.write(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.model = self.write_model('model.keras', b'model')
+        self.backend = FakeBackend()
+        patcher = mock.patch('crydetector.model_loader.load_version',
+                             side_effect=lambda path: ModelVersion('m', path, _file_version(path), self.backend))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_model(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def score(self, output, *args, model=None):
+        out = io.StringIO()
+        call_command('score_corpus', self.root, '--output', output, '--model', model or self.model,
+                     '--workers', '1', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def rows(self, output):
+        with open(output, newline='') as fh:
+            return {row['path']: row for row in csv.DictReader(fh)}
+
+    def test_scores_every_wav_once_across_resumes(self):
+        output = os.path.join(self.dir, 'scores.csv')
+        self.assertIn('0 already scored, 2 to score', self.score(output, '--limit', '2'))
+        self.assertIn('2 already scored, 2 to score', self.score(output))
+        report = self.score(output)
+        self.assertIn('4 already scored, 0 to score', report)
+        self.assertIn('accuracy 0.667 over 3 labelled files', report)
+
+        rows = self.rows(output)
+        self.assertEqual(sorted(rows), ['hungry/a.wav', 'hungry/b.wav', 'tired/broken.wav', 'tired/c.wav'])
+        self.assertEqual(rows['hungry/a.wav']['predicted_label'], 'hungry')
+        self.assertEqual(rows['tired/c.wav']['label'], 'tired')
+        self.assertTrue(rows['tired/broken.wav']['error'])
+        self.assertEqual({row['model_version'] for row in rows.values()}, {_file_version(self.model)})
+        # Three clips decoded, batched two at a time; the broken file never reaches the model
+        self.assertEqual(sum(self.backend.calls), 3)
+
+    def test_refuses_to_resume_with_another_model(self):
+        output = os.path.join(self.dir, 'scores.csv')
+        self.score(output, '--limit', '1')
+        other = self.write_model('retrained.keras', b'another model')
+        with self.assertRaisesRegex(CommandError, 'was scored with model.keras'):
+            self.score(output, model=other)
+        self.score(output, '--restart', model=other)
+        self.assertEqual({row['model_version'] for row in self.rows(output).values()}, {_file_version(other)})
+
+    def test_parquet_parts(self):
+        output = os.path.join(self.dir, 'scores.parquet')
+        self.score(output, '--limit', '3', '--flush-rows', '2')
+        self.score(output)
+        import pyarrow.parquet as pq
+        table = pq.read_table(output)
+        self.assertEqual(sorted(table.column('path').to_pylist()),
+                         ['hungry/a.wav', 'hungry/b.wav', 'tired/broken.wav', 'tired/c.wav'])
+        self.assertEqual(len(os.listdir(output)), 3)
+
+    def test_bad_arguments(self):
+        with self.assertRaisesRegex(CommandError, 'Model unavailable'):
+            self.score(os.path.join(self.dir, 'scores.csv'), model=os.path.join(self.dir, 'missing.keras'))
+        with self.assertRaisesRegex(CommandError, 'must end in'):
+            self.score(os.path.join(self.dir, 'scores.json'))
+
+
+class CsvResultsTests(SimpleTestCase):
+
+    def test_a_row_cut_short_is_dropped(self):
+        path = os.path.join(tempfile.mkdtemp(), 'scores.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        results = CsvResults(path, ['path', 'error'])
+        results.write([{'path': 'a.wav', 'error': ''}])
+        with open(path, 'a') as fh:
+            fh.write('b.wa')
+        self.assertEqual(results.read(['path']), {'path': ['a.wav']})
+        results.write([{'path': 'b.wav', 'error': ''}])
+        self.assertEqual(results.read(['path']), {'path': ['a.wav', 'b.wav']})
@@ -0,0 +1,143 @@
+import io
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from crydetector.segmentation import iter_windows, merge_episodes, segment_recording
+from crydetector.tests.helpers import ISOLATED, SR, FakeBackend, cry, install_model, reset_singletons, wav_bytes
+
+URL = '/api/v1/predict/long/'
+
+
+def _seg(start, end, label='hungry', confidence=0.9, crying=True):
+    return {'start': start, 'end': end, 'label': label, 'confidence': confidence, 'is_crying': crying}
+
+
+def _recording(*parts):
+    """
+    Concatenate (kind, seconds) parts, kind 'cry' or 'silence', into one waveform.
+    """
+    pieces = [cry(seconds) if kind == 'cry' else np.zeros(int(SR * seconds), np.float32) for kind, seconds in parts]
+    return np.concatenate(pieces)
+
+
+class MergeEpisodesTests(SimpleTestCase):
+
+    def test_merges_overlapping_and_close_segments(self):
+        segments = [
+            _seg(0, 4, confidence=0.7),
+            _seg(2, 6, label='tired', confidence=0.8),
+            _seg(6.5, 10.5, confidence=0.95),  # within the 1 s gap
+            _seg(8, 12, crying=False),
+            _seg(20, 24, label='tired', confidence=0.6),
+        ]
+        episodes = merge_episodes(segments, max_gap=1.0)
+        self.assertEqual(episodes, [
+            # hungry wins on summed confidence (1.65 vs 0.8), not on the single highest
+            {'start': 0, 'end': 10.5, 'windows': 3, 'peak_confidence': 0.95, 'label': 'hungry'},
+            {'start': 20, 'end': 24, 'windows': 1, 'peak_confidence': 0.6, 'label': 'tired'},
+        ])
+
+    def test_non_crying_segments_split_nothing(self):
+        self.assertEqual(merge_episodes([_seg(0, 4, crying=False), {'start': 2, 'end': 6}], 1.0), [])
+
+
+class IterWindowsTests(SimpleTestCase):
+
+    def test_windows_span_block_boundaries(self):
+        blocks = [np.arange(0, 7, dtype=np.float32), np.arange(7, 12, dtype=np.float32)]
+        windows = [(start, y.tolist()) for start, y in iter_windows(iter(blocks), window=4, hop=3, min_samples=2)]
+        self.assertEqual(windows, [
+            (0, [0, 1, 2, 3]), (3, [3, 4, 5, 6]), (6, [6, 7, 8, 9]),
+            # trailing partial window: reaches past sample 10 and holds >= 2 samples
+            (9, [9, 10, 11]),
+        ])
+
+    def test_short_tail_is_dropped(self):
+        windows = list(iter_windows(iter([np.zeros(9, np.float32)]), window=4, hop=4, min_samples=2))
+        self.assertEqual([start for start, _ in windows], [0, 4])
+
+
+@override_settings(**ISOLATED)
+class SegmentRecordingTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        install_model(self, self.backend)
+
+    def test_silent_windows_skip_the_model(self):
+        y = _recording(('silence', 8), ('cry', 8), ('silence', 8))
+        result = segment_recording(io.BytesIO(wav_bytes(y)), hop_seconds=4)
+        segments = result['segments']
+        self.assertEqual([s['start'] for s in segments], [0, 4, 8, 12, 16, 20])
+        self.assertEqual([s['silent'] for s in segments], [True, True, False, False, True, True])
+        self.assertEqual(self.backend.calls, [2])
+        self.assertEqual(result['episodes'], [
+            {'start': 8.0, 'end': 16.0, 'windows': 2, 'peak_confidence': 0.9, 'label': 'hungry'}])
+        stats = result['stats']
+        self.assertEqual((stats['windows'], stats['windows_classified'], stats['windows_silent']), (6, 2, 4))
+        self.assertEqual(stats['audio_seconds'], 24.0)
+        self.assertEqual(result['model_version'], 'fake')
+
+    def test_windows_are_batched(self):
+        y = _recording(('cry', 20))
+        with override_settings(LONG_AUDIO={**settings.LONG_AUDIO, 'BATCH_SIZE': 4}):
+            result = segment_recording(io.BytesIO(wav_bytes(y)), hop_seconds=2)
+        self.assertEqual(result['stats']['windows'], 9)
+        self.assertEqual(self.backend.calls, [4, 4, 1])
+
+    def test_cpu_time_leaves_out_other_threads(self):
+        import threading
+
+        stop = threading.Event()
+
+        def spin():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=spin)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        result = segment_recording(io.BytesIO(wav_bytes(_recording(('cry', 12)))), hop_seconds=4)
+        stats = result['stats']
+        # With the spinning thread counted, CPU time would track wall time
+        self.assertLess(stats['cpu_seconds'], stats['wall_seconds'] * 0.9)
+
+    def test_too_long_recording(self):
+        with override_settings(LONG_AUDIO={**settings.LONG_AUDIO, 'MAX_SECONDS': 5}):
+            with self.assertRaisesRegex(ValueError, 'exceeds 5s limit'):
+                segment_recording(io.BytesIO(wav_bytes(_recording(('cry', 40)))))
+
+
+@override_settings(**ISOLATED)
+class LongViewTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        install_model(self)
+
+    def post(self, data, name='night.wav', **fields):
+        audio = SimpleUploadedFile(name, data, 'audio/wav')
+        return self.client.post(URL, {'audio': audio, **fields}, HTTP_X_API_KEY=settings.API_KEY)
+
+    def test_timeline(self):
+        response = self.post(wav_bytes(_recording(('cry', 8), ('silence', 4))), hop='4')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['segments']), 3)
+        self.assertEqual(len(body['episodes']), 1)
+
+    def test_upload_past_the_limit_is_rejected(self):
+        with override_settings(LONG_AUDIO={**settings.LONG_AUDIO, 'MAX_SECONDS': 5}):
+            response = self.post(wav_bytes(_recording(('cry', 10))))
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('exceeds 5s limit', response.json()['error'])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.post(b'ID3', name='night.mp3').status_code, 415)
+        self.assertEqual(self.post(wav_bytes(_recording(('cry', 4))), hop='9').status_code, 400)
+        self.assertEqual(self.post(b'RIFF garbage').status_code, 422)
+        self.assertEqual(self.client.post(URL).status_code, 401)
@@ -0,0 +1,133 @@
+import json
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from crydetector import streaming
+from crydetector.audio_utils import get_feature_extractor
+from crydetector.streaming import StreamingWindow, stream_application
+from crydetector.tests.helpers import ISOLATED, SR, FakeBackend, cry, install_model, reset_singletons
+
+
+async def _session(query='', chunks=(), headers=None):
+    """
+    Run one WebSocket connection through stream_application: connect, send
+    `chunks` (bytes, or str for text frames), disconnect. Returns what the
+    app sent.
+    """
+    incoming = [{'type': 'websocket.connect'}]
+    for chunk in chunks:
+        key = 'text' if isinstance(chunk, str) else 'bytes'
+        incoming.append({'type': 'websocket.receive', key: chunk})
+    incoming.append({'type': 'websocket.disconnect'})
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'websocket', 'path': streaming.STREAM_PATH, 'query_string': query.encode(),
+             'headers': headers if headers is not None else [(b'x-api-key', settings.API_KEY.encode())]}
+    await stream_application(scope, receive, send)
+    return sent
+
+
+def _pcm(y, seconds_per_chunk=0.5):
+    data = (np.clip(y, -1, 1) * 32767).astype('<i2').tobytes()
+    step = int(SR * seconds_per_chunk) * 2
+    return [data[i:i + step] for i in range(0, len(data), step)]
+
+
+def _events(sent):
+    return [json.loads(m['text']) for m in sent if m['type'] == 'websocket.send']
+
+
+class StreamingWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        self.extractor = get_feature_extractor()
+
+    def test_windows_match_offline_features(self):
+        y = cry(7)
+        window = StreamingWindow(self.extractor, stride_seconds=1.0, input_rate=SR)
+        emitted = []
+        # Chunks that do not line up with hops or frames
+        for start in range(0, y.size, 3001):
+            features, end = window.push(y[start:start + 3001])
+            if features is not None:
+                emitted.append((features, end))
+        self.assertEqual(len(emitted), 3)
+        # Due windows are classified when the chunk completing them arrives
+        self.assertTrue(0 <= emitted[0][1] - window.window_seconds < 3001 / SR)
+        for features, end in emitted:
+            frames = self.extractor.log_mel_frames(y[:int(round(end * SR))])[-self.extractor.max_pad_len:]
+            np.testing.assert_allclose(features, self.extractor.transform_log_mel(frames), atol=1e-4)
+
+    def test_one_big_chunk_skips_to_the_latest_window(self):
+        window = StreamingWindow(self.extractor, stride_seconds=0.5, input_rate=SR)
+        features, end = window.push(cry(6))
+        self.assertIsNotNone(features)
+        self.assertGreater(end, 5.5)
+        self.assertGreater(window.windows_skipped, 0)
+
+    def test_resamples_other_rates(self):
+        window = StreamingWindow(self.extractor, stride_seconds=1.0, input_rate=16000)
+        features, _ = window.push(cry(5, sample_rate=16000))
+        self.assertEqual(features.shape, (self.extractor.n_mfcc, self.extractor.max_pad_len))
+
+
+@override_settings(**ISOLATED)
+class StreamApplicationTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_singletons(self)
+        self.backend = FakeBackend()
+        install_model(self, self.backend)
+
+    async def test_streams_one_event_per_stride(self):
+        sent = await _session(chunks=_pcm(cry(7)))
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        events = _events(sent)
+        self.assertEqual([e['type'] for e in events], ['prediction'] * 3)
+        self.assertEqual([e['label'] for e in events], ['hungry'] * 3)
+        self.assertEqual([round(e['end'] - events[0]['end']) for e in events], [0, 1, 2])
+        self.assertEqual(events[0]['model_version'], 'fake')
+        self.assertEqual(streaming._active_connections, 0)
+
+    async def test_odd_sized_chunks_keep_sample_alignment(self):
+        data = b''.join(_pcm(cry(6)))
+        odd = [data[i:i + 9999] for i in range(0, len(data), 9999)]
+        features = []
+        predict = self.backend.predict
+        self.backend.predict = lambda batch: features.append(batch[0, :, :, 0].copy()) or predict(batch)
+        events = _events(await _session(chunks=odd))
+        self.assertEqual(len(events), 2)
+        # Same features as offline extraction over the samples received so far
+        y = np.frombuffer(data, '<i2').astype(np.float32) / 32768.0
+        extractor = get_feature_extractor()
+        for event, window in zip(events, features):
+            # 'end' is rounded to the millisecond: recover the frame count it stands for
+            n_frames = round((event['end'] * SR - extractor.n_fft) / extractor.hop_length) + 1
+            end = (n_frames - 1) * extractor.hop_length + extractor.n_fft
+            frames = extractor.log_mel_frames(y[:end])[-extractor.max_pad_len:]
+            np.testing.assert_allclose(window, extractor.transform_log_mel(frames), atol=1e-4)
+
+    async def test_text_frames_are_reported(self):
+        events = _events(await _session(chunks=['hello']))
+        self.assertEqual(events, [{'type': 'error', 'error': 'Send audio as binary PCM frames'}])
+
+    async def test_refused_connections(self):
+        sent = await _session(headers=[])
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': streaming.CLOSE_POLICY_VIOLATION}])
+        sent = await _session(f'api_key={settings.API_KEY}&encoding=mp3', headers=[])
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': streaming.CLOSE_BAD_REQUEST}])
+        with override_settings(STREAMING={**settings.STREAMING, 'MAX_CONNECTIONS': 0}):
+            sent = await _session()
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': streaming.CLOSE_TRY_AGAIN_LATER}])
+
+    async def test_oversized_chunk_closes(self):
+        sent = await _session(chunks=_pcm(cry(3), seconds_per_chunk=3))
+        self.assertEqual(sent[-1], {'type': 'websocket.close', 'code': streaming.CLOSE_MESSAGE_TOO_BIG})
+        self.assertEqual(self.backend.calls, [])
@@ -0,0 +1,112 @@
+import hashlib
+import io
+import math
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from crydetector.upload_handlers import LONG, WavUpload, stream_wav_uploads, upload_data, upload_digest
+from crydetector.wav_decoder import RESAMPLE_MARGIN_SECONDS, decode_wav, parse_wav_header
+
+SR = 22050
+
+
+def _wav(seconds, subtype='PCM_16', sample_rate=SR):
+    import soundfile as sf
+
+    y = 0.3 * np.random.default_rng(0).standard_normal(int(sample_rate * seconds))
+    buf = io.BytesIO()
+    sf.write(buf, y, sample_rate, format='WAV', subtype=subtype)
+    return buf.getvalue()
+
+
+def _upload(data, mode='window', name='clip.wav'):
+    """
+    Parse a multipart POST of `data` through the streaming handler;
+    returns (handler, uploaded file).
+    """
+    request = RequestFactory().post('/api/v1/predict/', {'audio': SimpleUploadedFile(name, data, 'audio/wav')})
+    handler = stream_wav_uploads(request, mode)
+    return handler, request.FILES['audio']
+
+
+class WindowModeTests(SimpleTestCase):
+
+    def test_keeps_only_the_model_window(self):
+        data = _wav(10)
+        _, upload = _upload(data)
+        info = parse_wav_header(data)
+        window = math.ceil((settings.AUDIO_CONFIG['DURATION'] + RESAMPLE_MARGIN_SECONDS) * SR) * info.block_align
+        self.assertIsInstance(upload, WavUpload)
+        self.assertEqual(upload_digest(upload), hashlib.sha256(data).hexdigest())
+        self.assertEqual(upload.size, info.data_offset + window)
+        self.assertEqual(bytes(upload_data(upload)), data[:upload.size])
+        duration = settings.AUDIO_CONFIG['DURATION']
+        np.testing.assert_array_equal(decode_wav(upload_data(upload), SR, max_duration=duration),
+                                      decode_wav(data, SR, max_duration=duration))
+
+    def test_short_upload_is_kept_whole(self):
+        data = _wav(1)
+        _, upload = _upload(data)
+        self.assertEqual(bytes(upload_data(upload)), data)
+        self.assertEqual(upload_digest(upload), hashlib.sha256(data).hexdigest())
+        # read() and seek() work like any other upload
+        self.assertEqual(upload.read(4), b'RIFF')
+        upload.seek(0)
+        self.assertEqual(upload.read(), data)
+
+    def test_unparsed_upload_is_kept_whole_in_memory(self):
+        data = _wav(2, subtype='IMA_ADPCM')
+        _, upload = _upload(data)
+        self.assertIsInstance(upload, WavUpload)
+        self.assertEqual(bytes(upload_data(upload)), data)
+
+    def test_unparsed_upload_over_memory_limit_is_spooled_whole(self):
+        data = _wav(8, subtype='IMA_ADPCM')
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=len(data) // 4):
+            _, upload = _upload(data)
+        self.addCleanup(upload.close)
+        self.assertIsInstance(upload, TemporaryUploadedFile)
+        self.assertEqual(upload.size, len(data))
+        self.assertEqual(upload_data(upload), data)
+        self.assertEqual(upload_digest(upload), hashlib.sha256(data).hexdigest())
+
+    def test_digest_covers_the_dropped_tail(self):
+        data = _wav(10)
+        tail = bytearray(data)
+        tail[-100:] = bytes(100)
+        _, first = _upload(data)
+        _, second = _upload(bytes(tail))
+        self.assertEqual(bytes(upload_data(first)), bytes(upload_data(second)))
+        self.assertNotEqual(upload_digest(first), upload_digest(second))
+
+    def test_other_files_are_left_to_django(self):
+        _, upload = _upload(b'ID3 not audio', name='clip.mp3')
+        self.assertNotIsInstance(upload, WavUpload)
+        self.assertEqual(upload.read(), b'ID3 not audio')
+
+    @override_settings(UPLOAD_STREAMING={'ENABLED': False, 'MAX_HEADER_BYTES': 65536})
+    def test_disabled(self):
+        handler, upload = _upload(_wav(1))
+        self.assertIsNone(handler)
+        self.assertNotIsInstance(upload, WavUpload)
+
+
+class LongModeTests(SimpleTestCase):
+
+    def test_passes_the_upload_to_django(self):
+        data = _wav(3)
+        handler, upload = _upload(data, LONG)
+        self.assertNotIsInstance(upload, WavUpload)
+        self.assertEqual(handler.truncated, set())
+        self.assertEqual(upload.read(), data)
+
+    def test_stops_writing_at_max_seconds(self):
+        data = _wav(5)
+        info = parse_wav_header(data)
+        with override_settings(LONG_AUDIO={**settings.LONG_AUDIO, 'MAX_SECONDS': 2}):
+            handler, upload = _upload(data, LONG)
+        self.assertEqual(handler.truncated, {'clip.wav'})
+        self.assertEqual(upload.size, info.data_offset + 2 * SR * info.block_align)
+        self.assertEqual(upload.read(), data[:upload.size])
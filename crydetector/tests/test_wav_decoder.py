@@ -0,0 +1,82 @@
+import io
+import struct
+import numpy as np
+from django.test import SimpleTestCase
+
+from crydetector.audio_utils import load_audio
+from crydetector.wav_decoder import WavFormatError, decode_wav, parse_wav_header
+
+SR = 22050
+
+
+def _wav(seconds=1.0, sample_rate=SR, channels=1, subtype='PCM_16', seed=0):
+    """
+    WAV bytes of low-level noise written by libsndfile.
+    """
+    import soundfile as sf
+
+    rng = np.random.default_rng(seed)
+    y = (0.3 * rng.standard_normal((int(sample_rate * seconds), channels))).clip(-1, 1)
+    buf = io.BytesIO()
+    sf.write(buf, y, sample_rate, format='WAV', subtype=subtype)
+    return buf.getvalue()
+
+
+def _librosa_load(data, sr=SR, duration=None):
+    import librosa
+
+    y, _ = librosa.load(io.BytesIO(data), sr=sr, mono=True)
+    return y if duration is None else y[:int(sr * duration)]
+
+
+class DecodeWavTests(SimpleTestCase):
+
+    def test_matches_librosa_for_supported_formats(self):
+        for subtype in ('PCM_U8', 'PCM_16', 'PCM_24', 'PCM_32', 'FLOAT', 'DOUBLE'):
+            for channels in (1, 2):
+                with self.subTest(subtype=subtype, channels=channels):
+                    data = _wav(channels=channels, subtype=subtype)
+                    np.testing.assert_allclose(decode_wav(data, SR), _librosa_load(data), atol=1e-6)
+
+    def test_resamples_like_librosa(self):
+        data = _wav(seconds=2.0, sample_rate=44100, channels=2)
+        timings = {}
+        y = decode_wav(data, SR, timings=timings)
+        np.testing.assert_allclose(y, _librosa_load(data), atol=1e-4)
+        self.assertIn('resample', timings)
+
+    def test_max_duration_matches_full_decode(self):
+        # The resampling margin keeps the samples at the cut point equal to a
+        # full-file resample
+        for sample_rate in (SR, 16000):
+            with self.subTest(sample_rate=sample_rate):
+                data = _wav(seconds=3.0, sample_rate=sample_rate)
+                y = decode_wav(data, SR, max_duration=1.5)
+                self.assertEqual(len(y), int(SR * 1.5))
+                np.testing.assert_allclose(y, _librosa_load(data, duration=1.5), atol=1e-4)
+
+    def test_streaming_writer_data_size(self):
+        # data_size left at 0 by a streaming writer: the rest of the buffer is data
+        data = bytearray(_wav())
+        info = parse_wav_header(data)
+        struct.pack_into('<I', data, info.data_offset - 4, 0)
+        np.testing.assert_array_equal(decode_wav(bytes(data), SR), decode_wav(_wav(), SR))
+
+    def test_skips_unknown_chunks(self):
+        data = _wav()
+        # RIFF header, then an odd-sized LIST chunk (padded to a word) before fmt
+        extra = b'LIST' + struct.pack('<I', 3) + b'abc\x00'
+        patched = data[:4] + struct.pack('<I', len(data) - 8 + len(extra)) + data[8:12] + extra + data[12:]
+        np.testing.assert_array_equal(decode_wav(patched, SR), decode_wav(data, SR))
+
+    def test_rejects_what_it_cannot_decode(self):
+        for data in (b'', b'not a wav file at all', _wav(subtype='IMA_ADPCM')):
+            with self.subTest(data=data[:12]):
+                with self.assertRaises(WavFormatError):
+                    decode_wav(data, SR)
+
+    def test_load_audio_falls_back_to_librosa(self):
+        data = _wav(seconds=2.0, subtype='IMA_ADPCM')
+        y = load_audio(data, SR, duration=1.0)
+        self.assertEqual(len(y), SR)
+        np.testing.assert_allclose(y, _librosa_load(data, duration=1.0), atol=1e-6)
@@ -0,0 +1,250 @@
+"""
+Streaming upload handling for WAV files on the API endpoints.
+
+Django's default handlers buffer every upload (in memory up to
+FILE_UPLOAD_MAX_MEMORY_SIZE, else in a temp file) and the views then copy
+it again with read(). WavUploadHandler parses the RIFF header while the
+body streams in and knows from it how many bytes decoding will touch:
+
+    window  (predict / batch / jobs) keeps the header plus the PCM for the
+            model window (AUDIO_CONFIG['DURATION'] and the resampling
+            margin) in one buffer and drops the rest of the upload as it
+            arrives. The view hands the buffer to the decoder as a
+            memoryview (upload_data), so the audio is never copied. The
+            sha256 of the whole upload is computed as it streams past
+            (upload_digest), for the prediction cache and audit log.
+    long    (predict/long) passes the upload on to Django's handlers, which
+            spool it to disk for block-wise decoding, up to
+            LONG_AUDIO['MAX_SECONDS']. Bytes past that are not written and
+            the upload is marked truncated for the view to reject.
+
+Files the fast decoder cannot read (compressed WAV, odd bit depths, a
+header longer than MAX_HEADER_BYTES) go down the old path: kept whole for
+the librosa fallback, in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE and
+spooled to a temporary file beyond that, as Django's handlers would.
+"""
+
+import hashlib
+import io
+import math
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from .wav_decoder import RESAMPLE_MARGIN_SECONDS, SUPPORTED_FORMATS, WavFormatError, parse_wav_header
+
+WINDOW = 'window'
+LONG = 'long'
+
+
+class _ViewReader(io.RawIOBase):
+    """
+    Read-only, seekable file over a memoryview (no copy of the buffer).
+    """
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class WavUpload(UploadedFile):
+    """
+    An upload kept by WavUploadHandler in window mode. `view` is a
+    memoryview of the kept bytes; read() / seek() work as usual. `sha256`
+    is the hex digest of everything the client sent, kept or not.
+    """
+
+    def __init__(self, buffer, name, content_type, charset, content_type_extra, sha256):
+        self.view = memoryview(buffer)
+        super().__init__(None, name, content_type, len(buffer), charset, content_type_extra)
+        self.sha256 = sha256
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = _ViewReader(self.view)
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = value
+
+
+class WavUploadHandler(FileUploadHandler):
+
+    def __init__(self, request=None, mode=WINDOW, fields=('audio',)):
+        super().__init__(request)
+        self.mode = mode
+        self.fields = fields
+        self.max_header_bytes = settings.UPLOAD_STREAMING['MAX_HEADER_BYTES']
+        # Names of long-mode uploads cut at LONG_AUDIO['MAX_SECONDS']
+        self.truncated = set()
+        self.active = False
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.active = field_name in self.fields and file_name.lower().endswith('.wav')
+        if not self.active:
+            return
+        self.header = bytearray()
+        self.buffer = bytearray()
+        self.info = None
+        self.limit = None
+        self.passed = 0
+        # Unparsed window-mode upload too large to keep in memory
+        self.spool = None
+        self.digest = hashlib.sha256()
+        if self.mode == WINDOW:
+            # This handler stores the file; Django's must not buffer it too
+            raise StopFutureHandlers()
+
+    def _parse_header(self, head):
+        """
+        Set self.limit (bytes worth keeping) once the header is complete,
+        or fall back to keeping everything for anything unexpected.
+        """
+        try:
+            info = parse_wav_header(head)
+        except WavFormatError:
+            not_riff = len(head) >= 12 and (head[:4] != b'RIFF' or head[8:12] != b'WAVE')
+            if not_riff or len(head) >= self.max_header_bytes:
+                self.limit = math.inf
+            return
+        if (info.format_tag, info.bits_per_sample) not in SUPPORTED_FORMATS or info.channels < 1 \
+                or info.block_align != info.channels * (info.bits_per_sample // 8):
+            self.limit = math.inf
+            return
+        if self.mode == WINDOW:
+            seconds = settings.AUDIO_CONFIG['DURATION'] + RESAMPLE_MARGIN_SECONDS
+        else:
+            seconds = settings.LONG_AUDIO['MAX_SECONDS']
+        self.info = info
+        self.limit = info.data_offset + math.ceil(seconds * info.sample_rate) * info.block_align
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        if self.mode == WINDOW:
+            self.digest.update(raw_data)
+            if self.spool is not None:
+                self.spool.write(raw_data)
+                return None
+            data = memoryview(raw_data)
+            if self.limit is None:
+                head = data[:self.max_header_bytes - len(self.buffer)]
+                self.buffer += head
+                data = data[len(head):]
+                self._parse_header(self.buffer)
+            # Unparsed uploads are kept whole for librosa: in memory while they
+            # fit, else on disk (like Django's temporary file handler)
+            if self.limit == math.inf and len(self.buffer) + len(data) > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+                self.spool = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset,
+                                                   self.content_type_extra)
+                self.spool.write(self.buffer)
+                self.spool.write(data)
+                self.buffer = bytearray()
+                return None
+            cap = settings.FILE_UPLOAD_MAX_MEMORY_SIZE if self.limit in (None, math.inf) else self.limit
+            room = cap - len(self.buffer)
+            if room > 0:
+                self.buffer += data[:room]
+            elif room < 0:
+                del self.buffer[cap:]
+            return None
+
+        # Long mode: forward only what fits under the limit
+        if self.limit is None:
+            self.header += raw_data[:self.max_header_bytes - len(self.header)]
+            self._parse_header(self.header)
+        room = (self.limit if self.limit is not None else math.inf) - self.passed
+        if room <= 0:
+            return None
+        chunk = raw_data if room >= len(raw_data) else raw_data[:room]
+        self.passed += len(chunk)
+        return chunk
+
+    def _sample_bytes_dropped(self, file_size):
+        """
+        Whether a long-mode upload had sample data beyond what was passed on
+        (bytes of trailing RIFF chunks after 'data' do not count).
+        """
+        kept = self.passed
+        if self.info is None:
+            return file_size > kept
+        data_end = self.info.data_offset + self.info.data_size
+        if self.info.data_size in (0, 0xFFFFFFFF):
+            data_end = file_size
+        return min(file_size, data_end) > kept
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.mode == LONG:
+            if self._sample_bytes_dropped(file_size):
+                self.truncated.add(self.file_name)
+            return None
+        if self.spool is not None:
+            self.spool.flush()
+            self.spool.seek(0)
+            self.spool.size = file_size
+            self.spool.sha256 = self.digest.hexdigest()
+            return self.spool
+        return WavUpload(self.buffer, self.file_name, self.content_type, self.charset,
+                         self.content_type_extra, sha256=self.digest.hexdigest())
+
+
+def stream_wav_uploads(request, mode=WINDOW):
+    """
+    Put a WavUploadHandler in front of the request's upload handlers and
+    return it (None when disabled). Call before request.POST / FILES.
+    """
+    if not settings.UPLOAD_STREAMING['ENABLED']:
+        return None
+    handler = WavUploadHandler(request, mode)
+    request.upload_handlers.insert(0, handler)
+    return handler
+
+
+def upload_digest(upload):
+    """
+    sha256 hex digest of everything the client sent for `upload`: computed
+    while streaming in window mode, else from the stored content.
+    """
+    digest = getattr(upload, 'sha256', None)
+    if digest is None:
+        digest = hashlib.sha256(upload_data(upload)).hexdigest()
+    return digest
+
+
+def upload_data(upload):
+    """
+    Content of an upload as a bytes-like object: a WavUpload's buffer
+    without copying, otherwise read() (rewound for later readers).
+    """
+    if isinstance(upload, WavUpload):
+        return upload.view
+    data = upload.read()
+    upload.seek(0)
+    return data
@@ -2,16 +2,32 @@
 URL configuration for crydetector app.
 """
 
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the async views keep the event loop free and apply backpressure
+if settings.ASYNC_VIEWS['ENABLED']:
+    predict_view, health_view = views.api_v1_predict_async, views.health_check_async
+else:
+    predict_view, health_view = views.api_v1_predict, views.health_check
+
 urlpatterns = [
     # Template views
     path('', views.home_view, name='home'),
     
     # API endpoints
-    path('api/v1/predict/', views.api_v1_predict, name='api_v1_predict'),
+    path('api/v1/predict/', predict_view, name='api_v1_predict'),
+    path('api/v1/predict/batch/', views.api_v1_predict_batch, name='api_v1_predict_batch'),
+    path('api/v1/predict/long/', views.api_v1_predict_long, name='api_v1_predict_long'),
+    path('api/v1/jobs/', views.api_v1_jobs, name='api_v1_jobs'),
+    path('api/v1/jobs/<uuid:job_id>/', views.api_v1_job_status, name='api_v1_job_status'),
+    path('api/v1/stats/', views.api_v1_stats, name='api_v1_stats'),
     
     # Health check
-    path('health/', views.health_check, name='health_check'),
+    path('health/', health_view, name='health_check'),
+    path('health/ready/', views.health_ready, name='health_ready'),
+
+    # Prometheus scrape target
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,20 +1,66 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from .audio_utils import preprocess_audio, validate_audio_file
-from .model_loader import is_model_available, predict_fast
+from . import metrics
+from .admission import AdmissionRejected, get_admission
+from .audit import audio_digest, get_audit_log, record_prediction
+from .audio_utils import (
+    ArchiveTooLarge, clip_features, decode_clip, extract_archive, get_audio_gate, validate_audio_file,
+)
+from .embedding_index import EmbeddingIndexError, find_similar
+from .executor import ExecutorFull, get_executor
+from .jobs import enqueue, job_payload, queue_stats
+from .model_loader import (
+    get_inference_stats, is_model_available, is_model_loaded, predict_batch, predict_fast, select_version,
+    start_warm_up, warm_up_state,
+)
+from .models import PredictionJob
+from .prediction_cache import get_prediction_cache
+from .segmentation import segment_recording
+from .upload_handlers import LONG, stream_wav_uploads, upload_data, upload_digest
 
 logger = logging.getLogger(__name__)
 
 def verify_api_key(request):
-    import hmac
-    key = request.headers.get('X-API-KEY', '')
-    return hmac.compare_digest(key, settings.API_KEY)
+    name = get_admission().authenticate(request.headers.get('X-API-KEY', ''))
+    # The key's name (settings.API_KEYS) for rate limits, counters and the audit log
+    request.api_key_id = name or ''
+    return name is not None
+
+def _rejected_response(rejected):
+    response = JsonResponse({'error': rejected.error}, status=rejected.status)
+    if rejected.retry_after is not None:
+        response['Retry-After'] = str(rejected.retry_after)
+    return response
+
+def rate_limited(request, cost=1, paid=0):
+    """
+    429 / 413 response when the caller's API key has no room for a request
+    costing `cost` (less `paid` charged by an earlier check), else None.
+    Call after verify_api_key.
+    """
+    try:
+        get_admission().check_rate(request.api_key_id, cost, paid)
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    return None
+
+async def rate_limited_async(request, cost=1):
+    """
+    rate_limited for the async views: a shared-cache check runs off the event loop.
+    """
+    if get_admission().alias:
+        return await sync_to_async(rate_limited, thread_sensitive=False)(request, cost)
+    return rate_limited(request, cost)
 
 def home_view(request):
     context = {'result': None, 'error': None, 'model_available': is_model_available()}
@@ -41,11 +87,15 @@ def api_v1_predict(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
-    # 2. Security: API Key validation
+    # 2. Security: API Key validation and per-key rate limit (before reading the body)
     if not verify_api_key(request):
         return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+    limited = rate_limited(request)
+    if limited:
+        return limited
 
-    # 3. Input Validation
+    # 3. Input Validation (the WAV handler keeps only the model window while the body streams in)
+    stream_wav_uploads(request)
     audio_file = request.FILES.get('audio')
     if not audio_file:
         return JsonResponse({'error': 'Missing audio file in field "audio"'}, status=400)
@@ -55,54 +105,554 @@ def api_v1_predict(request):
         return JsonResponse({'error': 'Unsupported file type. Only .wav is accepted'}, status=415)
 
     try:
-        # 5. Preprocessing (Extracted features)
-        features = preprocess_audio(audio_file)
-        
-        # 6. Inference
-        probs = predict_fast(features)
-        
-        # 7. Success Response
-        classes = settings.CRY_CLASSES
-        idx = np.argmax(probs)
+        similar = similar_requested(request)
+    except ValueError:
+        return JsonResponse({'error': 'similar must be an integer'}, status=400)
+
+    try:
+        # 5-6. Preprocessing + Inference (skipped on a cache hit or by the silence/noise gate),
+        # in one of the process's MAX_IN_FLIGHT slots
+        with get_admission().inference_slot(request.api_key_id):
+            item = predict_audio(upload_data(audio_file), gate_requested(request), similar,
+                                 digest=upload_digest(audio_file))
         
-        return JsonResponse({
-            'label': classes[idx],
-            'confidence': round(float(probs[idx]), 4),
-            'reason': settings.CRY_REASONS.get(classes[idx], "No specific reason identified."),
-            'probabilities': {cls: round(float(p), 4) for cls, p in zip(classes, probs)}
-        })
+        # 7. Success Response (audited off the request path)
+        body = format_item_result(item)
+        record_prediction('predict', item, body, request.api_key_id)
+        return JsonResponse(body)
 
+    except AdmissionRejected as e:
+        return _rejected_response(e)
     except ValueError as e:
         # preprocess_audio raises ValueError for processing failures (corrupted/silent)
         return JsonResponse({'error': f'Corrupted or silent audio: {str(e)}'}, status=422)
+    except (EmbeddingIndexError, NotImplementedError) as e:
+        return JsonResponse({'error': f'Similar-clip search unavailable: {str(e)}'}, status=503)
+    except Exception as e:
+        logger.error(f"API Prediction error: {str(e)}")
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+
+@csrf_exempt
+def api_v1_jobs(request):
+    """
+    ASYNC JOB API: POST /api/v1/jobs/
+    Accepts: multipart/form-data with 'audio' field (optional 'gate')
+    Security: X-API-KEY header
+    Stores the upload and returns 202 with a job id to poll.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+    limited = rate_limited(request)
+    if limited:
+        return limited
+
+    stream_wav_uploads(request)
+    audio_file = request.FILES.get('audio')
+    if not audio_file:
+        return JsonResponse({'error': 'Missing audio file in field "audio"'}, status=400)
+
+    if not audio_file.name.lower().endswith('.wav'):
+        return JsonResponse({'error': 'Unsupported file type. Only .wav is accepted'}, status=415)
+
+    try:
+        job = enqueue(bytes(upload_data(audio_file)), audio_file.name, use_gate=gate_requested(request),
+                      api_key=request.api_key_id, audio_sha256=upload_digest(audio_file))
+    except Exception as e:
+        logger.error(f"API Job submit error: {str(e)}")
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+    # The job queue, not an inference slot, bounds the work
+    get_admission().record(request.api_key_id, 'admitted')
+
+    return JsonResponse({
+        'job_id': str(job.id),
+        'status': job.status,
+        'queue_depth': job.queue_depth_at_submit,
+        'status_url': reverse('api_v1_job_status', args=[job.id]),
+    }, status=202)
+
+def api_v1_job_status(request, job_id):
+    """
+    GET /api/v1/jobs/<id>/
+    Status, timings and (once done) the same body as /api/v1/predict/.
+    Only the API key that submitted the job can read it (others get 404).
+    """
+    if not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+
+    job = PredictionJob.objects.filter(id=job_id, api_key=request.api_key_id).defer('audio').first()
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(job_payload(job))
+
+def _busy_response():
+    retry_after = settings.ASYNC_VIEWS['RETRY_AFTER_SECONDS']
+    response = JsonResponse({'error': 'Server busy, retry later'}, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+async def api_v1_predict_async(request):
+    """
+    ASYNC REST API: POST /api/v1/predict/ under ASGI (ASYNC_VIEWS enabled)
+    Same contract as api_v1_predict. Upload parsing and decode + inference
+    run off the event loop; when the bounded executor is full the request
+    is rejected with 503 + Retry-After instead of queueing. The executor is
+    the in-flight limit here (not RATE_LIMIT['MAX_IN_FLIGHT']).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+    limited = await rate_limited_async(request)
+    if limited:
+        return limited
+
+    # Multipart parsing runs off the event loop
+    stream_wav_uploads(request)
+    audio_file = await sync_to_async(request.FILES.get, thread_sensitive=False)('audio')
+    if not audio_file:
+        return JsonResponse({'error': 'Missing audio file in field "audio"'}, status=400)
+
+    if not audio_file.name.lower().endswith('.wav'):
+        return JsonResponse({'error': 'Unsupported file type. Only .wav is accepted'}, status=415)
+
+    try:
+        similar = similar_requested(request)
+    except ValueError:
+        return JsonResponse({'error': 'similar must be an integer'}, status=400)
+
+    try:
+        audio_data = await sync_to_async(upload_data, thread_sensitive=False)(audio_file)
+        digest = await sync_to_async(upload_digest, thread_sensitive=False)(audio_file)
+        outcome = 'admitted'
+        try:
+            item = await get_executor().run(predict_audio, audio_data, gate_requested(request), similar, digest)
+        except ExecutorFull:
+            outcome = 'busy'
+            raise
+        finally:
+            get_admission().record(request.api_key_id, outcome)
+        body = format_item_result(item)
+        record_prediction('predict', item, body, request.api_key_id)
+        return JsonResponse(body)
+
+    except ExecutorFull:
+        return _busy_response()
+    except ValueError as e:
+        return JsonResponse({'error': f'Corrupted or silent audio: {str(e)}'}, status=422)
+    except (EmbeddingIndexError, NotImplementedError) as e:
+        return JsonResponse({'error': f'Similar-clip search unavailable: {str(e)}'}, status=503)
     except Exception as e:
         logger.error(f"API Prediction error: {str(e)}")
         return JsonResponse({'error': 'Internal server error'}, status=500)
 
+# csrf_exempt() returns a sync wrapper on Django 4.2, which would hide the coroutine
+api_v1_predict_async.csrf_exempt = True
+
+def format_api_result(probs):
+    """
+    Public API response body for one probability vector.
+    """
+    classes = settings.CRY_CLASSES
+    idx = np.argmax(probs)
+    return {
+        'label': classes[idx],
+        'confidence': round(float(probs[idx]), 4),
+        'reason': settings.CRY_REASONS.get(classes[idx], "No specific reason identified."),
+        'probabilities': {cls: round(float(p), 4) for cls, p in zip(classes, probs)}
+    }
+
+def format_gated_result(details):
+    """
+    Public API response body for a clip rejected by the pre-gate.
+    """
+    return {
+        'label': 'not_crying',
+        'confidence': 0.0,
+        'reason': settings.CRY_REASONS.get('not_crying', "No cry detected."),
+        'probabilities': {},
+        'gate': details,
+    }
+
+def format_item_result(item):
+    """
+    API body for a prepared item (see prepare_audio / predict_upload).
+    """
+    version = _version_name(item)
+    if item['gate'] is not None:
+        body = format_gated_result(item['gate'])
+    else:
+        body = format_api_result(item['probs'])
+    metrics.count_prediction(body['label'], version)
+    body = {**body, 'model_version': version, 'cached': item['cached'], 'gated': item['gate'] is not None}
+    if item.get('similar') is not None:
+        body['similar'] = item['similar']
+    return body
+
+def _version_name(item):
+    """
+    Model version that produced the item's probabilities (None when gated).
+    """
+    if item['gate'] is not None or item['version'] is None:
+        return None
+    return item['version'].name
+
+def gate_requested(request):
+    """
+    Per-request pre-gate bypass: gate=false in the query string or form.
+    """
+    value = request.GET.get('gate') or request.POST.get('gate') or 'true'
+    return value.lower() not in ('0', 'false', 'no', 'off')
+
+def similar_requested(request):
+    """
+    Number of similar corpus clips to return: similar=<k> in the query
+    string or form, capped at EMBEDDING_INDEX['MAX_K'] (0 = none).
+    Raises ValueError when it is not an integer.
+    """
+    value = request.GET.get('similar') or request.POST.get('similar') or '0'
+    return max(0, min(int(value), settings.EMBEDDING_INDEX['MAX_K']))
+
+def prepare_audio(audio_data, use_gate=True, use_cache=True, digest=None):
+    """
+    Everything before inference for one clip: model version choice, cache
+    lookup, decode, silence/noise pre-gate, feature extraction.
+    Returns a dict with exactly one of 'probs' (cache hit), 'gate'
+    (rejection details) or 'features' (needs inference) set, and the
+    'version' that scores (or scored) the clip. 'timings' collects the
+    stage times (ms) for the audit log, 'audio_hash' the upload's digest:
+    `digest` when given (upload_digest: the whole upload, where audio_data
+    may only hold the model window), else that of audio_data.
+    use_cache=False still computes the cache key but always extracts features.
+    Raises ValueError for undecodable audio.
+    """
+    item = {'key': None, 'probs': None, 'features': None, 'gate': None, 'cached': False,
+            'version': select_version(), 'audio_hash': None, 'timings': {}}
+
+    cache = get_prediction_cache()
+    if cache or get_audit_log() is not None:
+        item['audio_hash'] = digest or audio_digest(audio_data)
+    if cache:
+        fingerprint = item['version'].fingerprint if item['version'] is not None else None
+        item['key'] = cache.make_key(audio_data, fingerprint, digest=item['audio_hash'])
+        item['probs'] = cache.get(item['key']) if use_cache else None
+        if item['probs'] is not None:
+            item['cached'] = True
+            return item
+
+    with metrics.collect_stages(item['timings']):
+        y = decode_clip(audio_data)
+
+    gate = get_audio_gate()
+    if gate is not None:
+        if use_gate:
+            passed, details = gate.check(y)
+            if not passed:
+                item['gate'] = details
+                return item
+        else:
+            gate.record_bypass()
+
+    with metrics.collect_stages(item['timings']):
+        item['features'] = clip_features(y)
+    return item
+
+def predict_upload(audio_file, use_gate=True):
+    """
+    prepare_audio + inference for one upload. Returns the prepared item
+    with 'probs' filled in (left None when the pre-gate rejected the clip).
+    """
+    return predict_audio(upload_data(audio_file), use_gate, digest=upload_digest(audio_file))
+
+def predict_audio(audio_data, use_gate=True, similar=0, digest=None):
+    """
+    predict_upload for raw bytes. similar > 0 also fills 'similar' with that
+    many nearest corpus clips; the embedding comes from the same forward
+    pass, so those requests skip the cache lookup and the batching engine.
+    """
+    started = time.perf_counter()
+    item = prepare_audio(audio_data, use_gate, use_cache=not similar, digest=digest)
+    if item['features'] is not None and similar:
+        if item['version'] is None:
+            raise RuntimeError("Model unavailable")
+        embeddings, probs = item['version'].embed(item['features'])
+        item['probs'] = probs[0]
+        item['similar'] = find_similar(embeddings[0], item['version'], similar)
+        if item['key'] and use_gate:
+            get_prediction_cache().set(item['key'], item['probs'])
+    elif item['features'] is not None:
+        # Wall time, batching wait included (the engine thread does the forward pass)
+        inference_started = time.perf_counter()
+        item['probs'] = predict_fast(item['features'], item['version'])
+        item['timings']['inference'] = (time.perf_counter() - inference_started) * 1000.0
+        # Bypassed results are not cached, so gated callers never see them
+        if item['key'] and use_gate:
+            get_prediction_cache().set(item['key'], item['probs'])
+    item['timings']['total'] = (time.perf_counter() - started) * 1000.0
+    return item
+
+def score_prepared(prepared, use_gate=True):
+    """
+    Fill 'probs' for every prepared item that still needs inference, in a
+    single forward pass per model version, and cache the results.
+    """
+    by_version = {}
+    for item in prepared:
+        if not item.get('error') and item['features'] is not None:
+            by_version.setdefault(item['version'], []).append(item)
+    cache = get_prediction_cache()
+    for version, todo in by_version.items():
+        started = time.perf_counter()
+        probs = predict_batch(np.concatenate([item['features'] for item in todo]), version)
+        inference_ms = (time.perf_counter() - started) * 1000.0
+        for item, row in zip(todo, probs):
+            item['probs'] = row
+            item['timings']['inference'] = inference_ms
+            # Bypassed results are not cached, so gated callers never see them
+            if cache and use_gate:
+                cache.set(item['key'], row)
+
+def _prepare_item(audio_file, use_gate):
+    """
+    prepare_audio for one batch item, mapping failures to the single-file status codes.
+    """
+    if not audio_file.name.lower().endswith('.wav'):
+        return {'error': {'status': 415, 'error': 'Unsupported file type. Only .wav is accepted'}}
+    try:
+        return {**prepare_audio(upload_data(audio_file), use_gate, digest=upload_digest(audio_file)), 'error': None}
+    except ValueError as e:
+        return {'error': {'status': 422, 'error': f'Corrupted or silent audio: {str(e)}'}}
+
+@csrf_exempt
+def api_v1_predict_batch(request):
+    """
+    BATCH REST API: POST /api/v1/predict/batch/
+    Accepts: multipart/form-data with repeated 'audio' fields
+             and/or an 'archive' field (.zip / .tar / .tar.gz of WAVs)
+    Security: X-API-KEY header
+    Per-file failures are reported inline; they do not fail the batch.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+    # Each file counts against the key's rate limit. It is charged as the
+    # count becomes known, so a throttled key is turned away before the body
+    # is parsed and before any archive is unpacked.
+    limited = rate_limited(request)
+    if limited:
+        return limited
+
+    config = settings.BATCH_PREDICT
+    stream_wav_uploads(request)
+    files = list(request.FILES.getlist('audio'))
+    archives = request.FILES.getlist('archive')
+    known = len(files) + len(archives)
+    limited = rate_limited(request, cost=known, paid=1)
+    if limited:
+        return limited
+    unpacked = 0
+    for archive in archives:
+        try:
+            members = extract_archive(archive, config['MAX_FILES'] - len(files),
+                                      config['MAX_ARCHIVE_BYTES'] - unpacked)
+        except ArchiveTooLarge as e:
+            return JsonResponse({'error': str(e)}, status=413)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        unpacked += sum(m.size for m in members)
+        files.extend(members)
+
+    if not files:
+        return JsonResponse({'error': 'Missing audio files in field "audio" or "archive"'}, status=400)
+    if len(files) > config['MAX_FILES']:
+        return JsonResponse({'error': f'Too many files (max {config["MAX_FILES"]})'}, status=413)
+    limited = rate_limited(request, cost=len(files), paid=max(known, 1))
+    if limited:
+        return limited
+
+    try:
+        # 1. Parallel cache lookup + preprocessing (NumPy releases the GIL for most of the work)
+        use_gate = gate_requested(request)
+        with get_admission().inference_slot(request.api_key_id):
+            with ThreadPoolExecutor(max_workers=min(config['WORKERS'], len(files))) as pool:
+                prepared = list(pool.map(lambda f: _prepare_item(f, use_gate), files))
+
+            # 2. One forward pass for every cache miss that decoded cleanly and passed the gate
+            score_prepared(prepared, use_gate)
+
+        # 3. Per-file results in input order
+        results = []
+        for f, item in zip(files, prepared):
+            if item['error']:
+                results.append({'filename': f.name, **item['error']})
+            else:
+                body = format_item_result(item)
+                record_prediction('batch', item, body, request.api_key_id)
+                results.append({'filename': f.name, 'status': 200, **body})
+
+        return JsonResponse({'count': len(results), 'results': results})
+
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        logger.error(f"API Batch prediction error: {str(e)}")
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+
+@csrf_exempt
+def api_v1_predict_long(request):
+    """
+    LONG-AUDIO REST API: POST /api/v1/predict/long/
+    Accepts: multipart/form-data with 'audio' field (any length)
+             optional 'hop' (seconds between 4s windows)
+    Security: X-API-KEY header
+    Returns a per-window timeline and merged cry episodes.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+    limited = rate_limited(request)
+    if limited:
+        return limited
+
+    # Spooled to disk as usual, but nothing past LONG_AUDIO['MAX_SECONDS'] is written
+    handler = stream_wav_uploads(request, LONG)
+    audio_file = request.FILES.get('audio')
+    if not audio_file:
+        return JsonResponse({'error': 'Missing audio file in field "audio"'}, status=400)
+
+    if not audio_file.name.lower().endswith('.wav'):
+        return JsonResponse({'error': 'Unsupported file type. Only .wav is accepted'}, status=415)
+
+    if handler is not None and audio_file.name in handler.truncated:
+        return JsonResponse({'error': f'Corrupted or unsupported audio: Recording exceeds '
+                                      f'{settings.LONG_AUDIO["MAX_SECONDS"]}s limit'}, status=422)
+
+    try:
+        hop = float(request.POST['hop']) if request.POST.get('hop') else None
+        if hop is not None and not 0.1 <= hop <= settings.AUDIO_CONFIG['DURATION']:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': f'"hop" must be between 0.1 and {settings.AUDIO_CONFIG["DURATION"]} seconds'}, status=400)
+
+    try:
+        with get_admission().inference_slot(request.api_key_id):
+            return JsonResponse(segment_recording(audio_file, hop_seconds=hop))
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except ValueError as e:
+        return JsonResponse({'error': f'Corrupted or unsupported audio: {str(e)}'}, status=422)
+    except Exception as e:
+        logger.error(f"API Long-audio prediction error: {str(e)}")
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+
 def process_prediction(audio_file):
     """
     Consolidated prediction path optimized for latency.
     """
-    # 1. Preprocess
-    features = preprocess_audio(audio_file)
+    # 1-2. Preprocess + Inference (Fast Path; prediction cache and pre-gate first)
+    item = predict_upload(audio_file)
     
-    # 2. Inference (Fast Path)
-    probs = predict_fast(features)
+    if item['gate'] is not None:
+        metrics.count_prediction('not_crying')
+        record_prediction('home', item, {'label': 'not_crying', 'confidence': 0.0, 'probabilities': {},
+                                         'model_version': None, 'cached': False, 'gated': True})
+        return {
+            'is_crying': False,
+            'predicted_label': None,
+            'confidence': 0.0,
+            'reason': settings.CRY_REASONS.get('not_crying'),
+            'probabilities': {},
+            'model_version': None,
+            'cached': False,
+            'gated': True,
+            'warning': "No cry detected: the clip is silent or only background noise.",
+        }
     
     # 3. Post-process
+    probs = item['probs']
     classes = settings.CRY_CLASSES
     reasons = settings.CRY_REASONS
     idx = np.argmax(probs)
     confidence = float(probs[idx])
     label = classes[idx]
-    
-    return {
-        'is_crying': confidence > 0.4,
+    version = _version_name(item)
+    metrics.count_prediction(label, version)
+    result = {
+        'is_crying': confidence > settings.CRY_CONFIDENCE_THRESHOLD,
         'predicted_label': label,
         'confidence': round(confidence, 4),
         'reason': reasons.get(label, "No specific reason identified."),
-        'probabilities': {cls: round(float(p), 4) for cls, p in zip(classes, probs)}
+        'probabilities': {cls: round(float(p), 4) for cls, p in zip(classes, probs)},
+        'model_version': version,
+        'cached': item['cached'],
+        'gated': False,
     }
+    record_prediction('home', item, {**result, 'label': label})
+    return result
 
 def health_check(request):
-    return JsonResponse({'status': 'ok', 'model_ready': is_model_available()})
+    """
+    GET /health/
+    Liveness: the process is up. Never loads the model (see /health/ready/).
+    """
+    return JsonResponse({'status': 'ok', 'model_ready': is_model_loaded()})
+
+async def health_check_async(request):
+    """
+    health_check for the ASGI path; also reports executor saturation.
+    """
+    return JsonResponse({'status': 'ok', 'model_ready': is_model_loaded(), 'executor': get_executor().stats()})
+
+def health_ready(request):
+    """
+    GET /health/ready/
+    Readiness: 200 once the audio stack and model are warm, 503 until then.
+    A probe against a cold process starts the warm-up in the background
+    (and retries it after a failure, reported as 'unavailable').
+    """
+    state = warm_up_state()
+    if state['ready']:
+        return JsonResponse({'status': 'ready', **state})
+    start_warm_up()
+    status = 'unavailable' if state['error'] and not state['warming'] else 'warming'
+    return JsonResponse({'status': status, **state}, status=503)
+
+def metrics_view(request):
+    """
+    GET /metrics
+    Prometheus text exposition, aggregated over all worker processes.
+    """
+    if not settings.METRICS['ENABLED']:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    if settings.METRICS['REQUIRE_API_KEY'] and not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def api_v1_stats(request):
+    """
+    GET /api/v1/stats/
+    Runtime counters for capacity planning (batch sizes, latencies, cache, pre-gate, job queue,
+    audit log, per-key admission).
+    """
+    if not verify_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+
+    cache = get_prediction_cache()
+    gate = get_audio_gate()
+    audit = get_audit_log()
+    return JsonResponse({
+        'inference': get_inference_stats(),
+        'cache': cache.stats() if cache else {'enabled': False},
+        'gate': gate.stats() if gate else {'enabled': False},
+        'jobs': queue_stats(),
+        'audit': audit.stats() if audit else {'enabled': False},
+        'admission': get_admission().stats(),
+        'async_executor': get_executor().stats() if settings.ASYNC_VIEWS['ENABLED'] else {'enabled': False},
+    })
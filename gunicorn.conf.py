@@ -0,0 +1,65 @@
+"""
+Gunicorn settings; gunicorn reads ./gunicorn.conf.py automatically, so the
+Procfile / render.yaml command lines keep working unchanged.
+
+With preload_app (default) the master imports Django and the inference
+runtime, builds the feature tables and (for tflite / onnx / eager keras)
+loads and warms the model once, then forks: workers share all of it
+copy-on-write instead of each paying the load. TF graph models
+(TF_FUNCTION / XLA) cannot cross fork() and are loaded in post_fork.
+GUNICORN_PRELOAD=False restores one load per worker.
+"""
+
+import gc
+import os
+import tempfile
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+if preload_app:
+    # Runtime thread pools created in the master would be missing in the
+    # workers; run inference on the calling thread (settings.INFERENCE_BACKEND)
+    os.environ.setdefault('INFERENCE_FORK_SAFE', 'True')
+
+# prometheus_client picks its storage when first imported, so the directory
+# must be in the environment before any worker loads the app. Each worker
+# writes its own files there and /metrics merges them.
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='crybaby-metrics-')
+
+# Counters restart from zero with the server, not with each deploy's
+# leftovers. This runs when gunicorn reads its config, before preload_app
+# loads the app (and the master records model load / warm-up samples);
+# on_starting would run after that and delete them. The marker keeps a
+# config reload (SIGHUP) from wiping the live workers' files.
+if os.environ.get('CRYBABY_METRICS_CLEARED') != str(os.getpid()):
+    os.environ['CRYBABY_METRICS_CLEARED'] = str(os.getpid())
+    _metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(_metrics_dir, exist_ok=True)
+    for _name in os.listdir(_metrics_dir):
+        if _name.endswith('.db'):
+            os.remove(os.path.join(_metrics_dir, _name))
+
+
+def when_ready(server):
+    # Runs in the master after the (pre)loaded app, before the first fork
+    if preload_app:
+        from django.db import connections
+        # Workers must open their own DB connections
+        connections.close_all()
+        # Keep the cyclic GC from touching (and so copying) the preloaded objects
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from crydetector.model_loader import warm_up
+        # No-op when the master already loaded a fork-safe model; TF graph
+        # models are loaded here, before the worker accepts requests
+        warm_up()
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges (RSS, model load time)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,11 +1,16 @@
+import json
 import os
+import time
 import numpy as np
-import librosa
 import tensorflow as tf
 from tensorflow.keras import layers, models
 from sklearn.model_selection import train_test_split
 import logging
 
+from crydetector.audio_utils import FeatureExtractor, load_audio
+from crydetector.feature_store import FeatureStore, augment_waveform
+from crydetector.inference_backends import KerasBackend
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -18,76 +23,144 @@ MAX_PAD_LEN = 173
 DATA_DIR = 'donateacry_corpus_cleaned_and_updated_data'
 CLASSES = ['belly_pain', 'burping', 'discomfort', 'hungry', 'tired']
 
-def extract_features(file_path, augment=False):
-    try:
-        y, sr = librosa.load(file_path, sr=SR, mono=True)
-        if augment:
-            if np.random.random() > 0.5:
-                y = y + 0.002 * np.random.randn(len(y))
-            if np.random.random() > 0.5:
-                y = librosa.effects.time_stretch(y, rate=np.random.uniform(0.8, 1.2))
-        
-        target_samples = SR * DURATION
-        if len(y) < target_samples:
-            y = np.pad(y, (0, target_samples - len(y)))
-        else:
-            y = y[:target_samples]
-            
-        mfcc = librosa.feature.mfcc(y=y, sr=SR, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)
-        
-        if mfcc.shape[1] < MAX_PAD_LEN:
-            mfcc = np.pad(mfcc, ((0, 0), (0, MAX_PAD_LEN - mfcc.shape[1])))
-        else:
-            mfcc = mfcc[:, :MAX_PAD_LEN]
-            
-        mfcc = (mfcc - np.mean(mfcc)) / (np.std(mfcc) + 1e-8)
-        return mfcc
-    except Exception:
-        return None
-
-def load_data_balanced():
-    X = []
-    y = []
-    
-    # We will aim for exactly 150 samples per class
-    SAMPLES_PER_CLASS = 150
-    
+# Same extractor class the server uses, so training and serving stay in lockstep
+FEATURE_CONFIG = dict(
+    sample_rate=SR, duration=DURATION, n_mfcc=N_MFCC, n_fft=N_FFT,
+    hop_length=HOP_LENGTH, max_pad_len=MAX_PAD_LEN,
+)
+FEATURE_EXTRACTOR = FeatureExtractor(**FEATURE_CONFIG)
+
+# Feature store: unchanged clips are loaded from disk instead of re-extracted
+SEED = int(os.environ.get('TRAIN_SEED', '42'))
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', '.feature_cache')
+FEATURE_WORKERS = int(os.environ.get('FEATURE_WORKERS', str(os.cpu_count() or 1)))
+
+EPOCHS = int(os.environ.get('TRAIN_EPOCHS', '50'))
+BATCH_SIZE = 16
+SAMPLES_PER_CLASS = 150
+
+# 'baseline': Flatten -> Dense(256) head (~3.5M params, mostly that Dense)
+# 'compact': depthwise-separable convs + global average pooling (~31k params)
+ARCH = os.environ.get('TRAIN_ARCH', 'baseline')
+MODEL_OUTPUT = os.environ.get('MODEL_OUTPUT', 'baby_cry_reason_model.keras')
+
+# Knowledge distillation: train against a saved model's softened outputs as well as the labels
+DISTILL_TEACHER = os.environ.get('DISTILL_TEACHER', '')
+DISTILL_ALPHA = float(os.environ.get('DISTILL_ALPHA', '0.5'))              # weight of the teacher term
+DISTILL_TEMPERATURE = float(os.environ.get('DISTILL_TEMPERATURE', '4.0'))
+
+# Warn when the trained model's batch-1 CPU latency is over this (0 = no budget)
+LATENCY_BUDGET_MS = float(os.environ.get('TRAIN_LATENCY_BUDGET_MS', '0'))
+LATENCY_RUNS = 50
+
+def balanced_items(rng):
+    """
+    (path, augment, label) for exactly SAMPLES_PER_CLASS clips per class:
+    larger classes are subsampled, smaller ones topped up with augmented
+    draws of their own files.
+    """
+    items = []
     for idx, label in enumerate(CLASSES):
         class_dir = os.path.join(DATA_DIR, label)
-        files = [os.path.join(class_dir, f) for f in os.listdir(class_dir) if f.endswith('.wav')]
+        files = sorted(os.path.join(class_dir, f) for f in os.listdir(class_dir) if f.endswith('.wav'))
         
         # If hungry, take a random subset of 150
         if len(files) > SAMPLES_PER_CLASS:
-            selected_files = np.random.choice(files, SAMPLES_PER_CLASS, replace=False)
+            selected_files = list(rng.choice(files, SAMPLES_PER_CLASS, replace=False))
         else:
             selected_files = files
-            
-        logger.info(f"Loading {label}...")
-        for f in selected_files:
-            feat = extract_features(f, augment=False)
-            if feat is not None:
-                X.append(feat)
-                y.append(idx)
+        items += [(f, False, idx) for f in selected_files]
         
         # Fill up to 150 with augmented versions
-        current_count = len([label_idx for label_idx in y if label_idx == idx])
-        if current_count < SAMPLES_PER_CLASS:
-            num_needed = SAMPLES_PER_CLASS - current_count
+        num_needed = SAMPLES_PER_CLASS - len(selected_files)
+        if num_needed > 0:
             logger.info(f"  Augmenting {label} to reach {SAMPLES_PER_CLASS}...")
-            for _ in range(num_needed):
-                f = np.random.choice(files)
-                feat = extract_features(f, augment=True)
-                if feat is not None:
-                    X.append(feat)
-                    y.append(idx)
-                    
-    X = np.array(X)
-    y = np.array(y)
-    X = X.reshape(X.shape[0], N_MFCC, MAX_PAD_LEN, 1)
-    return X, y
-
-def build_model():
-    model = models.Sequential([
+            items += [(f, True, idx) for f in rng.choice(files, num_needed)]
+    return items
+
+class ClipSource:
+    """
+    Per-clip feature loader for the input pipeline. Clean clips are read
+    from the feature store memmap (page cache, not process memory);
+    augmented clips are decoded and re-augmented on every call, so each
+    epoch sees new variants.
+    """
+
+    def __init__(self, items):
+        store = FeatureStore(FEATURE_CACHE_DIR, FEATURE_CONFIG, workers=FEATURE_WORKERS)
+        paths = sorted({path for path, _, _ in items})
+        self.features, rows = store.open(paths)
+        self.rows = dict(zip(paths, rows.tolist()))
+        failed = [path for path in paths if self.rows[path] < 0]
+        if failed:
+            logger.warning(f"Skipping {len(failed)} clips that failed feature extraction")
+        self.items = [item for item in items if self.rows[item[0]] >= 0]
+
+    def __call__(self, path, augment, seed):
+        path = path.decode()
+        if not augment:
+            return np.asarray(self.features[self.rows[path]])
+        with open(path, 'rb') as fh:
+            y = load_audio(fh.read(), SR)
+        y = augment_waveform(y, np.random.default_rng(int(seed) & 0x7FFFFFFFFFFFFFFF))
+        return FEATURE_EXTRACTOR.transform(y).astype(np.float32)
+
+def make_dataset(source, items, training):
+    """
+    Streaming tf.data pipeline over `items`. Only (path, flag, label)
+    tuples are shuffled; features are produced lazily in a parallel map and
+    prefetched, so memory is bounded by a few batches whatever the corpus size.
+    Training draws a fresh augmentation seed per sample per epoch;
+    evaluation seeds are fixed so val metrics are comparable across epochs.
+
+    The map runs ClipSource through tf.numpy_function, which holds the GIL:
+    clean clips are cheap memmap reads, but augmented ones (decode, time
+    stretch, MFCC) only overlap in the numpy/soxr kernels that release it,
+    so they do not scale with num_parallel_calls across cores the way the
+    feature store's process pool does.
+    """
+    paths, augment, labels = (list(col) for col in zip(*items))
+    ds = tf.data.Dataset.from_tensor_slices((paths, augment, labels))
+    if training:
+        ds = ds.shuffle(len(items), seed=SEED, reshuffle_each_iteration=True)
+        seeds = tf.data.Dataset.random(seed=SEED, rerandomize_each_iteration=True)
+    else:
+        seeds = tf.data.Dataset.range(len(items))
+    ds = tf.data.Dataset.zip((ds, seeds))
+
+    def load(example, seed):
+        path, aug, label = example
+        features = tf.numpy_function(source, [path, aug, seed], tf.float32)
+        return tf.reshape(features, (N_MFCC, MAX_PAD_LEN, 1)), label
+
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.batch(BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """
+    Logs training samples/sec for every epoch (input pipeline + train step,
+    validation excluded) and adds it to the Keras logs.
+    """
+
+    def __init__(self, samples_per_epoch):
+        super().__init__()
+        self.samples_per_epoch = samples_per_epoch
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+        self._last_batch = self._started
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._last_batch = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        rate = self.samples_per_epoch / max(self._last_batch - self._started, 1e-9)
+        if logs is not None:
+            logs['samples_per_sec'] = rate
+        logger.info(f"Epoch {epoch + 1}: {rate:.1f} samples/sec")
+
+def build_baseline():
+    return models.Sequential([
         layers.Conv2D(32, (3, 3), padding='same', activation='relu', input_shape=(N_MFCC, MAX_PAD_LEN, 1)),
         layers.BatchNormalization(),
         layers.MaxPooling2D((2, 2)),
@@ -105,17 +178,162 @@ def build_model():
         layers.Dropout(0.5),
         layers.Dense(len(CLASSES), activation='softmax')
     ])
-    
-    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.0001),
+
+def build_compact():
+    """
+    Same three conv stages, but the 3x3 convs after the first are
+    depthwise-separable and the head averages each channel over time and
+    frequency instead of flattening 128x5x21 activations into a Dense
+    layer. The first conv stays a plain Conv2D: with one input channel a
+    separable conv saves nothing.
+    """
+    return models.Sequential([
+        layers.Conv2D(32, (3, 3), padding='same', activation='relu', input_shape=(N_MFCC, MAX_PAD_LEN, 1)),
+        layers.BatchNormalization(),
+        layers.MaxPooling2D((2, 2)),
+
+        layers.SeparableConv2D(64, (3, 3), padding='same', activation='relu'),
+        layers.BatchNormalization(),
+        layers.MaxPooling2D((2, 2)),
+
+        layers.SeparableConv2D(128, (3, 3), padding='same', activation='relu'),
+        layers.BatchNormalization(),
+        layers.MaxPooling2D((2, 2)),
+
+        layers.SeparableConv2D(128, (3, 3), padding='same', activation='relu'),
+        layers.BatchNormalization(),
+
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.3),
+        layers.Dense(len(CLASSES), activation='softmax')
+    ])
+
+ARCHITECTURES = {
+    # name: (builder, Adam learning rate)
+    'baseline': (build_baseline, 0.0001),
+    'compact': (build_compact, 0.001),
+}
+
+class Distiller(tf.keras.Model):
+    """
+    Trains `student` on (1 - alpha) * cross-entropy with the labels plus
+    alpha * T^2 * KL(teacher || student) on both outputs softened by
+    temperature T. Both models end in softmax, so their log-probabilities
+    stand in for logits (softmax(log p / T) == softmax(z / T)). Only the
+    student is saved.
+    """
+
+    def __init__(self, student, teacher, alpha=0.5, temperature=4.0):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.alpha = alpha
+        self.temperature = temperature
+        self.kl_divergence = tf.keras.losses.KLDivergence()
+
+    def call(self, x, training=False):
+        return self.student(x, training=training)
+
+    def _soften(self, probs):
+        return tf.nn.softmax(tf.math.log(tf.clip_by_value(probs, 1e-7, 1.0)) / self.temperature)
+
+    def compute_loss(self, x=None, y=None, y_pred=None, sample_weight=None, training=True):
+        hard = super().compute_loss(x, y, y_pred, sample_weight, training)
+        teacher = self._soften(self.teacher(x, training=False))
+        student = self._soften(y_pred)
+        soft = self.kl_divergence(teacher, student) * self.temperature ** 2
+        return (1.0 - self.alpha) * hard + self.alpha * soft
+
+def build_model(arch='baseline', teacher=None):
+    """
+    Compiled model for `arch`; with a teacher model, a Distiller wrapping it
+    (save `.student`).
+    """
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture '{arch}' (choose from {', '.join(ARCHITECTURES)})")
+    builder, learning_rate = ARCHITECTURES[arch]
+    model = builder()
+    if teacher is not None:
+        model = Distiller(model, teacher, DISTILL_ALPHA, DISTILL_TEMPERATURE)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
                   loss='sparse_categorical_crossentropy',
                   metrics=['accuracy'])
     return model
 
+def measure_latency(backend, batch_size, runs=LATENCY_RUNS):
+    """
+    Median ms per predict() call of `batch_size` clips, after one warm-up call.
+    """
+    features = np.random.default_rng(SEED).standard_normal(
+        (batch_size, N_MFCC, MAX_PAD_LEN, 1)).astype(np.float32)
+    backend.predict(features)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        backend.predict(features)
+        times.append(time.perf_counter() - started)
+    return float(np.median(times)) * 1000.0
+
+def model_report(path, dataset):
+    """
+    Params, file size, validation accuracy and CPU latency of a saved model,
+    loaded the way the server loads it (KerasBackend with a traced graph).
+    """
+    backend = KerasBackend(path, runtime={'TF_FUNCTION': True})
+    correct = total = 0
+    for features, labels in dataset:
+        predicted = backend.predict(features.numpy()).argmax(axis=1)
+        correct += int((predicted == labels.numpy()).sum())
+        total += len(predicted)
+    return {
+        'model': path,
+        'params': int(backend.model.count_params()),
+        'size_kb': round(os.path.getsize(path) / 1024.0, 1),
+        'val_accuracy': round(correct / max(total, 1), 4),
+        'latency_ms_batch_1': round(measure_latency(backend, 1), 2),
+        'latency_ms_batch_32': round(measure_latency(backend, 32), 2),
+    }
+
+def log_reports(reports):
+    logger.info(f"{'model':<40} {'params':>10} {'size_kb':>9} {'val_acc':>8} {'ms@1':>7} {'ms@32':>8}")
+    for r in reports:
+        logger.info(f"{r['model']:<40} {r['params']:>10,} {r['size_kb']:>9.1f} {r['val_accuracy']:>8.3f} "
+                    f"{r['latency_ms_batch_1']:>7.2f} {r['latency_ms_batch_32']:>8.2f}")
+
 if __name__ == "__main__":
-    X, y = load_data_balanced()
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, random_state=42)
+    items = balanced_items(np.random.default_rng(SEED))
+    source = ClipSource(items)
+    train_items, test_items = train_test_split(source.items, test_size=0.15, random_state=SEED)
     
-    model = build_model()
-    model.fit(X_train, y_train, epochs=50, batch_size=16, validation_data=(X_test, y_test))
-    model.save('baby_cry_reason_model.keras')
-    logger.info("Retrained balanced model saved.")
+    val_dataset = make_dataset(source, test_items, training=False)
+
+    teacher = None
+    if DISTILL_TEACHER:
+        teacher = tf.keras.models.load_model(DISTILL_TEACHER, compile=False)
+        logger.info(f"Distilling from {DISTILL_TEACHER} (alpha={DISTILL_ALPHA}, T={DISTILL_TEMPERATURE})")
+    model = build_model(ARCH, teacher)
+    model.fit(
+        make_dataset(source, train_items, training=True),
+        epochs=EPOCHS,
+        validation_data=val_dataset,
+        callbacks=[ThroughputLogger(len(train_items))],
+    )
+    if teacher is not None:
+        model = model.student
+    model.save(MODEL_OUTPUT)
+    logger.info(f"Retrained balanced {ARCH} model saved to {MODEL_OUTPUT}.")
+
+    # Size / accuracy / latency next to the teacher's, to pick a model for the latency budget
+    reports = [model_report(MODEL_OUTPUT, val_dataset)]
+    reports[0]['arch'] = ARCH
+    if DISTILL_TEACHER:
+        reports.append(model_report(DISTILL_TEACHER, val_dataset))
+    log_reports(reports)
+    report_path = os.path.splitext(MODEL_OUTPUT)[0] + '.report.json'
+    with open(report_path, 'w') as fh:
+        json.dump(reports, fh, indent=2)
+    logger.info(f"Report written to {report_path}")
+    if LATENCY_BUDGET_MS and reports[0]['latency_ms_batch_1'] > LATENCY_BUDGET_MS:
+        logger.warning(f"Batch-1 latency {reports[0]['latency_ms_batch_1']:.2f} ms is over the "
+                       f"{LATENCY_BUDGET_MS:g} ms budget")